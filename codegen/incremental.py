@@ -0,0 +1,259 @@
+"""
+Покомпонентная генерация кода.
+
+UI-дерево страницы режется на компоненты: каждый узел верхнего уровня —
+компонент, а у компонента больше MAX_COMPONENT_NODES узлов дети с
+собственными детьми выносятся в отдельные компоненты и заменяются ссылками
+{"type": "component_ref", "component": <имя>} — так же, как vision выносит
+общие для экранов компоненты. Каждый компонент генерируется отдельным
+запросом к LLM и кэшируется по структурному хешу своего поддерева.
+
+bbox внутри компонента пересчитываются относительно его корня, а для ключа
+кэша ещё и округляются до сетки BBOX_CACHE_GRID: компонент, который на новом
+скриншоте лишь сдвинулся по странице, берётся из кэша. Одинаковые поддеревья
+дают одно имя и генерируются один раз. Страница собирается из готовых
+компонентов без обращения к LLM (PageAssembler) по мере их готовности.
+
+Ссылки vision на общие компоненты пакетного задания не генерируются здесь:
+экран импортирует их из src/components/<имя> (Next.js) или оставляет
+заглушку, которую заполняет запись архива (HTML). Сам общий компонент
+приходит отдельным документом с полем "component" и получает это имя.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from pix2fc.bundle import component_module
+from pix2fc.dsl import Node, UiDocument, render_prompt
+
+MAX_COMPONENT_NODES = 40  # крупнее — дети с поддеревьями уходят в отдельные компоненты
+BBOX_CACHE_GRID = 0.01  # доля страницы; сдвиги меньше сетки не меняют ключ кэша
+CACHE_HIDDEN_PROPS = {"score", "confidence", "id"}
+REF_TYPE = "component_ref"
+TAILWIND_CDN = "https://cdn.tailwindcss.com"
+
+_FENCE = re.compile(r"^\s*```[\w+-]*\s*\n(.*?)\n\s*```\s*$", re.S)
+# import'ы компонентов (в том числе многострочные) поднимаются в начало файла страницы
+_IMPORT = re.compile(r"^import\b[^;]*;[ \t]*\n?", re.M)
+_USE_CLIENT = re.compile(r"^\s*[\"']use client[\"'];?[ \t]*\n?", re.M)
+
+
+@dataclass
+class Component:
+    name: str
+    node: Node                     # корень с bbox относительно себя и ссылками на вынесенных детей
+    cache_hash: str                # структурный хеш для ключа кэша ответов
+    refs: List[str] = field(default_factory=list)  # имена вынесенных дочерних компонентов по порядку
+
+
+def _relative(node: Node, origin: Tuple[float, float]) -> Node:
+    bbox = node.bbox
+    if bbox is not None:
+        bbox = (round(bbox[0] - origin[0], 4), round(bbox[1] - origin[1], 4), bbox[2], bbox[3])
+    return Node(node.type, bbox, node.text, node.props, [_relative(child, origin) for child in node.children])
+
+
+def _cache_view(node: Node) -> Node:
+    bbox = node.bbox
+    if bbox is not None:
+        bbox = tuple(round(round(v / BBOX_CACHE_GRID) * BBOX_CACHE_GRID, 4) for v in bbox)
+    props = {key: value for key, value in node.props.items() if key not in CACHE_HIDDEN_PROPS}
+    return Node(node.type, bbox, node.text, props, [_cache_view(child) for child in node.children])
+
+
+def _component_name(node: Node, digest: str) -> str:
+    words = re.findall(r"[A-Za-z0-9]+", str(node.props.get("role") or node.type)) or ["Component"]
+    name = "".join(word.capitalize() for word in words)
+    return (name if name[0].isalpha() else "C" + name) + digest[:8]
+
+
+def shared_refs(components: Dict[str, Component], roots: List[str]) -> List[str]:
+    """Общие компоненты vision, на которые ссылается страница, по порядку первого упоминания"""
+    names: List[str] = [name for name in roots if name not in components]
+
+    def visit(node: Node):
+        if node.type == REF_TYPE and node.props.get("component") not in components:
+            names.append(str(node.props.get("component")))
+        for child in node.children:
+            visit(child)
+
+    for component in components.values():
+        visit(component.node)
+    return list(dict.fromkeys(names))
+
+
+def split_components(document: UiDocument, max_nodes: int = MAX_COMPONENT_NODES) -> Tuple[List[str], Dict[str, Component]]:
+    """
+    (имена компонентов верхнего уровня по порядку страницы, все компоненты по имени).
+    Дети идут в словаре раньше родителей. Ссылка vision на общий компонент в
+    корне страницы попадает в roots своим именем, но не в словарь.
+    """
+    components: Dict[str, Component] = {}
+    shared_name = document.meta.get("component")
+
+    def extract(node: Node, name: Optional[str] = None) -> str:
+        refs = []
+        children = node.children
+        if node.size() > max_nodes:
+            children = []
+            for child in node.children:
+                if child.children:
+                    refs.append(extract(child))
+                    children.append(Node(REF_TYPE, child.bbox, props={"component": refs[-1]}))
+                else:
+                    children.append(child)
+        origin = node.bbox[:2] if node.bbox is not None else (0.0, 0.0)
+        local = _relative(Node(node.type, node.bbox, node.text, node.props, children), origin)
+        cache_hash = UiDocument(None, [_cache_view(local)]).structural_hash
+        name = name or _component_name(node, cache_hash)
+        components.setdefault(name, Component(name, local, cache_hash, refs))
+        return name
+
+    roots = []
+    for node in document.tree:
+        if node.type == REF_TYPE and node.props.get("component"):
+            roots.append(str(node.props["component"]))
+        else:
+            # Общий компонент получает имя, под которым на него ссылаются экраны
+            roots.append(extract(node, shared_name if len(document.tree) == 1 else None))
+    return roots, components
+
+
+def component_prompt(component: Component, format: str, meta: Optional[dict] = None) -> str:
+    if format == "next":
+        shape = (
+            f"Верни одну React-функцию `export function {component.name}()` на TypeScript (Next.js) "
+            "и нужные ей import'ы в начале; без export default и без разметки страницы."
+        )
+        refs = "Узлы component_ref — готовые компоненты: вставь их как <Имя />, не реализуя и не импортируя."
+    else:
+        styling = "Tailwind-классы" if format == "tailwind" else "встроенный <style> или атрибуты style"
+        shape = (
+            f"Верни только HTML-фрагмент компонента {component.name} (без <html>, <head>, <body>); "
+            f"оформление — {styling}."
+        )
+        refs = "Вместо каждого узла component_ref вставь ровно комментарий <!-- component:Имя -->."
+    return f"""
+    Ты профессиональный UI разработчик. Создай один компонент по фрагменту UI-дерева страницы.
+
+    Формат дерева: строка на узел, вложенность — отступом в один пробел;
+    <type> <x,y,w,h в долях страницы, относительно корня компонента> "<текст>" {{прочие поля JSON}}.
+    ```
+    {render_prompt(UiDocument(None, [component.node], meta))}
+    ```
+
+    {shape}
+    {refs}
+    Код должен соответствовать современным стандартам доступности и лучшим практикам.
+    Ответ — только код, без пояснений и без markdown.
+    """
+
+
+def strip_code_fences(code: str) -> str:
+    """LLM всё равно иногда оборачивает ответ в ```; для сборки страницы ограждения не нужны"""
+    match = _FENCE.match(code)
+    return match.group(1) if match else code.strip()
+
+
+class PageAssembler:
+    """
+    Собирает страницу из кода компонентов по мере их готовности: add()
+    возвращает чанки, которые уже можно отдать, finish() — последний чанк
+    со сборкой страницы. Чанки идут в порядке файла.
+
+    next — чанк на компонент в порядке готовности: функции компонентов
+    поднимаются (hoisting), а import'ы допустимы в любом месте модуля, так что
+    порядок не важен; у первого чанка "use client" и import'ы общих
+    компонентов, у каждого — его ещё не встречавшиеся import'ы. Последний чанк —
+    страница Page.
+    HTML — фрагменты корней вкладываются по порядку страницы, поэтому корень
+    отдаётся, когда готовы он, его вынесенные дети и все корни перед ним.
+    shared_name — документ является общим компонентом пакетного задания:
+    вместо страницы собирается модуль компонента (Next.js) или фрагмент (HTML).
+    """
+
+    def __init__(self, roots: List[str], components: Dict[str, Component], format: str,
+                 shared_name: Optional[str] = None):
+        self.roots = roots
+        self.components = components
+        self.format = format
+        self.shared_name = shared_name
+        self.shared = shared_refs(components, roots)
+        self.code: Dict[str, str] = {}
+        self.imports = [f'import {{ {name} }} from "{component_module(name)}";' for name in self.shared]
+        self._started = False
+        self._next_root = 0
+        self._fragments: Dict[str, str] = {}
+
+    def add(self, name: str, code: str) -> List[str]:
+        self.code[name] = code
+        if self.format == "next":
+            return [self._module_part(code)]
+        return self._ready_roots()
+
+    def finish(self) -> List[str]:
+        if self.format == "next":
+            if not self._started:
+                # Страница без своих компонентов (например, из одних общих)
+                self._started = True
+                header = '"use client";\n' + "".join(line + "\n" for line in self.imports) + "\n"
+                return [header + self._page()] if not self.shared_name else [header]
+            return [] if self.shared_name else [self._page()]
+        parts = self._ready_roots()
+        if not self._started and not self.shared_name:
+            self._started = True
+            parts.insert(0, self._html_head())
+        return parts if self.shared_name else parts + ["</main>\n</body>\n</html>\n"]
+
+    def _module_part(self, code: str) -> str:
+        body = _USE_CLIENT.sub("", strip_code_fences(code))
+        header = []
+        if not self._started:
+            self._started = True
+            header = ['"use client";'] + self.imports
+        for statement in _IMPORT.findall(body):
+            statement = statement.strip()
+            # Общие компоненты импортируются только по пути из архива
+            if statement not in self.imports and not any(re.search(rf"\b{ref}\b", statement) for ref in self.shared):
+                self.imports.append(statement)
+                header.append(statement)
+        prefix = "".join(line + "\n" for line in header) + "\n" if header else ""
+        return prefix + _IMPORT.sub("", body).strip() + "\n\n"
+
+    def _page(self) -> str:
+        page = "\n".join(f"      <{name} />" for name in self.roots)
+        return f"export default function Page() {{\n  return (\n    <main>\n{page}\n    </main>\n  );\n}}\n"
+
+    def _html_head(self) -> str:
+        head = '<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n'
+        head += '<meta name="viewport" content="width=device-width, initial-scale=1">\n'
+        if self.format == "tailwind":
+            head += f'<script src="{TAILWIND_CDN}"></script>\n'
+        return head + "</head>\n<body>\n<main>\n"
+
+    def _complete(self, name: str) -> bool:
+        if name not in self.components:
+            return True
+        return name in self.code and all(self._complete(ref) for ref in self.components[name].refs)
+
+    def _render(self, name: str) -> str:
+        if name not in self.components:
+            # Общий компонент подставит запись архива
+            return f"<!-- component:{name} -->"
+        if name not in self._fragments:
+            fragment = strip_code_fences(self.code[name])
+            for ref in self.components[name].refs:
+                fragment = fragment.replace(f"<!-- component:{ref} -->", self._render(ref))
+            self._fragments[name] = fragment
+        return self._fragments[name]
+
+    def _ready_roots(self) -> List[str]:
+        parts = []
+        while self._next_root < len(self.roots) and self._complete(self.roots[self._next_root]):
+            parts.append(self._render(self.roots[self._next_root]) + "\n")
+            self._next_root += 1
+        if parts and not self._started and not self.shared_name:
+            self._started = True
+            parts.insert(0, self._html_head())
+        return parts
+
@@ -0,0 +1,77 @@
+// Долгоживущий воркер ESLint для сервиса codegen.
+//
+// Читает из stdin запросы NDJSON {"id": n, "chunks": ["..."]} и пишет в stdout
+// ответы {"id": n, "results": [{"passed": bool, "errors": n, "messages": [...]}]}.
+// Первая строка вывода — {"ready": true} или {"ready": false, "error": "..."}.
+// Чанки — TSX (Next.js); ESLint 9 и @typescript-eslint/parser закреплены в package.json.
+const readline = require('readline');
+
+let ESLint;
+let tsParser;
+try {
+  ({ ESLint } = require('eslint'));
+  tsParser = require('@typescript-eslint/parser');
+} catch (err) {
+  process.stdout.write(JSON.stringify({ ready: false, error: `eslint is not installed: ${err.message}` }) + '\n');
+  process.exit(1);
+}
+
+const CHUNK_FILE = 'chunk.tsx';
+
+const eslint = new ESLint({
+  // Flat config целиком задан здесь: eslint.config.js не ищется
+  overrideConfigFile: true,
+  fix: false,
+  overrideConfig: {
+    files: ['**/*.tsx'],
+    languageOptions: {
+      parser: tsParser,
+      ecmaVersion: 'latest',
+      sourceType: 'module',
+      parserOptions: { ecmaFeatures: { jsx: true } },
+    },
+    rules: {
+      'no-undef': 'off',
+      'no-unused-vars': 'off',
+      'no-dupe-keys': 'error',
+      'no-duplicate-case': 'error',
+      'no-unreachable': 'error',
+      'no-redeclare': 'error',
+      'valid-typeof': 'error',
+    },
+  },
+});
+
+async function lintChunk(code) {
+  const [result] = await eslint.lintText(code, { filePath: CHUNK_FILE });
+  // Чанк — целая часть модуля (import'ы, компонент или страница), поэтому
+  // ошибка разбора (fatal) — такой же провал, как и ошибка правила.
+  const errors = result.messages.filter((m) => m.fatal || m.severity === 2);
+  return {
+    passed: errors.length === 0,
+    errors: errors.length,
+    messages: errors.slice(0, 20).map((m) => `${m.line}:${m.column} ${m.ruleId || 'parse'} ${m.message}`),
+  };
+}
+
+const rl = readline.createInterface({ input: process.stdin });
+rl.on('line', async (line) => {
+  let request;
+  try {
+    request = JSON.parse(line);
+  } catch (err) {
+    return;
+  }
+  try {
+    const results = [];
+    for (const chunk of request.chunks) {
+      results.push(await lintChunk(chunk));
+    }
+    process.stdout.write(JSON.stringify({ id: request.id, results }) + '\n');
+  } catch (err) {
+    process.stdout.write(JSON.stringify({ id: request.id, error: err.message }) + '\n');
+  }
+});
+rl.on('close', () => process.exit(0));
+
+process.stdout.write(JSON.stringify({ ready: true }) + '\n');
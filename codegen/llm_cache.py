@@ -0,0 +1,184 @@
+"""
+Дисковый кэш готовых ответов LLM.
+
+Ключ — хеш (структурный хеш UI DSL, format, модель, версия промпта), значение — список чанков
+кода в JSON. Размер кэша ограничен суммарным объёмом файлов, при превышении
+удаляются давно не использованные записи (LRU по времени последнего доступа).
+
+Ключи, записанные для задания, хранятся рядом (jobs/<job_id>) столько же,
+сколько сами записи: удаление задания (GDPR) находит свой код в кэше в любой
+момент, а не только пока жива память процесса.
+"""
+import asyncio
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_JOB_ID = re.compile(r"[A-Za-z0-9_.-]{1,128}")
+
+
+def response_cache_key(ui_hash: str, format: str, model_id: str, prompt_version: str) -> str:
+    return hashlib.sha256(f"{ui_hash}\0{format}\0{model_id}\0{prompt_version}".encode()).hexdigest()
+
+
+class LLMResponseCache:
+    """Дисковый LRU-кэш ответов с ограничением по байтам"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.jobs_dir = self.directory / "jobs"
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> размер файла; порядок — от давно использованных к недавним
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_index()
+
+    def _path(self, key: str) -> Path:
+        # Двухуровневая раскладка, чтобы не держать десятки тысяч файлов в одном каталоге
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _load_index(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for path in self.directory.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self.total_bytes += size
+        self._prune_links()
+
+    def _prune_links(self) -> None:
+        """Убирает из ссылок задания ключи, вытесненные из кэша, и пустые файлы ссылок"""
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        for path in self.jobs_dir.iterdir():
+            keys = {key for key in path.read_text().split() if key in self._index}
+            if keys:
+                path.write_text("".join(f"{key}\n" for key in sorted(keys)))
+            else:
+                path.unlink(missing_ok=True)
+
+    def _links_path(self, job_id: str) -> Path:
+        name = job_id if _JOB_ID.fullmatch(job_id) and job_id.strip(".") else hashlib.sha256(job_id.encode()).hexdigest()
+        return self.jobs_dir / name
+
+    def _get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                chunks = json.loads(f.read())
+            # mtime служит временем последнего доступа для восстановления LRU после рестарта
+            os.utime(path, (time.time(), time.time()))
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.warning(f"Dropping unreadable codegen cache entry {key}: {str(e)}")
+            self._forget(key)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return chunks
+
+    def _put(self, key: str, chunks: List[Dict[str, Any]]) -> None:
+        data = json.dumps(chunks, separators=(",", ":")).encode()
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self.total_bytes += len(data)
+            victims = []
+            while self.total_bytes > self.max_bytes and self._index:
+                victim, size = self._index.popitem(last=False)
+                self.total_bytes -= size
+                self.evictions += 1
+                victims.append(victim)
+        for victim in victims:
+            try:
+                self._path(victim).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self.total_bytes -= self._index.pop(key, 0)
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _link(self, job_id: str, key: str) -> None:
+        with self._lock:
+            with open(self._links_path(job_id), "a") as f:
+                f.write(f"{key}\n")
+
+    def _forget_job(self, job_id: str) -> int:
+        paths = [self._links_path(job_id)]
+        # Экраны и компоненты пакетного задания: {job_id}-...
+        paths += [Path(path) for path in glob.glob(os.path.join(glob.escape(str(self.jobs_dir)), f"{glob.escape(job_id)}-*"))]
+        keys = set()
+        for path in paths:
+            try:
+                keys.update(path.read_text().split())
+                path.unlink()
+            except FileNotFoundError:
+                continue
+        for key in keys:
+            self._forget(key)
+        return len(keys)
+
+    async def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key: str, chunks: List[Dict[str, Any]]) -> None:
+        await asyncio.to_thread(self._put, key, chunks)
+
+    async def forget(self, key: str) -> None:
+        await asyncio.to_thread(self._forget, key)
+
+    async def link(self, job_id: str, key: str) -> None:
+        """Запоминает, что задание записало (или прочитало) ключ"""
+        await asyncio.to_thread(self._link, job_id, key)
+
+    async def forget_job(self, job_id: str) -> int:
+        """Удаляет записи, связанные с заданием и его экранами/компонентами; возвращает их число"""
+        return await asyncio.to_thread(self._forget_job, job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._index),
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,178 @@
+"""
+Общий клиент OpenRouter на всё время жизни сервиса.
+
+Один httpx.AsyncClient с keep-alive (и HTTP/2, если установлен h2) вместо нового
+соединения на каждую генерацию, семафор на число одновременных потоков к
+апстриму с учётом глубины очереди и повторы с экспоненциальной задержкой на
+429/5xx и сетевые ошибки.
+"""
+import asyncio
+import json
+import logging
+import random
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class UpstreamError(Exception):
+    """Апстрим вернул ошибку или недоступен после всех повторов"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UpstreamBusy(UpstreamError):
+    """Очередь на доступ к апстриму переполнена"""
+
+
+class OpenRouterClient:
+    def __init__(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        max_concurrency: int = 8,
+        max_queue: int = 100,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        timeout: float = 60.0,
+    ):
+        self.url = url
+        self.headers = headers
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Метрики
+        self.queue_depth = 0
+        self.active = 0
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    async def start(self) -> None:
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+            ),
+            headers=self.headers,
+        )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return delay * (0.5 + random.random() / 2)
+
+    async def stream_chat(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Отправляет запрос chat/completions со stream=True и отдаёт фрагменты content.
+        Повтор возможен только до получения первого фрагмента, чтобы не дублировать вывод.
+        """
+        if self._client is None:
+            await self.start()
+        if self.queue_depth >= self.max_queue:
+            raise UpstreamBusy("Upstream queue is full", status_code=503)
+
+        self.queue_depth += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queue_depth -= 1
+
+        self.active += 1
+        self.requests += 1
+        try:
+            attempt = 0
+            started = False
+            while True:
+                try:
+                    async with self._client.stream("POST", self.url, json=payload) as response:
+                        if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                            delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                            logger.warning(
+                                f"OpenRouter returned {response.status_code}, retrying in {delay:.1f}s"
+                            )
+                        elif response.status_code != 200:
+                            error_detail = await response.aread()
+                            logger.error(f"OpenRouter API error: {response.status_code}, {error_detail}")
+                            raise UpstreamError(
+                                f"OpenRouter API returned error: {response.status_code}",
+                                status_code=response.status_code,
+                            )
+                        else:
+                            async for line in response.aiter_lines():
+                                if not line or line == "data: [DONE]" or not line.startswith("data: "):
+                                    continue
+                                try:
+                                    json_data = json.loads(line[6:])
+                                except json.JSONDecodeError:
+                                    logger.warning(f"Failed to decode JSON from line: {line}")
+                                    continue
+                                content = json_data.get("choices", [{}])[0].get("delta", {}).get("content", "")
+                                if content:
+                                    started = True
+                                    yield content
+                            return
+                except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError) as e:
+                    if started or attempt >= self.max_retries:
+                        raise UpstreamError(f"Failed to connect to OpenRouter API: {str(e)}") from e
+                    delay = self._backoff(attempt, None)
+                    logger.warning(f"OpenRouter connection error: {str(e)}, retrying in {delay:.1f}s")
+                except httpx.RequestError as e:
+                    raise UpstreamError(f"Failed to connect to OpenRouter API: {str(e)}") from e
+
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(delay)
+        except UpstreamError:
+            self.failures += 1
+            raise
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "http2": HTTP2_AVAILABLE,
+        }
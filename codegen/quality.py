@@ -0,0 +1,348 @@
+"""
+Проверки качества сгенерированного кода.
+
+Вместо запуска `npx eslint` на каждый чанк чанки копятся в небольшие пачки и
+отправляются по pipe в пул долгоживущих воркеров ESLint (lint_worker.js) с
+таймаутом на каждую пачку. Доступность (alt/aria/label) и корректность
+вложенности тегов проверяются статически на Python; если Node или ESLint
+недоступны, эта же проверка используется и вместо линтера, а в issues
+попадает LINT_UNAVAILABLE. ESLint проверяет только TSX (формат next):
+HTML-форматы он не разбирает.
+"""
+import asyncio
+import json
+import logging
+import shutil
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LINT_WORKER_SCRIPT = str(Path(__file__).with_name("lint_worker.js"))
+LINT_UNAVAILABLE = "lint unavailable: ESLint is not running, markup checks only"
+
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+# Поля ввода, которым не нужна подпись
+UNLABELLED_INPUT_TYPES = {"hidden", "submit", "button", "reset", "image"}
+
+
+@dataclass
+class QualityResult:
+    linting_passed: bool
+    a11y_passed: bool
+    issues: List[str] = field(default_factory=list)
+
+
+class _MarkupChecker(HTMLParser):
+    """
+    Статическая проверка разметки (HTML или JSX) во фрагменте кода.
+    Незакрытые в конце фрагмента теги не считаются ошибкой — чанк может
+    оборваться посередине компонента; ошибкой считается только закрывающий тег
+    без соответствующего открывающего.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack: List[Tuple[str, Dict[str, Optional[str]]]] = []
+        self.text_seen: List[bool] = []
+        self.markup_issues: List[str] = []
+        self.a11y_issues: List[str] = []
+        self.label_targets = set()
+        self.inputs: List[Tuple[str, Dict[str, Optional[str]], bool]] = []
+
+    @staticmethod
+    def _has_accessible_name(attrs: Dict[str, Optional[str]]) -> bool:
+        return any(key in attrs for key in ("aria-label", "aria-labelledby", "title"))
+
+    def _inside(self, tag: str) -> bool:
+        return any(open_tag == tag for open_tag, _ in self.stack)
+
+    def handle_starttag(self, tag, attrs):
+        self._open(tag, dict(attrs), self_closing=False)
+
+    def handle_startendtag(self, tag, attrs):
+        self._open(tag, dict(attrs), self_closing=True)
+
+    def _open(self, tag: str, attrs: Dict[str, Optional[str]], self_closing: bool):
+        # HTMLParser приводит имена к нижнему регистру; JSX-компоненты (<Button>) не проверяем на a11y
+        raw = self.get_starttag_text() or ""
+        if raw[1:2].isupper():
+            if not self_closing:
+                self.stack.append((tag, {"aria-label": "component"}))
+                self.text_seen.append(False)
+            return
+        if tag == "img":
+            hidden = attrs.get("aria-hidden") == "true" or attrs.get("role") in ("presentation", "none")
+            if "alt" not in attrs and not hidden:
+                self.a11y_issues.append(f"<img> without alt (line {self.getpos()[0]})")
+        elif tag == "label":
+            target = attrs.get("for") or attrs.get("htmlfor")
+            if target:
+                self.label_targets.add(target)
+        elif tag in ("input", "select", "textarea"):
+            if (attrs.get("type") or "").lower() not in UNLABELLED_INPUT_TYPES:
+                self.inputs.append((tag, attrs, self._inside("label")))
+
+        if tag in VOID_ELEMENTS or self_closing:
+            if tag in ("button", "a") and not self._has_accessible_name(attrs):
+                self.a11y_issues.append(f"<{tag}> without text or aria-label (line {self.getpos()[0]})")
+            return
+        self.stack.append((tag, attrs))
+        self.text_seen.append(False)
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+        for depth in range(len(self.stack) - 1, -1, -1):
+            if self.stack[depth][0] == tag:
+                break
+        else:
+            # Закрывающий тег без пары: либо ошибка, либо открывающий остался в предыдущем чанке
+            if self.stack:
+                self.markup_issues.append(f"Unexpected </{tag}> (line {self.getpos()[0]})")
+            return
+        while len(self.stack) > depth:
+            open_tag, attrs = self.stack.pop()
+            had_text = self.text_seen.pop()
+            if had_text and self.text_seen:
+                self.text_seen[-1] = True
+            if open_tag != tag:
+                self.markup_issues.append(f"<{open_tag}> closed by </{tag}> (line {self.getpos()[0]})")
+            elif tag in ("button", "a") and not had_text and not self._has_accessible_name(attrs):
+                self.a11y_issues.append(f"<{tag}> without text or aria-label (line {self.getpos()[0]})")
+
+    def handle_data(self, data):
+        if data.strip() and self.text_seen:
+            self.text_seen[-1] = True
+
+    def finish(self) -> "_MarkupChecker":
+        self.close()
+        for tag, attrs, wrapped in self.inputs:
+            labelled = (
+                wrapped
+                or self._has_accessible_name(attrs)
+                or (attrs.get("id") is not None and attrs.get("id") in self.label_targets)
+            )
+            if not labelled:
+                self.a11y_issues.append(f"<{tag}> without label or aria-label")
+        return self
+
+
+def check_markup(code: str) -> QualityResult:
+    """Чисто-Python проверка: корректность вложенности тегов и базовая доступность"""
+    checker = _MarkupChecker()
+    try:
+        checker.feed(code)
+        checker.finish()
+    except Exception as e:
+        return QualityResult(False, False, [f"Markup parse error: {str(e)}"])
+    return QualityResult(
+        linting_passed=not checker.markup_issues,
+        a11y_passed=not checker.a11y_issues,
+        issues=checker.markup_issues + checker.a11y_issues,
+    )
+
+
+class LinterWorker:
+    """Долгоживущий процесс lint_worker.js, которому пачки чанков передаются по pipe"""
+
+    def __init__(self, node_cmd: str, script: str = LINT_WORKER_SCRIPT):
+        self.node_cmd = node_cmd
+        self.script = script
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+
+    async def start(self) -> None:
+        self._process = await asyncio.create_subprocess_exec(
+            self.node_cmd, self.script,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            cwd=str(Path(self.script).parent),
+        )
+        handshake = json.loads(await asyncio.wait_for(self._process.stdout.readline(), timeout=30))
+        if not handshake.get("ready"):
+            await self.stop()
+            raise RuntimeError(handshake.get("error", "lint worker failed to start"))
+        self._reader = asyncio.create_task(self._read_responses())
+
+    async def _read_responses(self) -> None:
+        while True:
+            line = await self._process.stdout.readline()
+            if not line:
+                break
+            try:
+                response = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            future = self._pending.pop(response.get("id"), None)
+            if future is not None and not future.done():
+                if "error" in response:
+                    future.set_exception(RuntimeError(response["error"]))
+                else:
+                    future.set_result(response["results"])
+        # Процесс завершился — все ожидающие запросы получают ошибку
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError("lint worker exited"))
+        self._pending.clear()
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    async def lint(self, chunks: List[str]) -> List[dict]:
+        request_id = self._next_id
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._process.stdin.write((json.dumps({"id": request_id, "chunks": chunks}) + "\n").encode())
+        await self._process.stdin.drain()
+        try:
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def stop(self) -> None:
+        if self._process is not None and self._process.returncode is None:
+            self._process.kill()
+            await self._process.wait()
+        if self._reader is not None:
+            self._reader.cancel()
+        self._process = None
+        self._reader = None
+
+
+class QualityChecker:
+    """
+    Пакетная проверка чанков: check() ставит чанк в очередь, диспетчер собирает
+    пачки до batch_size чанков (или ждёт не дольше batch_window секунд) и отдаёт
+    их свободному воркеру из ограниченного пула с таймаутом на пачку.
+    """
+
+    def __init__(
+        self,
+        node_cmd: str = "node",
+        workers: int = 2,
+        batch_size: int = 8,
+        batch_window: float = 0.05,
+        timeout: float = 10.0,
+    ):
+        self.node_cmd = node_cmd
+        self.workers_count = workers
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.timeout = timeout
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._batches = set()
+        self.eslint_available = False
+        # Метрики
+        self.checked = 0
+        self.batches = 0
+        self.timeouts = 0
+        self.fallbacks = 0
+
+    async def start(self) -> None:
+        if shutil.which(self.node_cmd) is not None:
+            for _ in range(self.workers_count):
+                worker = LinterWorker(self.node_cmd)
+                try:
+                    await worker.start()
+                except Exception as e:
+                    logger.warning(f"ESLint worker unavailable, using Python checks only: {str(e)}")
+                    break
+                self._idle.put_nowait(worker)
+        self.eslint_available = not self._idle.empty()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def close(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        for task in list(self._batches):
+            task.cancel()
+        while not self._idle.empty():
+            await self._idle.get_nowait().stop()
+
+    async def check(self, code: str, format: str = "next") -> QualityResult:
+        # Статическая проверка дешевая (доли миллисекунды на 2 КБ), выполняется сразу
+        markup = check_markup(code)
+        self.checked += 1
+        if format != "next":
+            return markup
+        if not self.eslint_available or self._dispatcher is None:
+            self.fallbacks += 1
+            markup.issues.append(LINT_UNAVAILABLE)
+            return markup
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((code, future))
+        lint = await future
+        if lint is None:
+            self.fallbacks += 1
+            markup.issues.append(LINT_UNAVAILABLE)
+            return markup
+        return QualityResult(
+            linting_passed=lint["passed"] and markup.linting_passed,
+            a11y_passed=markup.a11y_passed,
+            issues=lint.get("messages", []) + markup.issues,
+        )
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            worker = await self._idle.get()
+            task = asyncio.create_task(self._run_batch(worker, batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, worker: LinterWorker, batch: list) -> None:
+        self.batches += 1
+        results = None
+        try:
+            results = await asyncio.wait_for(worker.lint([code for code, _ in batch]), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning(f"ESLint batch of {len(batch)} chunks timed out, restarting worker")
+        except Exception as e:
+            logger.warning(f"ESLint batch failed: {str(e)}")
+        finally:
+            for index, (_, future) in enumerate(batch):
+                if not future.done():
+                    future.set_result(results[index] if results else None)
+            if results is None or not worker.alive:
+                await worker.stop()
+                try:
+                    await worker.start()
+                except Exception as e:
+                    logger.error(f"Could not restart ESLint worker: {str(e)}")
+            self._idle.put_nowait(worker)
+
+    def stats(self) -> dict:
+        return {
+            "eslint_available": self.eslint_available,
+            "workers": self.workers_count if self.eslint_available else 0,
+            "queued": self._queue.qsize(),
+            "checked": self.checked,
+            "batches": self.batches,
+            "timeouts": self.timeouts,
+            "fallbacks": self.fallbacks,
+        }
@@ -1,9 +1,18 @@
 from fastapi import FastAPI, HTTPException, BackgroundTasks
-import httpx, os, hashlib, json
+from fastapi.responses import StreamingResponse
+import os, hashlib, json, base64
 import asyncio
 import logging
+import time
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+
+from pix2fc.dag import gather_or_cancel
+from pix2fc.dsl import DslError, UiDocument
+from incremental import Component, PageAssembler, component_prompt, split_components
+from llm_cache import LLMResponseCache, response_cache_key
+from openrouter import OpenRouterClient, UpstreamError
+from quality import QualityChecker
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -13,24 +22,79 @@ logger = logging.getLogger(__name__)
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "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")
 DEEPSEEK_MODEL_ID = "deepseek/deepseek-chat:free"
+OPENROUTER_MAX_CONNECTIONS = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "20"))
+OPENROUTER_MAX_CONCURRENCY = int(os.getenv("OPENROUTER_MAX_CONCURRENCY", "8"))  # одновременных потоков к апстриму
+OPENROUTER_MAX_QUEUE = int(os.getenv("OPENROUTER_MAX_QUEUE", "100"))  # ожидающих генераций
+OPENROUTER_MAX_RETRIES = int(os.getenv("OPENROUTER_MAX_RETRIES", "3"))
+
+# Версия промпта входит в ключ кэша ответов: меняйте при любом изменении текста промпта
+PROMPT_VERSION = "4"
+COMPONENT_PROMPT_VERSION = f"{PROMPT_VERSION}-component"
+COMPONENT_CONCURRENCY = int(os.getenv("CODEGEN_COMPONENT_CONCURRENCY", "4"))  # компонентов одного задания в LLM одновременно
+COMPONENT_MAX_TOKENS = int(os.getenv("CODEGEN_COMPONENT_MAX_TOKENS", "4000"))  # токенов ответа на компонент
+CODEGEN_CACHE_DIR = os.getenv("CODEGEN_CACHE_DIR", "/tmp/pix2fullcode/codegen-cache")
+CODEGEN_CACHE_MAX_BYTES = int(os.getenv("CODEGEN_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+GENERATION_STATE_TTL = int(os.getenv("GENERATION_STATE_TTL", str(24 * 3600)))  # секунды хранения состояния генерации задания
 
-# Константы для ESLint и pa11y проверок
-ESLINT_CMD = "npx eslint --fix"
-PA11Y_CMD = "npx pa11y-ci"
+# Константы для проверок качества (ESLint-воркеры + статические a11y-проверки)
+QUALITY_NODE_CMD = os.getenv("QUALITY_NODE_CMD", "node")
+QUALITY_WORKERS = int(os.getenv("QUALITY_WORKERS", "2"))  # долгоживущих процессов ESLint
+QUALITY_BATCH_SIZE = int(os.getenv("QUALITY_BATCH_SIZE", "8"))  # чанков на один вызов воркера
+QUALITY_BATCH_WINDOW = float(os.getenv("QUALITY_BATCH_WINDOW", "0.05"))  # секунды ожидания пачки
+QUALITY_TIMEOUT = float(os.getenv("QUALITY_TIMEOUT", "10"))  # секунды на пачку
 
 app = FastAPI()
 
+# Один клиент OpenRouter на всё время жизни сервиса: keep-alive, HTTP/2 и ограничение параллелизма
+openrouter = OpenRouterClient(
+    OPENROUTER_API_URL,
+    headers={
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "HTTP-Referer": "https://pix2fullcode.ai",
+        "X-Title": "Pix2FullCode-3D",
+        "Content-Type": "application/json"
+    },
+    max_connections=OPENROUTER_MAX_CONNECTIONS,
+    max_concurrency=OPENROUTER_MAX_CONCURRENCY,
+    max_queue=OPENROUTER_MAX_QUEUE,
+    max_retries=OPENROUTER_MAX_RETRIES,
+)
+
+# Дисковый кэш готовых ответов LLM
+response_cache = LLMResponseCache(CODEGEN_CACHE_DIR, max_bytes=CODEGEN_CACHE_MAX_BYTES)
+
+# Пул ESLint-воркеров с пакетной обработкой чанков
+quality_checker = QualityChecker(
+    node_cmd=QUALITY_NODE_CMD,
+    workers=QUALITY_WORKERS,
+    batch_size=QUALITY_BATCH_SIZE,
+    batch_window=QUALITY_BATCH_WINDOW,
+    timeout=QUALITY_TIMEOUT,
+)
+
+@app.on_event("startup")
+async def startup_event():
+    await openrouter.start()
+    await quality_checker.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await openrouter.close()
+    await quality_checker.close()
+
 # Модели данных
 class CodeGenerationRequest(BaseModel):
-    ui_json: Dict[str, Any]
+    ui_json: Optional[Dict[str, Any]] = None
+    ui_dsl: Optional[str] = Field(default=None, description="UI DSL in the compact binary encoding, base64")
     format: str = Field(default="next", description="Format of the generated code: html, tailwind, or next")
     job_id: str = Field(..., description="UUID of the job")
 
 class CodeChunk(BaseModel):
     chunk_id: int
     content: str
-    linting_passed: bool
-    a11y_passed: bool
+    # None — проверка еще выполняется
+    linting_passed: Optional[bool] = None
+    a11y_passed: Optional[bool] = None
 
 class CodeGenerationResponse(BaseModel):
     chunks: List[CodeChunk]
@@ -40,110 +104,187 @@ class CodeGenerationResponse(BaseModel):
 # Состояние генерации для каждого задания
 generation_state = {}
 
-async def check_code_quality(code_chunk: str) -> tuple:
+# Генерации компонентов в процессе по ключу кэша: одинаковые компоненты одновременных заданий
+component_inflight: Dict[str, asyncio.Task] = {}
+
+async def check_code_quality(code_chunk: str, format: str = "next") -> tuple:
     """
-    Проверяет качество кода с использованием ESLint и pa11y-ci.
+    Проверяет качество кода: ESLint в пуле долгоживущих воркеров (если доступен Node)
+    и статическая проверка разметки и доступности (alt, aria, label).
     Возвращает кортеж (linting_passed, a11y_passed)
     """
-    # Заглушка для демонстрации - в реальном сервисе здесь будет вызов линтеров
-    # В производственной версии эти проверки должны быть выполнены в изолированной среде
-    await asyncio.sleep(0.5)  # Имитация проверки
-    linting_passed = True
-    a11y_passed = True
-    return linting_passed, a11y_passed
+    result = await quality_checker.check(code_chunk, format)
+    if result.issues:
+        logger.debug(f"Quality issues: {result.issues}")
+    return result.linting_passed, result.a11y_passed
+
+def load_document(request: CodeGenerationRequest) -> UiDocument:
+    """UI DSL запроса: бинарная кодировка (ui_dsl) или обычный UI JSON"""
+    try:
+        if request.ui_dsl is not None:
+            return UiDocument.decode(base64.b64decode(request.ui_dsl, validate=True))
+        if request.ui_json is not None:
+            return UiDocument.from_json(request.ui_json)
+    except (DslError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid UI DSL: {str(e)}")
+    raise HTTPException(status_code=422, detail="Either ui_json or ui_dsl is required")
+
+async def request_component(component: Component, format: str, meta: Dict[str, Any]) -> str:
+    """Один компонент целиком из LLM; seed детерминирован структурным хешем компонента"""
+    data = {
+        "model": DEEPSEEK_MODEL_ID,
+        "messages": [
+            {"role": "system", "content": "You are a professional UI developer expert in creating clean, accessible frontend code."},
+            {"role": "user", "content": component_prompt(component, format, meta)}
+        ],
+        "seed": int(component.cache_hash[:8], 16),
+        "stream": True,
+        "max_tokens": COMPONENT_MAX_TOKENS
+    }
+    parts = []
+    async for content in openrouter.stream_chat(data):
+        parts.append(content)
+    return "".join(parts)
+
+def component_cache_key(component: Component, format: str, meta: Dict[str, Any]) -> str:
+    subtree_hash = component.cache_hash
+    if meta:
+        subtree_hash = hashlib.sha256(f"{subtree_hash}\0{UiDocument(None, [], meta).structural_hash}".encode()).hexdigest()
+    return response_cache_key(subtree_hash, format, DEEPSEEK_MODEL_ID, COMPONENT_PROMPT_VERSION)
 
-async def generate_code_with_openrouter(ui_json: dict, format: str, seed: int) -> List[CodeChunk]:
+async def generate_component(component: Component, format: str, meta: Dict[str, Any]) -> Tuple[str, bool]:
     """
-    Генерирует код на основе UI JSON, используя OpenRouter API с моделью DeepSeek.
+    (код компонента, взят ли из кэша). Кэш — по структурному хешу поддерева;
+    один и тот же компонент из одновременных заданий генерируется один раз.
     """
-    # Преобразуем UI JSON в промпт для LLM
-    ui_json_str = json.dumps(ui_json, indent=2)
+    key = component_cache_key(component, format, meta)
+    cached = await response_cache.get(key)
+    if cached is not None:
+        return cached[0]["content"], True
     
-    prompt = f"""
-    Ты профессиональный UI разработчик. Создай рабочий фронтенд код на основе данного UI JSON.
+    task = component_inflight.get(key)
+    if task is None:
+        async def run():
+            try:
+                code = await request_component(component, format, meta)
+                if code.strip():
+                    await response_cache.put(key, [{"content": code}])
+                return code
+            finally:
+                component_inflight.pop(key, None)
+        task = component_inflight[key] = asyncio.ensure_future(run())
+    return await asyncio.shield(task), False
+
+async def run_generation(job_id: str, document: UiDocument, format: str) -> AsyncIterator[dict]:
+    """
+    Выполняет генерацию и отдает события по мере готовности:
+    component — готов код компонента, chunk — часть собранной страницы,
+    quality — результат проверки чанка, done — конец.
+    Компоненты генерируются параллельно (не больше COMPONENT_CONCURRENCY на
+    задание) и берутся из кэша по хешу поддерева; чанк компонента уходит
+    сразу, как только компонент готов, последним — сборка страницы (без LLM).
+    Проверки качества выполняются параллельно, а generation_state
+    обновляется по каждому чанку.
+    """
+    logger.info(f"Starting code generation for job {job_id} with format {format}")
+    purge_generation_state()
     
-    UI JSON описание:
-    ```json
-    {ui_json_str}
-    ```
+    cache_key = response_cache_key(document.structural_hash, format, DEEPSEEK_MODEL_ID, PROMPT_VERSION)
+    state = generation_state[job_id] = {"chunks": [], "complete": False, "started_at": time.time()}
+    # Ключи задания хранятся в кэше столько же, сколько записи, и удаляются вместе с заданием (GDPR)
+    await response_cache.link(job_id, cache_key)
     
-    Формат: {format}
+    cached_chunks = await response_cache.get(cache_key)
+    if cached_chunks is not None:
+        # Идентичное UI-дерево уже генерировалось — отдаем сохраненный ответ без обращения к LLM
+        logger.info(f"Code generation cache hit for job {job_id}")
+        for cached_chunk in cached_chunks:
+            chunk = CodeChunk(**cached_chunk)
+            state["chunks"].append(chunk)
+            yield {"event": "chunk", **chunk.model_dump()}
+        state["complete"] = True
+        yield {"event": "done", "complete": True, "chunks": len(state["chunks"]), "cached": True}
+        return
     
-    Пожалуйста, создай чистый, производственный код для всех компонентов, описанных в UI JSON.
-    Включи все необходимые импорты и интеграцию 3D-объектов, если они присутствуют в UI JSON.
-    Код должен соответствовать современным стандартам доступности и лучшим практикам.
-    """
+    roots, components = split_components(document)
+    assembler = PageAssembler(roots, components, format, document.meta.get("component"))
+    events: asyncio.Queue = asyncio.Queue()
+    checks: List[asyncio.Task] = []
+    limit = asyncio.Semaphore(COMPONENT_CONCURRENCY)
+    reused = 0
     
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "HTTP-Referer": "https://pix2fullcode.ai",
-        "X-Title": "Pix2FullCode-3D",
-        "Content-Type": "application/json"
-    }
+    async def check(chunk: CodeChunk):
+        chunk.linting_passed, chunk.a11y_passed = await check_code_quality(chunk.content, format)
+        await events.put(("quality", chunk))
     
-    data = {
-        "model": DEEPSEEK_MODEL_ID,
-        "messages": [
-            {"role": "system", "content": "You are a professional UI developer expert in creating clean, accessible frontend code."},
-            {"role": "user", "content": prompt}
-        ],
-        "seed": seed,
-        "stream": True,
-        "max_tokens": 4000
-    }
+    def emit(parts: List[str]):
+        for content in parts:
+            if not content.strip():
+                continue
+            chunk = CodeChunk(chunk_id=len(state["chunks"]), content=content)
+            state["chunks"].append(chunk)
+            events.put_nowait(("chunk", chunk))
+            checks.append(asyncio.create_task(check(chunk)))
     
-    chunks = []
-    chunk_id = 0
-    current_chunk = ""
+    async def component(name: str, meta: Dict[str, Any]):
+        nonlocal reused
+        await response_cache.link(job_id, component_cache_key(components[name], format, meta))
+        async with limit:
+            code, cached = await generate_component(components[name], format, meta)
+        reused += cached
+        events.put_nowait(("component", {"name": name, "cached": cached}))
+        emit(assembler.add(name, code))
     
-    try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            async with client.stream("POST", OPENROUTER_API_URL, headers=headers, json=data) as response:
-                if response.status_code != 200:
-                    error_detail = await response.aread()
-                    logger.error(f"OpenRouter API error: {response.status_code}, {error_detail}")
-                    raise HTTPException(status_code=500, detail=f"OpenRouter API returned error: {response.status_code}")
-                
-                async for line in response.aiter_lines():
-                    if not line or line == "data: [DONE]":
-                        continue
-                    
-                    if line.startswith("data: "):
-                        try:
-                            json_data = json.loads(line[6:])
-                            content = json_data.get("choices", [{}])[0].get("delta", {}).get("content", "")
-                            if content:
-                                current_chunk += content
-                                
-                                # Создаем новый чанк каждые 2k токенов (приблизительно)
-                                if len(current_chunk) > 2000:
-                                    linting_passed, a11y_passed = await check_code_quality(current_chunk)
-                                    chunks.append(CodeChunk(
-                                        chunk_id=chunk_id,
-                                        content=current_chunk,
-                                        linting_passed=linting_passed,
-                                        a11y_passed=a11y_passed
-                                    ))
-                                    chunk_id += 1
-                                    current_chunk = ""
-                        except json.JSONDecodeError:
-                            logger.warning(f"Failed to decode JSON from line: {line}")
-    
-    except (httpx.RequestError, asyncio.TimeoutError) as e:
-        logger.error(f"Error making request to OpenRouter API: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to connect to OpenRouter API: {str(e)}")
+    async def produce():
+        try:
+            # Поля страницы (3D-объекты) получает только первый компонент верхнего уровня
+            metas = {name: {} for name in components}
+            first = next((name for name in roots if name in components), None)
+            if first is not None:
+                metas[first] = document.meta
+            await gather_or_cancel(component(name, metas[name]) for name in components)
+            emit(assembler.finish())
+            await asyncio.gather(*checks)
+            await events.put(("done", None))
+        except Exception as e:
+            for task in checks:
+                task.cancel()
+            await events.put(("error", e))
     
-    # Добавляем последний чанк, если он не пустой
-    if current_chunk:
-        linting_passed, a11y_passed = await check_code_quality(current_chunk)
-        chunks.append(CodeChunk(
-            chunk_id=chunk_id,
-            content=current_chunk,
-            linting_passed=linting_passed,
-            a11y_passed=a11y_passed
-        ))
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            kind, item = await events.get()
+            if kind == "component":
+                yield {"event": "component", **item}
+            elif kind == "chunk":
+                yield {"event": "chunk", "chunk_id": item.chunk_id, "content": item.content}
+            elif kind == "quality":
+                yield {
+                    "event": "quality",
+                    "chunk_id": item.chunk_id,
+                    "linting_passed": item.linting_passed,
+                    "a11y_passed": item.a11y_passed
+                }
+            elif kind == "error":
+                state["error"] = str(item)
+                raise item
+            else:
+                break
+    finally:
+        if not producer.done():
+            producer.cancel()
+            for task in checks:
+                task.cancel()
     
-    return chunks
+    state["complete"] = True
+    if state["chunks"]:
+        await response_cache.put(cache_key, [chunk.model_dump() for chunk in state["chunks"]])
+    logger.info(f"Job {job_id}: {reused} of {len(components)} components reused from cache")
+    yield {
+        "event": "done", "complete": True, "chunks": len(state["chunks"]), "cached": False,
+        "components": len(components), "components_cached": reused
+    }
 
 @app.post("/generate", response_model=CodeGenerationResponse)
 async def generate_code(request: CodeGenerationRequest, background_tasks: BackgroundTasks):
@@ -152,34 +293,51 @@ async def generate_code(request: CodeGenerationRequest, background_tasks: Backgr
     Возвращает чанки кода с результатами проверки линтером и a11y.
     """
     job_id = request.job_id
-    ui_json = request.ui_json
-    format = request.format
-    
-    # Создаем детерминированный seed из UI JSON, как указано в ТЗ
-    seed = int(hashlib.crc32(json.dumps(ui_json, sort_keys=True).encode())) & 0xFFFFFFFF
-    
-    logger.info(f"Starting code generation for job {job_id} with format {format} and seed {seed}")
+    document = load_document(request)
     
     try:
-        # Запускаем генерацию кода асинхронно
-        chunks = await generate_code_with_openrouter(ui_json, format, seed)
-        
-        # Обновляем состояние генерации
-        generation_state[job_id] = {
-            "chunks": chunks,
-            "complete": True
-        }
+        async for _ in run_generation(job_id, document, request.format):
+            pass
         
         return CodeGenerationResponse(
-            chunks=chunks,
+            chunks=generation_state[job_id]["chunks"],
             complete=True,
             job_id=job_id
         )
     
+    except UpstreamError as e:
+        logger.error(f"Error making request to OpenRouter API: {str(e)}")
+        status_code = 503 if e.status_code in (429, 503) else 500
+        raise HTTPException(status_code=status_code, detail=str(e))
     except Exception as e:
         logger.error(f"Error during code generation for job {job_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Code generation failed: {str(e)}")
 
+@app.post("/generate/stream")
+async def generate_code_stream(request: CodeGenerationRequest):
+    """
+    Потоковая генерация кода в формате NDJSON: каждый CodeChunk отправляется сразу,
+    как только закрывается, а результаты проверок приходят отдельными событиями quality.
+    """
+    job_id = request.job_id
+    document = load_document(request)
+    
+    async def ndjson():
+        try:
+            async for event in run_generation(job_id, document, request.format):
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            logger.error(f"Error during code generation for job {job_id}: {str(e)}")
+            yield json.dumps({"event": "error", "detail": f"Code generation failed: {str(e)}"}) + "\n"
+    
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+def purge_generation_state():
+    """Состояние генерации нужно только на время задания — старое не копится в памяти"""
+    deadline = time.time() - GENERATION_STATE_TTL
+    for job_id in [job_id for job_id, state in generation_state.items() if state["started_at"] < deadline]:
+        del generation_state[job_id]
+
 @app.get("/status/{job_id}")
 async def get_generation_status(job_id: str):
     """
@@ -190,12 +348,28 @@ async def get_generation_status(job_id: str):
     
     return generation_state[job_id]
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Метрики клиента OpenRouter (глубина очереди, активные потоки, повторы),
+    кэша ответов и проверок качества.
+    """
+    return {
+        "openrouter": openrouter.metrics(),
+        "response_cache": response_cache.stats(),
+        "quality": quality_checker.stats()
+    }
+
 @app.delete("/job/{job_id}")
 async def delete_job(job_id: str):
     """
-    Удаляет данные генерации для указанного job_id (для соответствия GDPR).
+    Удаляет данные генерации для указанного job_id (для соответствия GDPR):
+    состояние задания и его экранов/компонентов ({job_id}-...) и записанные
+    для них ответы LLM в кэше.
     """
-    if job_id in generation_state:
-        del generation_state[job_id]
+    prefix = f"{job_id}-"
+    for key in [key for key in generation_state if key == job_id or key.startswith(prefix)]:
+        del generation_state[key]
+    await response_cache.forget_job(job_id)
     
     return {"status": "deleted", "job_id": job_id}
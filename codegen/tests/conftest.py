@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Модули сервиса импортируются по имени, как в образе; pix2fc — из исходников
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVICE_DIR.parent / "common"))
+sys.path.insert(0, str(SERVICE_DIR))
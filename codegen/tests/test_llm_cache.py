@@ -0,0 +1,79 @@
+import asyncio
+import os
+
+from llm_cache import LLMResponseCache, response_cache_key
+
+CHUNKS = [{"chunk_id": 0, "content": "x" * 100}]
+
+
+def test_key_depends_on_every_part():
+    base = response_cache_key("ui", "next", "model", "4")
+    assert len({
+        base,
+        response_cache_key("ui2", "next", "model", "4"),
+        response_cache_key("ui", "html", "model", "4"),
+        response_cache_key("ui", "next", "model2", "4"),
+        response_cache_key("ui", "next", "model", "5"),
+    }) == 5
+    assert base == response_cache_key("ui", "next", "model", "4")
+
+
+def test_round_trip_lru_eviction_and_forget(tmp_path):
+    keys = [response_cache_key(f"ui{i}", "next", "model", "4") for i in range(3)]
+
+    async def main():
+        cache = LLMResponseCache(str(tmp_path), max_bytes=300)
+        assert await cache.get(keys[0]) is None
+        await cache.put(keys[0], CHUNKS)
+        await cache.put(keys[1], CHUNKS)
+        assert await cache.get(keys[0]) == CHUNKS
+        # Третья запись не помещается: вытесняется давно не использованная keys[1]
+        await cache.put(keys[2], CHUNKS)
+        assert await cache.get(keys[1]) is None
+        await cache.forget(keys[2])
+        assert await cache.get(keys[2]) is None
+        return cache
+
+    cache = asyncio.run(main())
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"], stats["evictions"]) == (1, 1, 3, 1)
+
+
+def test_index_survives_restart_in_access_order(tmp_path):
+    keys = [response_cache_key(f"ui{i}", "next", "model", "4") for i in range(3)]
+
+    async def fill():
+        cache = LLMResponseCache(str(tmp_path), max_bytes=1000)
+        for key in keys:
+            await cache.put(key, CHUNKS)
+        for age, key in zip((300, 100, 200), keys):
+            path = cache._path(key)
+            os.utime(path, (path.stat().st_mtime - age,) * 2)
+
+    async def reopen():
+        cache = LLMResponseCache(str(tmp_path), max_bytes=300)
+        assert cache.stats()["entries"] == 3
+        await cache.put(response_cache_key("new", "next", "model", "4"), CHUNKS)
+        return [await cache.get(key) is not None for key in keys]
+
+    asyncio.run(fill())
+    # LRU восстановлен по mtime: первыми вытесняются keys[0] и keys[2]
+    assert asyncio.run(reopen()) == [False, True, False]
+
+
+def test_job_links_are_pruned_with_evicted_entries(tmp_path):
+    keys = [response_cache_key(f"ui{i}", "next", "model", "4") for i in range(3)]
+
+    async def fill():
+        cache = LLMResponseCache(str(tmp_path), max_bytes=300)
+        for key in keys:
+            await cache.link("job-a", key)
+            await cache.put(key, CHUNKS)
+        await cache.link("job-b", keys[0])
+
+    asyncio.run(fill())
+    reopened = LLMResponseCache(str(tmp_path), max_bytes=300)
+    # keys[0] вытеснен: у job-b не осталось записей, у job-a — две
+    assert sorted(path.name for path in reopened.jobs_dir.iterdir()) == ["job-a"]
+    assert asyncio.run(reopened.forget_job("job-a")) == 2
+    assert reopened.stats()["entries"] == 0
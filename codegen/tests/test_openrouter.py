@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from openrouter import OpenRouterClient, UpstreamBusy, UpstreamError
+
+
+def sse(*parts: str) -> bytes:
+    lines = [f"data: {json.dumps({'choices': [{'delta': {'content': part}}]})}" for part in parts]
+    return ("\n\n".join(lines + ["data: [DONE]"]) + "\n\n").encode()
+
+
+def make_client(handler, **kwargs) -> OpenRouterClient:
+    client = OpenRouterClient("https://upstream.test/v1/chat", headers={}, backoff_base=0.0, **kwargs)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+async def collect(client: OpenRouterClient) -> str:
+    return "".join([part async for part in client.stream_chat({"stream": True})])
+
+
+def test_retries_429_and_5xx_then_streams():
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(503),
+        httpx.Response(200, content=sse("Hello", ", ", "world")),
+    ]
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return responses.pop(0)
+
+    client = make_client(handler, max_retries=3)
+    assert asyncio.run(collect(client)) == "Hello, world"
+    metrics = client.metrics()
+    assert len(requests) == 3
+    assert (metrics["requests"], metrics["retries"], metrics["failures"]) == (1, 2, 0)
+
+
+def test_gives_up_after_max_retries_and_on_client_errors():
+    client = make_client(lambda request: httpx.Response(502), max_retries=2)
+    with pytest.raises(UpstreamError) as error:
+        asyncio.run(collect(client))
+    assert error.value.status_code == 502 and client.retries == 2
+
+    calls = []
+    client = make_client(lambda request: calls.append(request) or httpx.Response(400, content=b"bad"))
+    with pytest.raises(UpstreamError) as error:
+        asyncio.run(collect(client))
+    # 4xx, кроме 429, не повторяется
+    assert error.value.status_code == 400 and len(calls) == 1
+    assert client.metrics()["failures"] == 1
+
+
+def test_backoff_honours_retry_after():
+    client = OpenRouterClient("https://upstream.test", headers={}, backoff_base=1.0, backoff_max=20.0)
+    assert client._backoff(0, "7") == 7.0
+    assert client._backoff(0, "3600") == 20.0
+    # Без заголовка — экспонента с джиттером от половины до полной задержки
+    assert 2.0 <= client._backoff(2, None) <= 4.0
+    assert 2.0 <= client._backoff(2, "soon") <= 4.0
+
+
+def test_concurrency_limit_queue_depth_and_busy():
+    release = asyncio.Event()
+    active = {"now": 0, "peak": 0}
+
+    async def handler(request):
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        await release.wait()
+        active["now"] -= 1
+        return httpx.Response(200, content=sse("ok"))
+
+    async def main():
+        client = make_client(handler, max_concurrency=2, max_queue=3)
+        streams = [asyncio.ensure_future(collect(client)) for _ in range(5)]
+        for _ in range(10):
+            await asyncio.sleep(0)
+        depth = client.metrics()["queue_depth"]
+        with pytest.raises(UpstreamBusy) as busy:
+            await collect(client)
+        release.set()
+        results = await asyncio.gather(*streams)
+        await client.close()
+        return client, depth, busy.value, results
+
+    client, depth, busy, results = asyncio.run(main())
+    assert depth == 3 and busy.status_code == 503
+    assert active["peak"] == 2
+    assert results == ["ok"] * 5
+    assert client.metrics()["queue_depth"] == 0 and client.metrics()["active"] == 0
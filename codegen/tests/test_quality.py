@@ -0,0 +1,32 @@
+import asyncio
+
+from quality import LINT_UNAVAILABLE, QualityChecker, check_markup
+
+
+def test_markup_checks_nesting_and_accessibility():
+    assert check_markup('<div><img src="a.png" alt="Logo"><button>Buy</button></div>').linting_passed
+    broken = check_markup("<div><span></div>")
+    assert not broken.linting_passed
+    missing = check_markup('<img src="a.png"><input type="text"><a href="/"></a>')
+    assert not missing.a11y_passed
+    assert len(missing.issues) == 3
+    # Чанк может оборваться внутри компонента; JSX-компоненты на a11y не проверяются
+    assert check_markup("<main><section><NavBar />").linting_passed
+
+
+def test_without_eslint_next_chunks_report_lint_unavailable():
+    async def main():
+        checker = QualityChecker(node_cmd="pix2fc-missing-node")
+        await checker.start()
+        try:
+            next_result = await checker.check("export function A() { return <div>A</div>; }", "next")
+            html_result = await checker.check("<div>A</div>", "html")
+        finally:
+            await checker.close()
+        return checker, next_result, html_result
+
+    checker, next_result, html_result = asyncio.run(main())
+    assert not checker.eslint_available
+    assert LINT_UNAVAILABLE in next_result.issues
+    assert html_result.issues == []
+    assert checker.stats()["fallbacks"] == 1
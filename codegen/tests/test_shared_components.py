@@ -0,0 +1,108 @@
+import importlib.util
+import re
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from incremental import REF_TYPE, PageAssembler, split_components
+from pix2fc.bundle import BUNDLE_NAME, write_job_bundle
+from pix2fc.dsl import UiDocument
+from pix2fc.stages import batch_units
+
+# Поиск общих компонентов живёт в vision; загружаем модуль по пути, без сервиса
+_spec = importlib.util.spec_from_file_location(
+    "vision_components", Path(__file__).resolve().parents[2] / "vision" / "components.py"
+)
+vision_components = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(vision_components)
+
+
+def navbar(y):
+    return {
+        "type": "nav", "id": f"nav-{y}", "bbox": [0, y, 1, 0.1],
+        "children": [
+            {"type": "link", "text": "Home", "bbox": [0.05, y + 0.02, 0.1, 0.05]},
+            {"type": "link", "text": "About", "bbox": [0.2, y + 0.02, 0.1, 0.05]},
+        ],
+    }
+
+
+def screens():
+    return [
+        {"tree": [navbar(0.0), {"type": "text", "text": "Welcome", "bbox": [0, 0.2, 1, 0.1]}]},
+        {"tree": [{"type": "section", "bbox": [0, 0, 1, 0.5], "children": [
+            navbar(0.1), {"type": "button", "text": "Buy", "bbox": [0.4, 0.3, 0.2, 0.1]},
+        ]}]},
+    ]
+
+
+def walk(node):
+    yield node
+    for child in node.children:
+        yield from walk(child)
+
+
+def fake_llm(component, format):
+    """Код компонента так, как его просит промпт: ссылки — <Имя /> или заглушки"""
+    refs = [node.props["component"] for node in walk(component.node) if node.type == REF_TYPE]
+    if format == "next":
+        body = "".join(f"<{ref} />" for ref in refs)
+        return f"export function {component.name}() {{\n  return <div>{body}</div>;\n}}\n"
+    return "<div>" + "".join(f"<!-- component:{ref} -->" for ref in refs) + f"<span>{component.name}</span></div>"
+
+
+def build_bundle(tmp_path, format):
+    segmented = vision_components.dedupe_components(screens())
+    sections = []
+    for title, _, ui_json in batch_units("job", segmented):
+        document = UiDocument.from_json(ui_json)
+        roots, components = split_components(document)
+        # Компоненты добавляются так же, как их отдаёт run_generation, по мере готовности
+        assembler = PageAssembler(roots, components, format, document.meta.get("component"))
+        parts = []
+        for name, component in components.items():
+            parts += assembler.add(name, fake_llm(component, format))
+        parts += assembler.finish()
+        sections.append((title, [{"content": part} for part in parts]))
+    path = tmp_path / BUNDLE_NAME
+    write_job_bundle(path, "job", format, sections, [], None, fetch=None)
+    return segmented, zipfile.ZipFile(path)
+
+
+def test_shared_component_keeps_geometry_and_name(tmp_path):
+    segmented = vision_components.dedupe_components(screens())
+    (name, node), = segmented["components"].items()
+    assert name.startswith("Nav")
+    assert [child["bbox"] for child in node["children"]] == [[0.05, 0.02, 0.1, 0.05], [0.2, 0.02, 0.1, 0.05]]
+    document = UiDocument.from_json({"component": name, "tree": [node]})
+    roots, components = split_components(document)
+    assert roots == [name] and list(components) == [name]
+
+
+def test_next_screens_import_generated_components(tmp_path):
+    segmented, archive = build_bundle(tmp_path, "next")
+    (name,) = segmented["components"]
+    files = set(archive.namelist())
+    component = archive.read(f"src/components/{name}.tsx").decode()
+    assert f"export function {name}()" in component
+    assert "export default" not in component
+    for screen in ("src/screens/screen-00.tsx", "src/screens/screen-01.tsx"):
+        source = archive.read(screen).decode()
+        imports = re.findall(r'import \{ (\w+) \} from "\.\./components/(\w+)";', source)
+        assert imports == [(name, name)]
+        assert f"<{name} />" in source
+        assert f"src/components/{name}.tsx" in files
+        assert f"function {name}(" not in source
+
+
+@pytest.mark.parametrize("format", ["html", "tailwind"])
+def test_html_screens_inline_components(tmp_path, format):
+    segmented, archive = build_bundle(tmp_path, format)
+    (name,) = segmented["components"]
+    for screen in ("src/screens/screen-00.html", "src/screens/screen-01.html"):
+        source = archive.read(screen).decode()
+        assert "<!-- component:" not in source
+        assert f"<span>{name}</span>" in source
+        assert source.startswith("<!DOCTYPE html>")
+    assert not archive.read(f"src/components/{name}.html").decode().startswith("<!DOCTYPE")
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+import service
+from llm_cache import LLMResponseCache
+from pix2fc.dsl import UiDocument
+
+
+@pytest.fixture
+def generation(tmp_path, monkeypatch):
+    monkeypatch.setattr(service, "response_cache", LLMResponseCache(str(tmp_path), max_bytes=10 ** 6))
+    delays = {"header": 0.05, "text": 0.0, "footer": 0.01}
+
+    async def request_component(component, format, meta):
+        await asyncio.sleep(delays[component.node.type])
+        if format == "next":
+            return f'import {{ useState }} from "react";\nexport function {component.name}() {{ return <div />; }}'
+        return f"<div>{component.name}</div>"
+
+    monkeypatch.setattr(service, "request_component", request_component)
+
+    def run(format, job_id="job-stream"):
+        document = UiDocument.from_json({"tree": [
+            {"type": "header", "bbox": [0, 0, 1, 0.1]},
+            {"type": "text", "text": "Hi", "bbox": [0, 0.1, 1, 0.1]},
+            {"type": "footer", "bbox": [0, 0.9, 1, 0.1]},
+        ]})
+
+        async def collect():
+            return [event async for event in service.run_generation(job_id, document, format)]
+
+        return asyncio.run(collect())
+
+    yield run
+    service.generation_state.clear()
+
+
+def test_next_chunks_stream_as_components_finish(generation):
+    events = generation("next")
+    kinds = [event["event"] for event in events]
+    # Чанк готового компонента уходит раньше, чем закончен самый медленный
+    assert kinds.index("chunk") < max(i for i, kind in enumerate(kinds) if kind == "component")
+    chunks = [event for event in events if event["event"] == "chunk"]
+    assert [chunk["chunk_id"] for chunk in chunks] == [0, 1, 2, 3]
+    assert chunks[0]["content"].startswith('"use client";\nimport { useState } from "react";')
+    assert sum(chunk["content"].count("import { useState }") for chunk in chunks) == 1
+    assert chunks[-1]["content"].startswith("export default function Page()")
+    state = service.generation_state["job-stream"]
+    assert [chunk.content for chunk in state["chunks"]] == [chunk["content"] for chunk in chunks]
+    assert kinds[-1] == "done" and kinds.count("quality") == 4
+
+
+def test_html_roots_stream_in_page_order(generation):
+    events = generation("html", job_id="job-html")
+    chunks = [event["content"] for event in events if event["event"] == "chunk"]
+    assert chunks[0].startswith("<!DOCTYPE html>")
+    assert chunks[-1] == "</main>\n</body>\n</html>\n"
+    page = "".join(chunks)
+    assert page.index("Header") < page.index("Text") < page.index("Footer")
+
+
+def test_delete_finds_cache_entries_after_state_is_purged(generation, monkeypatch):
+    generation("html", job_id="job-gdpr-screen-01")
+    cache = service.response_cache
+    assert cache.stats()["entries"] == 4  # три компонента и собранная страница
+    monkeypatch.setattr(service, "GENERATION_STATE_TTL", -1)
+    service.purge_generation_state()
+    assert "job-gdpr-screen-01" not in service.generation_state
+
+    # Ссылки задания на ключи лежат на диске: их видит и новый процесс
+    monkeypatch.setattr(service, "response_cache", LLMResponseCache(str(cache.directory), max_bytes=10 ** 6))
+    asyncio.run(service.delete_job("job-gdpr"))
+    assert service.response_cache.stats()["entries"] == 0
+    assert list(service.response_cache.jobs_dir.iterdir()) == []
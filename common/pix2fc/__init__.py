@@ -0,0 +1,7 @@
+"""
+Общий код сервисов Pix2FullCode.
+
+Каждый сервис собирается отдельным образом; пакет устанавливается в образ
+из common/ (pip install ./common), поэтому формат данных, который сервисы
+передают друг другу, определён в одном месте.
+"""
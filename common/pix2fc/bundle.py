@@ -0,0 +1,157 @@
+"""
+ZIP-архив результата задания (job-<id>/bundle.zip).
+
+Файлы пишутся в архив потоком, запись за записью, по мере того как их
+отдают источники (чанки codegen, тела ответов gen3d и qa): ни архив, ни
+отдельный файл целиком в памяти не собираются. Уже сжатые форматы (GLB,
+PNG, JPEG...) кладутся без повторного deflate. Последней записью идёт
+manifest.json со списком файлов, размерами и sha256; sha256 манифеста
+записывается в комментарий архива и служит ETag при скачивании.
+У записей фиксированное время, поэтому одинаковое содержимое даёт одинаковый
+архив. Архив пишется во временный файл и атомарно заменяет прежний.
+
+Архив пишут и gateway (встроенный пайплайн), и orchestrator, а отдаёт
+gateway по ETag из комментария — поэтому формат определён только здесь.
+
+Общие компоненты пакетного задания лежат в src/components/<имя>: экраны
+Next.js импортируют их оттуда (component_module), а в HTML-экраны их
+фрагменты вставляются при записи архива вместо <!-- component:<имя> -->.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import zipfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+BUNDLE_NAME = "bundle.zip"
+MANIFEST_NAME = "manifest.json"
+# Повторное сжатие этих форматов только тратит CPU
+STORED_SUFFIXES = {".glb", ".png", ".jpg", ".jpeg", ".webp", ".gif", ".gz", ".zip", ".woff", ".woff2", ".mp4"}
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+READ_CHUNK = 1024 * 1024
+COMPONENT_SECTION = "components/"
+COMPONENT_PLACEHOLDER = re.compile(r"<!-- component:([A-Za-z0-9_]+) -->")
+
+
+def code_filename(title: Optional[str], format: str) -> str:
+    """Путь кода в архиве: страница задания или components/<имя>, screens/screen-NN пакетного"""
+    extension = "tsx" if format == "next" else "html"
+    if title is None:
+        return "src/page.tsx" if format == "next" else "index.html"
+    return f"src/{title}.{extension}"
+
+
+def component_module(name: str) -> str:
+    """Путь import'а общего компонента из файла экрана (src/screens → src/components)"""
+    return f"../{COMPONENT_SECTION}{name}"
+
+
+def inline_components(html: str, fragments: Dict[str, str]) -> str:
+    """Подставляет фрагменты общих компонентов вместо их комментариев-заглушек"""
+    return COMPONENT_PLACEHOLDER.sub(lambda match: fragments.get(match.group(1), match.group(0)), html)
+
+
+class BundleWriter:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        self._zip = zipfile.ZipFile(self._tmp_path, "w", allowZip64=True)
+        self.entries: List[Dict[str, Any]] = []
+
+    def __enter__(self) -> "BundleWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.abort()
+
+    def add(self, name: str, chunks: Iterable[bytes]) -> Dict[str, Any]:
+        """Пишет запись из потока байтов и возвращает её строку манифеста"""
+        stored = Path(name).suffix.lower() in STORED_SUFFIXES
+        info = zipfile.ZipInfo(name, ZIP_DATE_TIME)
+        info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+        info.external_attr = 0o644 << 16
+        hasher = hashlib.sha256()
+        size = 0
+        with self._zip.open(info, "w") as f:
+            for chunk in chunks:
+                hasher.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+        entry = {"path": name, "size": size, "sha256": hasher.hexdigest(), "compressed": not stored}
+        self.entries.append(entry)
+        return entry
+
+    def add_bytes(self, name: str, data: bytes) -> Dict[str, Any]:
+        return self.add(name, [data])
+
+    def add_file(self, name: str, path: Path) -> Dict[str, Any]:
+        with open(path, "rb") as f:
+            return self.add(name, iter(lambda: f.read(READ_CHUNK), b""))
+
+    def close(self, **manifest_fields: Any) -> Dict[str, Any]:
+        """Дописывает манифест и публикует архив; возвращает etag, размер и число файлов"""
+        manifest = dict(manifest_fields, files=self.entries)
+        data = json.dumps(manifest, indent=2, sort_keys=True, ensure_ascii=False).encode()
+        digest = hashlib.sha256(data).hexdigest()
+        info = zipfile.ZipInfo(MANIFEST_NAME, ZIP_DATE_TIME)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = 0o644 << 16
+        self._zip.writestr(info, data)
+        self._zip.comment = digest.encode()
+        self._zip.close()
+        os.replace(self._tmp_path, self.path)
+        return {"etag": digest, "size": self.path.stat().st_size, "files": len(self.entries)}
+
+    def abort(self) -> None:
+        try:
+            self._zip.close()
+        finally:
+            self._tmp_path.unlink(missing_ok=True)
+
+
+def bundle_etag(path: Path) -> Optional[str]:
+    """sha256 манифеста из комментария архива; читается только центральный каталог"""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return archive.comment.decode() or None
+    except (OSError, zipfile.BadZipFile, UnicodeDecodeError):
+        return None
+
+
+def write_job_bundle(
+    path: Path,
+    job_id: str,
+    format: str,
+    sections: Iterable[Tuple[Optional[str], List[Dict[str, Any]]]],
+    meshes: List[str],
+    qa_report: Optional[Dict[str, Any]],
+    fetch: Callable[[str, str], Iterator[bytes]],
+) -> Dict[str, Any]:
+    """
+    Архив задания: код разделов (заголовок, чанки codegen), mesh'и gen3d по
+    URL и отчёт QA с тепловой картой. fetch(service, path) отдаёт тело ответа
+    сервиса потоком; синхронно. Компоненты в sections должны идти раньше экранов
+    """
+    fragments: Dict[str, str] = {}
+    with BundleWriter(path) as bundle:
+        for title, chunks in sections:
+            if format == "next":
+                bundle.add(code_filename(title, format), (chunk["content"].encode() for chunk in chunks))
+                continue
+            # Разделы компонентов идут раньше экранов, так что их фрагменты уже известны
+            html = inline_components("".join(chunk["content"] for chunk in chunks), fragments)
+            if title and title.startswith(COMPONENT_SECTION):
+                fragments[title[len(COMPONENT_SECTION):]] = html.strip()
+            bundle.add_bytes(code_filename(title, format), html.encode())
+        for url in meshes:
+            bundle.add(f"assets/models/{url.rsplit('/', 1)[-1]}", fetch("gen3d", url))
+        if qa_report:
+            bundle.add_bytes("qa/report.json", json.dumps(qa_report, indent=2).encode())
+            if qa_report.get("heatmap_url"):
+                bundle.add("qa/heatmap.png", fetch("qa", qa_report["heatmap_url"]))
+        return bundle.close(job_id=job_id, format=format)
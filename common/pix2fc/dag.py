@@ -0,0 +1,150 @@
+"""
+Выполнение этапов пайплайна как графа зависимостей.
+
+Каждый этап ждёт только свои зависимости, поэтому независимые этапы идут
+параллельно, а общее время равно критическому пути, а не сумме этапов.
+Код детерминирован (задачи создаются в фиксированном порядке, используется
+только asyncio.gather), поэтому пригоден для выполнения внутри Temporal workflow.
+Тот же граф выполняет встроенный пайплайн gateway, когда Temporal недоступен.
+"""
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class StageFailed(Exception):
+    """
+    Этап завершился ошибкой; reason попадает в результат workflow.
+    retryable и retry_after использует исполнитель, который сам повторяет
+    вызовы сервисов (встроенный пайплайн); в workflow повторами управляет RetryPolicy.
+    """
+
+    def __init__(self, reason: str, retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class DependencyFailed(StageFailed):
+    """Этап не запускался, потому что обязательная зависимость упала"""
+
+
+@dataclass
+class Stage:
+    name: str
+    # Принимает результаты зависимостей {имя: результат}
+    run: Callable[[Dict[str, Any]], Awaitable[Any]]
+    deps: Tuple[str, ...] = ()
+    # Необязательный этап: без fail-fast его ошибка не останавливает зависимые этапы
+    optional: bool = False
+
+
+@dataclass
+class DagResult:
+    results: Dict[str, Any] = field(default_factory=dict)
+    errors: Dict[str, BaseException] = field(default_factory=dict)
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.errors)
+
+
+def _topological(stages: List[Stage]) -> List[Stage]:
+    by_name = {stage.name: stage for stage in stages}
+    ordered: List[Stage] = []
+    state: Dict[str, int] = {}
+
+    def visit(name: str, path: Tuple[str, ...]):
+        if name not in by_name:
+            raise ValueError(f"Unknown stage dependency: {name}")
+        if state.get(name) == 2:
+            return
+        if state.get(name) == 1:
+            raise ValueError(f"Stage dependency cycle: {' -> '.join(path + (name,))}")
+        state[name] = 1
+        for dep in by_name[name].deps:
+            visit(dep, path + (name,))
+        state[name] = 2
+        ordered.append(by_name[name])
+
+    for stage in stages:
+        visit(stage.name, ())
+    return ordered
+
+
+async def run_dag(
+    stages: List[Stage],
+    fail_fast: bool = True,
+    on_start: Optional[Callable[[str], None]] = None,
+    on_done: Optional[Callable[[str, Optional[BaseException]], None]] = None,
+) -> DagResult:
+    """
+    Запускает все этапы графа. При fail_fast первая ошибка отменяет остальные этапы
+    и пробрасывается; иначе граф выполняется до конца, а ошибки собираются в DagResult
+    (этапы, зависящие от упавшего обязательного этапа, получают DependencyFailed;
+    от упавшего необязательного — None вместо результата).
+    """
+    ordered = _topological(stages)
+    by_name = {stage.name: stage for stage in ordered}
+    tasks: Dict[str, asyncio.Future] = {}
+    outcome = DagResult()
+
+    async def execute(stage: Stage):
+        inputs = {}
+        for dep in stage.deps:
+            try:
+                inputs[dep] = await tasks[dep]
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if by_name[dep].optional and not fail_fast:
+                    inputs[dep] = None
+                    continue
+                raise DependencyFailed(f"{dep} failed: {e}") from e
+        if on_start:
+            on_start(stage.name)
+        try:
+            result = await stage.run(inputs)
+        except Exception as e:
+            if on_done:
+                on_done(stage.name, e)
+            raise
+        if on_done:
+            on_done(stage.name, None)
+        return result
+
+    for stage in ordered:
+        tasks[stage.name] = asyncio.ensure_future(execute(stage))
+
+    if fail_fast:
+        try:
+            results = await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            # Дожидаемся отмены, чтобы не оставлять висящих задач
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        outcome.results = dict(zip(tasks.keys(), results))
+        return outcome
+
+    results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    for name, result in zip(tasks.keys(), results):
+        if isinstance(result, BaseException):
+            outcome.errors[name] = result
+        else:
+            outcome.results[name] = result
+    return outcome
+
+
+async def gather_or_cancel(coroutines) -> list:
+    """asyncio.gather, который при первой ошибке отменяет остальные задачи"""
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
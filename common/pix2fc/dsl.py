@@ -0,0 +1,408 @@
+"""
+Типизированная модель UI DSL и её компактная бинарная кодировка.
+
+UI-дерево vision ({"dsl_version", "tree", "3d", ...}) разбирается один раз в
+узлы с __slots__: тип, bbox, текст, прочие поля (props) и дети. Бинарная
+форма — подмножество msgpack: узел — массив [type, bbox, text, props,
+children] без пустых полей в конце, ключи словарей отсортированы, а
+повторяющиеся строки (типы узлов, ключи props, классы) вынесены в таблицу
+строк и записываются ext-ссылкой на индекс. Кодировка каноническая: порядок
+ключей исходного JSON на неё не влияет, поэтому sha256 от неё — структурный
+хеш дерева, он вычисляется один раз на документ.
+
+Для промпта LLM есть отдельный компактный текстовый вид (render_prompt):
+строка на узел, вложенность — отступом, числа без ведущих нулей.
+
+Общий для vision, orchestrator и codegen (пакет pix2fc).
+"""
+import hashlib
+import json
+import struct
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+MEDIA_TYPE = "application/x-pix2-dsl"
+MAGIC = b"PXD\x01"
+STRING_EXT = 0  # ext-тип msgpack: индекс в таблице строк
+MIN_INTERNED_LENGTH = 3  # короче ссылка (3 байта) не экономит места
+PROMPT_HIDDEN_PROPS = {"score", "confidence"}  # уверенность детектора LLM не нужна
+
+
+class DslError(ValueError):
+    """Некорректный UI JSON или повреждённая бинарная кодировка"""
+
+
+class Node:
+    __slots__ = ("type", "bbox", "text", "props", "children")
+
+    def __init__(self, type: str, bbox: Optional[Tuple[Union[int, float], ...]] = None,
+                 text: Optional[str] = None, props: Optional[Dict[str, Any]] = None,
+                 children: Optional[List["Node"]] = None):
+        self.type = type
+        self.bbox = bbox
+        self.text = text
+        self.props = props or {}
+        self.children = children or []
+
+    @classmethod
+    def from_json(cls, data: Any) -> "Node":
+        if not isinstance(data, dict):
+            raise DslError(f"UI node must be an object, got {type(data).__name__}")
+        props = dict(data)
+        node = cls(str(props.pop("type", "element")))
+        bbox = props.get("bbox")
+        if isinstance(bbox, list) and len(bbox) == 4 and all(_is_number(v) for v in bbox):
+            # Тип чисел сохраняется: целый bbox после кодирования остаётся целым
+            node.bbox = tuple(props.pop("bbox"))
+        if isinstance(props.get("text"), str):
+            node.text = props.pop("text")
+        children = props.get("children")
+        # Пустой список и дети, которые не являются узлами, остаются в props как есть
+        if isinstance(children, list) and children and all(isinstance(child, dict) for child in children):
+            node.children = [cls.from_json(child) for child in props.pop("children")]
+        node.props = props
+        return node
+
+    def to_json(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"type": self.type}
+        if self.bbox is not None:
+            data["bbox"] = list(self.bbox)
+        if self.text is not None:
+            data["text"] = self.text
+        data.update(self.props)
+        if self.children:
+            data["children"] = [child.to_json() for child in self.children]
+        return data
+
+    def _fields(self) -> list:
+        children = [child._fields() for child in self.children]
+        fields = [self.type, self.bbox, self.text, self.props or None, children or None]
+        while fields[-1] is None:
+            fields.pop()
+        return fields
+
+    def size(self) -> int:
+        return 1 + sum(child.size() for child in self.children)
+
+
+class UiDocument:
+    __slots__ = ("version", "tree", "meta", "_encoded", "_hash")
+
+    def __init__(self, version: Optional[str], tree: List[Node], meta: Optional[Dict[str, Any]] = None):
+        self.version = version
+        self.tree = tree
+        self.meta = meta or {}  # остальные поля верхнего уровня: "3d", "component", ...
+        self._encoded: Optional[bytes] = None
+        self._hash: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, ui_json: Dict[str, Any]) -> "UiDocument":
+        if not isinstance(ui_json, dict):
+            raise DslError("UI JSON must be an object")
+        meta = dict(ui_json)
+        version = meta.pop("dsl_version", None)
+        tree = meta.pop("tree", [])
+        if not isinstance(tree, list):
+            raise DslError("UI JSON tree must be a list")
+        return cls(version, [Node.from_json(node) for node in tree], meta)
+
+    def to_json(self) -> Dict[str, Any]:
+        return dict(self.meta, dsl_version=self.version, tree=[node.to_json() for node in self.tree])
+
+    @classmethod
+    def decode(cls, data: bytes) -> "UiDocument":
+        if data[:len(MAGIC)] != MAGIC:
+            raise DslError("Not an encoded UI DSL document")
+        reader = _Reader(data, len(MAGIC))
+        try:
+            fields = reader.read()
+            if reader.pos != len(data) or not isinstance(fields, list) or len(fields) != 4:
+                raise DslError("Malformed UI DSL document")
+            strings, version, meta, tree = fields
+            # Ссылки ext на таблицу строк разрешаются после чтения всего документа
+            document = cls(_resolve(version, strings), [_node(node, strings) for node in tree], _resolve(meta, strings))
+        except (IndexError, struct.error, TypeError, UnicodeDecodeError) as e:
+            raise DslError(f"Malformed UI DSL document: {e}") from e
+        document._encoded = bytes(data)
+        return document
+
+    def encode(self) -> bytes:
+        """Каноническая бинарная форма; считается один раз"""
+        if self._encoded is None:
+            body = [self.version, self.meta, [node._fields() for node in self.tree]]
+            counts: Dict[str, int] = {}
+            _count_strings(body, counts)
+            strings = [s for s, count in counts.items() if count > 1 and len(s.encode()) >= MIN_INTERNED_LENGTH]
+            writer = _Writer({s: index for index, s in enumerate(strings)})
+            writer.out += MAGIC
+            writer.write_array_header(4)
+            writer.write_array_header(len(strings))
+            for s in strings:
+                writer.write_str(s)
+            for value in body:
+                writer.write(value)
+            self._encoded = bytes(writer.out)
+        return self._encoded
+
+    @property
+    def structural_hash(self) -> str:
+        if self._hash is None:
+            self._hash = hashlib.sha256(self.encode()).hexdigest()
+        return self._hash
+
+    def node_count(self) -> int:
+        return sum(node.size() for node in self.tree)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _node(fields: list, strings: List[str]) -> Node:
+    fields = [_resolve(field, strings) for field in fields[:4]] + fields[4:]
+    fields += [None] * (5 - len(fields))
+    node_type, bbox, text, props, children = fields
+    return Node(node_type, tuple(bbox) if bbox is not None else None, text, props,
+                [_node(child, strings) for child in children or []])
+
+
+class _Ref:
+    __slots__ = ("index",)
+
+    def __init__(self, index: int):
+        self.index = index
+
+
+def _resolve(value: Any, strings: List[str]) -> Any:
+    if isinstance(value, _Ref):
+        return strings[value.index]
+    if isinstance(value, list):
+        return [_resolve(item, strings) for item in value]
+    if isinstance(value, dict):
+        return {_resolve(key, strings): _resolve(item, strings) for key, item in value.items()}
+    return value
+
+
+def _count_strings(value: Any, counts: Dict[str, int]) -> None:
+    if isinstance(value, str):
+        counts[value] = counts.get(value, 0) + 1
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _count_strings(item, counts)
+    elif isinstance(value, dict):
+        for key in sorted(value):
+            _count_strings(key, counts)
+            _count_strings(value[key], counts)
+
+
+def _float32(value: float) -> Optional[bytes]:
+    """Четырёхбайтная запись, если значение восстанавливается из неё без потерь"""
+    try:
+        packed = struct.pack(">f", value)
+    except OverflowError:
+        return None
+    return packed if float(f"{struct.unpack('>f', packed)[0]:.7g}") == value else None
+
+
+class _Writer:
+    def __init__(self, interned: Dict[str, int]):
+        self.interned = interned
+        self.out = bytearray()
+
+    def write(self, value: Any) -> None:
+        out = self.out
+        if value is None:
+            out.append(0xc0)
+        elif value is True:
+            out.append(0xc3)
+        elif value is False:
+            out.append(0xc2)
+        elif isinstance(value, int):
+            self.write_int(value)
+        elif isinstance(value, float):
+            packed = _float32(value)
+            if packed is not None:
+                out.append(0xca)
+                out += packed
+            else:
+                out.append(0xcb)
+                out += struct.pack(">d", value)
+        elif isinstance(value, str):
+            index = self.interned.get(value)
+            if index is None:
+                self.write_str(value)
+            elif index < 0x100:
+                out += struct.pack(">BbB", 0xd4, STRING_EXT, index)
+            elif index < 0x10000:
+                out += struct.pack(">BbH", 0xd5, STRING_EXT, index)
+            else:
+                out += struct.pack(">BbI", 0xd6, STRING_EXT, index)
+        elif isinstance(value, (list, tuple)):
+            self.write_array_header(len(value))
+            for item in value:
+                self.write(item)
+        elif isinstance(value, dict):
+            self._write_header(len(value), 0x80, 0x10, 0xde, 0xdf)
+            for key in sorted(value):
+                if not isinstance(key, str):
+                    raise DslError(f"UI JSON keys must be strings, got {key!r}")
+                self.write(key)
+                self.write(value[key])
+        else:
+            raise DslError(f"Unsupported value in UI JSON: {type(value).__name__}")
+
+    def write_int(self, value: int) -> None:
+        out = self.out
+        if 0 <= value < 0x80 or -32 <= value < 0:
+            out += struct.pack(">b", value) if value < 0 else bytes((value,))
+        elif 0 <= value < 1 << 64:
+            for code, fmt, limit in ((0xcc, ">B", 1 << 8), (0xcd, ">H", 1 << 16), (0xce, ">I", 1 << 32), (0xcf, ">Q", 1 << 64)):
+                if value < limit:
+                    out.append(code)
+                    out += struct.pack(fmt, value)
+                    return
+        elif -(1 << 63) <= value < 0:
+            for code, fmt, limit in ((0xd0, ">b", 1 << 7), (0xd1, ">h", 1 << 15), (0xd2, ">i", 1 << 31), (0xd3, ">q", 1 << 63)):
+                if value >= -limit:
+                    out.append(code)
+                    out += struct.pack(fmt, value)
+                    return
+        else:
+            raise DslError(f"Integer out of range: {value}")
+
+    def write_str(self, value: str) -> None:
+        data = value.encode()
+        size = len(data)
+        if size < 0x20:
+            self.out.append(0xa0 | size)
+        elif size < 0x100:
+            self.out += struct.pack(">BB", 0xd9, size)
+        elif size < 0x10000:
+            self.out += struct.pack(">BH", 0xda, size)
+        else:
+            self.out += struct.pack(">BI", 0xdb, size)
+        self.out += data
+
+    def write_array_header(self, size: int) -> None:
+        self._write_header(size, 0x90, 0x10, 0xdc, 0xdd)
+
+    def _write_header(self, size: int, fix: int, fix_limit: int, code16: int, code32: int) -> None:
+        if size < fix_limit:
+            self.out.append(fix | size)
+        elif size < 0x10000:
+            self.out += struct.pack(">BH", code16, size)
+        else:
+            self.out += struct.pack(">BI", code32, size)
+
+
+_FIXED = {
+    0xcc: ">B", 0xcd: ">H", 0xce: ">I", 0xcf: ">Q",
+    0xd0: ">b", 0xd1: ">h", 0xd2: ">i", 0xd3: ">q",
+}
+
+
+class _Reader:
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = memoryview(data)
+        self.pos = pos
+
+    def _take(self, fmt: str) -> Any:
+        value = struct.unpack_from(fmt, self.data, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return value[0] if len(value) == 1 else value
+
+    def _str(self, size: int) -> str:
+        end = self.pos + size
+        if end > len(self.data):
+            raise DslError("Truncated string")
+        value = str(self.data[self.pos:end], "utf-8")
+        self.pos = end
+        return value
+
+    def read(self) -> Any:
+        code = self.data[self.pos]
+        self.pos += 1
+        if code < 0x80:
+            return code
+        if code >= 0xe0:
+            return code - 0x100
+        if code < 0x90:
+            return self._map(code & 0x0f)
+        if code < 0xa0:
+            return self._array(code & 0x0f)
+        if code < 0xc0:
+            return self._str(code & 0x1f)
+        if code == 0xc0:
+            return None
+        if code in (0xc2, 0xc3):
+            return code == 0xc3
+        if code in _FIXED:
+            return self._take(_FIXED[code])
+        if code == 0xca:
+            return float(f"{self._take('>f'):.7g}")
+        if code == 0xcb:
+            return self._take(">d")
+        if code in (0xd4, 0xd5, 0xd6):
+            ext_type, index = self._take({0xd4: ">bB", 0xd5: ">bH", 0xd6: ">bI"}[code])
+            if ext_type != STRING_EXT:
+                raise DslError(f"Unknown ext type {ext_type}")
+            return _Ref(index)
+        if code in (0xd9, 0xda, 0xdb):
+            return self._str(self._take({0xd9: ">B", 0xda: ">H", 0xdb: ">I"}[code]))
+        if code in (0xdc, 0xdd):
+            return self._array(self._take(">H" if code == 0xdc else ">I"))
+        if code in (0xde, 0xdf):
+            return self._map(self._take(">H" if code == 0xde else ">I"))
+        raise DslError(f"Unsupported type code 0x{code:02x}")
+
+    def _array(self, size: int) -> list:
+        return [self.read() for _ in range(size)]
+
+    def _map(self, size: int) -> dict:
+        result = {}
+        for _ in range(size):
+            key = self.read()
+            result[key] = self.read()
+        return result
+
+
+def _number(value: float) -> str:
+    text = f"{value:.4f}".rstrip("0").rstrip(".")
+    if text.startswith("0."):
+        return text[1:]
+    if text.startswith("-0."):
+        return "-" + text[2:]
+    return text if text not in ("", "-0") else "0"
+
+
+def _compact_json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def render_prompt(document: UiDocument) -> str:
+    """
+    Компактный текст дерева для LLM, строка на узел:
+    <отступ по глубине><type> <x,y,w,h> "<text>" {props}
+    """
+    lines = [f"dsl {document.version}"] if document.version else []
+    if document.meta:
+        lines.append(f"meta {_compact_json(document.meta)}")
+
+    def visit(node: Node, depth: int):
+        parts = [" " * depth + node.type]
+        if node.bbox is not None:
+            parts.append(",".join(_number(v) for v in node.bbox))
+        if node.text is not None:
+            parts.append(json.dumps(node.text, ensure_ascii=False))
+        props = {
+            key: value for key, value in node.props.items()
+            if key not in PROMPT_HIDDEN_PROPS and not (key == "children" and value == [])
+        }
+        if props:
+            parts.append(_compact_json(props))
+        lines.append(" ".join(parts))
+        for child in node.children:
+            visit(child, depth + 1)
+
+    for node in document.tree:
+        visit(node, 0)
+    return "\n".join(lines)
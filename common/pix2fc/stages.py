@@ -0,0 +1,118 @@
+"""
+Граф этапов пайплайна и его данные, общие для Temporal workflow и встроенного
+исполнителя gateway: веса прогресса, ключи чекпоинтов, разбор 3D-объектов,
+единицы генерации пакетного задания и итоговый результат.
+
+Модуль без ввода-вывода и недетерминизма: его импортирует код workflow.
+"""
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pix2fc.dag import DagResult, DependencyFailed, Stage, StageFailed
+
+# Доля общего прогресса (в %), которую добавляет завершение каждого этапа
+STAGE_WEIGHTS = {
+    "vision": 20,
+    "codegen": 35,
+    "gen3d": 20,
+    "qa": 15,
+    "export": 10,
+}
+GEN3D_SKIPPED_WARNING = "3D generation failed, site exported without 3D models"
+
+StageRun = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+def pipeline_stages(vision: StageRun, codegen: StageRun, gen3d: StageRun, qa: StageRun, export: StageRun) -> List[Stage]:
+    """vision → (codegen ∥ gen3d) → qa → export; gen3d необязателен"""
+    return [
+        Stage("vision", vision),
+        Stage("codegen", codegen, deps=("vision",)),
+        Stage("gen3d", gen3d, deps=("vision",), optional=True),
+        Stage("qa", qa, deps=("codegen", "gen3d")),
+        Stage("export", export, deps=("codegen", "qa", "gen3d")),
+    ]
+
+
+def input_hash(payload: Any) -> str:
+    """Стабильный хеш входа этапа (порядок ключей не важен)"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def normalize_3d_objects(spec, job_id: str) -> List[Dict[str, Any]]:
+    """
+    Приводит ui_json["3d"] к списку запросов Gen3D: допускается один объект,
+    список объектов или строка-промпт.
+    """
+    if not spec:
+        return []
+    items = spec if isinstance(spec, list) else [spec]
+    return [dict({"prompt": item} if isinstance(item, str) else item, job_id=job_id) for item in items]
+
+
+def screen_job_id(job_id: str, screen: int) -> str:
+    return f"{job_id}-screen-{screen:02d}"
+
+
+def component_job_id(job_id: str, component: str) -> str:
+    return f"{job_id}-component-{component}"
+
+
+def batch_units(job_id: str, segmented: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Единицы генерации пакетного задания: (заголовок раздела архива, job_id
+    генерации, UI JSON) — сначала общие компоненты, затем экраны.
+    """
+    components = [
+        (f"components/{name}", component_job_id(job_id, name),
+         {"dsl_version": segmented.get("dsl_version"), "component": name, "tree": [node]})
+        for name, node in sorted(segmented["components"].items())
+    ]
+    screens = [
+        (f"screens/screen-{number:02d}", screen_job_id(job_id, number), ui_json)
+        for number, ui_json in enumerate(segmented["screens"])
+    ]
+    return components + screens
+
+
+def batch_objects(job_id: str, segmented: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Запросы Gen3D пакетного задания; одинаковый объект нескольких экранов — один раз"""
+    unique = {}
+    for ui_json in list(segmented["components"].values()) + segmented["screens"]:
+        for request in normalize_3d_objects(ui_json.get("3d"), job_id):
+            unique.setdefault((request.get("prompt"), request.get("lod", 1)), request)
+    return list(unique.values())
+
+
+def mesh_urls(meshes) -> List[str]:
+    """URL готовых mesh'ей gen3d без повторов; пропущенный gen3d — пустой список"""
+    return sorted({mesh["glb_url"] for mesh in meshes or [] if mesh.get("glb_url")})
+
+
+def failure(job_id: str, error: BaseException, prefix: str = "PIPELINE_ERROR") -> Dict[str, Any]:
+    reason = error.reason if isinstance(error, StageFailed) else f"{prefix}: {str(error)}"
+    return {"status": "FAILED", "reason": reason, "job_id": job_id}
+
+
+def root_error(outcome: DagResult) -> Optional[BaseException]:
+    """Исходная ошибка графа, а не ошибки зависимых этапов; без fail-fast сбой gen3d — не ошибка"""
+    for name, error in outcome.errors.items():
+        if name == "gen3d" or isinstance(error, DependencyFailed):
+            continue
+        return error
+    return None
+
+
+def pipeline_result(job_id: str, outcome: DagResult, warnings: List[str], prefix: str = "PIPELINE_ERROR") -> Dict[str, Any]:
+    """Итог задания по результатам графа; без fail-fast сбой gen3d уже в warnings"""
+    error = root_error(outcome)
+    if error is not None:
+        return failure(job_id, error, prefix)
+    return {
+        "status": "SUCCESS",
+        "download": outcome.results["export"].get("url"),
+        "job_id": job_id,
+        "meshes": [mesh.get("glb_url") for mesh in outcome.results.get("gen3d") or []],
+        "warnings": outcome.results["qa"].get("warnings", []) + warnings,
+    }
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import zipfile
+
+import pytest
+
+from pix2fc.bundle import BUNDLE_NAME, MANIFEST_NAME, BundleWriter, bundle_etag, code_filename
+
+
+def write(path, files):
+    with BundleWriter(path) as bundle:
+        for name, data in files:
+            bundle.add(name, [data[:3], data[3:]])
+        return bundle.close(job_id="job", format="next")
+
+
+def test_bundle_contents_and_manifest(tmp_path):
+    path = tmp_path / "job-1" / BUNDLE_NAME
+    info = write(path, [("src/page.tsx", b"export default 1"), ("assets/models/a.glb", b"glTF....")])
+    with zipfile.ZipFile(path) as archive:
+        assert archive.read("src/page.tsx") == b"export default 1"
+        assert archive.getinfo("assets/models/a.glb").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo("src/page.tsx").compress_type == zipfile.ZIP_DEFLATED
+        manifest_data = archive.read(MANIFEST_NAME)
+        manifest = json.loads(manifest_data)
+    assert manifest["job_id"] == "job"
+    assert [entry["path"] for entry in manifest["files"]] == ["src/page.tsx", "assets/models/a.glb"]
+    assert manifest["files"][0]["sha256"] == hashlib.sha256(b"export default 1").hexdigest()
+    assert info == {"etag": hashlib.sha256(manifest_data).hexdigest(), "size": path.stat().st_size, "files": 2}
+    assert bundle_etag(path) == info["etag"]
+
+
+def test_same_content_gives_same_archive(tmp_path):
+    files = [("index.html", b"<html></html>")]
+    first = write(tmp_path / "a.zip", files)
+    second = write(tmp_path / "b.zip", files)
+    assert first == second
+    assert (tmp_path / "a.zip").read_bytes() == (tmp_path / "b.zip").read_bytes()
+
+
+def test_failed_write_keeps_previous_archive(tmp_path):
+    path = tmp_path / BUNDLE_NAME
+    info = write(path, [("index.html", b"old")])
+
+    def broken():
+        yield b"new"
+        raise OSError("source failed")
+
+    with pytest.raises(OSError):
+        with BundleWriter(path) as bundle:
+            bundle.add("index.html", broken())
+    assert bundle_etag(path) == info["etag"]
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_etag_of_foreign_or_missing_file(tmp_path):
+    plain = tmp_path / "plain.zip"
+    with zipfile.ZipFile(plain, "w") as archive:
+        archive.writestr("a.txt", "a")
+    assert bundle_etag(plain) is None
+    assert bundle_etag(tmp_path / "missing.zip") is None
+
+
+def test_code_filename():
+    assert code_filename(None, "next") == "src/page.tsx"
+    assert code_filename(None, "html") == "index.html"
+    assert code_filename("screens/screen-00", "next") == "src/screens/screen-00.tsx"
+    assert code_filename("components/Navbar", "tailwind") == "src/components/Navbar.html"
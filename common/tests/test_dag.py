@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from pix2fc.dag import DependencyFailed, Stage, StageFailed, gather_or_cancel, run_dag
+
+
+def stage(name, log, deps=(), optional=False, fail=None, delay=0.0):
+    async def run(inputs):
+        log.append(("start", name, sorted(inputs)))
+        await asyncio.sleep(delay)
+        if fail:
+            raise StageFailed(fail)
+        return f"{name}({','.join(str(inputs[dep]) for dep in deps)})"
+    return Stage(name, run, deps=deps, optional=optional)
+
+
+def test_independent_stages_run_in_parallel():
+    log = []
+    stages = [
+        stage("export", log, deps=("codegen", "gen3d")),
+        stage("codegen", log, deps=("vision",), delay=0.01),
+        stage("gen3d", log, deps=("vision",), delay=0.01),
+        stage("vision", log),
+    ]
+    outcome = asyncio.run(run_dag(stages))
+    assert outcome.results["export"] == "export(codegen(vision()),gen3d(vision()))"
+    started = [name for _, name, _ in log]
+    assert started[0] == "vision" and started[-1] == "export"
+    assert set(started[1:3]) == {"codegen", "gen3d"}
+
+
+def test_fail_fast_cancels_other_stages():
+    log = []
+    stages = [
+        stage("vision", log),
+        stage("codegen", log, deps=("vision",), fail="LLM down"),
+        stage("gen3d", log, deps=("vision",), delay=10),
+        stage("qa", log, deps=("codegen", "gen3d")),
+    ]
+    with pytest.raises(StageFailed, match="LLM down"):
+        asyncio.run(asyncio.wait_for(run_dag(stages), timeout=5))
+    assert ("start", "qa", ["codegen", "gen3d"]) not in log
+
+
+def test_optional_failure_passes_none_without_fail_fast():
+    log = []
+    stages = [
+        stage("vision", log),
+        stage("gen3d", log, deps=("vision",), optional=True, fail="GPU busy"),
+        stage("codegen", log, deps=("vision",), fail="bad tree"),
+        stage("qa", log, deps=("gen3d",)),
+        stage("export", log, deps=("codegen",)),
+    ]
+    outcome = asyncio.run(run_dag(stages, fail_fast=False))
+    assert outcome.results["qa"] == "qa(None)"
+    assert outcome.errors["gen3d"].reason == "GPU busy"
+    assert isinstance(outcome.errors["export"], DependencyFailed)
+    assert outcome.failed
+
+
+def test_cycle_and_unknown_dependency_are_rejected():
+    log = []
+    with pytest.raises(ValueError, match="cycle"):
+        asyncio.run(run_dag([stage("a", log, deps=("b",)), stage("b", log, deps=("a",))]))
+    with pytest.raises(ValueError, match="Unknown"):
+        asyncio.run(run_dag([stage("a", log, deps=("missing",))]))
+
+
+def test_gather_or_cancel_cancels_siblings():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def broken():
+        raise RuntimeError("boom")
+
+    async def main():
+        assert await gather_or_cancel(asyncio.sleep(0, result=n) for n in range(3)) == [0, 1, 2]
+        with pytest.raises(RuntimeError):
+            await gather_or_cancel([slow(), broken()])
+
+    asyncio.run(main())
+    assert cancelled == [True]
@@ -0,0 +1,115 @@
+import pytest
+
+from pix2fc.dsl import MAGIC, DslError, Node, UiDocument, render_prompt
+
+
+def sample_ui():
+    return {
+        "dsl_version": "1.0",
+        "3d": [{"prompt": "coffee cup", "lod": 1}],
+        "tree": [
+            {
+                "type": "navbar",
+                "bbox": [0, 0, 1, 0.08],
+                "role": "navigation",
+                "children": [
+                    {"type": "button", "bbox": [0.8, 0.01, 0.1, 0.05], "text": "Войти", "score": 0.97},
+                    {"type": "link", "bbox": [0.02, 0.01, 0.1, 0.05], "text": "Home", "href": "/"},
+                ],
+            },
+            {"type": "section", "bbox": [0, 0.1, 1, 0.5], "children": []},
+            {"type": "text", "text": "Без bbox", "classes": ["title", "title"], "level": 2, "hidden": False, "extra": None},
+        ],
+    }
+
+
+def test_json_round_trip():
+    ui = sample_ui()
+    assert UiDocument.from_json(ui).to_json() == ui
+
+
+def test_bbox_number_types_survive_round_trips():
+    ui = sample_ui()
+    document = UiDocument.from_json(ui)
+    for decoded in (document.to_json(), UiDocument.decode(document.encode()).to_json()):
+        bbox = decoded["tree"][0]["bbox"]
+        # 0 == 0.0 в Python, поэтому сравниваем и типы
+        assert [type(v) for v in bbox] == [int, int, int, float]
+        assert bbox == [0, 0, 1, pytest.approx(0.08)]
+
+
+def test_binary_round_trip_preserves_tree_and_meta():
+    ui = sample_ui()
+    data = UiDocument.from_json(ui).encode()
+    assert data.startswith(MAGIC)
+    decoded = UiDocument.decode(data).to_json()
+    assert decoded["3d"] == ui["3d"]
+    assert decoded["tree"][0]["children"][0]["text"] == "Войти"
+    assert decoded["tree"][1]["children"] == []
+    assert decoded["tree"][2] == ui["tree"][2]
+    for got, expected in zip(decoded["tree"][0]["children"][0]["bbox"], ui["tree"][0]["children"][0]["bbox"]):
+        assert got == pytest.approx(expected, abs=1e-6)
+    # Кодировка каноническая: повторное кодирование даёт те же байты
+    assert UiDocument.from_json(decoded).encode() == data
+
+
+def test_large_numbers_and_strings_round_trip():
+    ui = {
+        "dsl_version": "1.0",
+        "tree": [{
+            "type": "table",
+            "rows": 70000,
+            "offset": -2 ** 40,
+            "ratio": 1 / 3,
+            "text": "x" * 70000,
+            "children": [{"type": "cell", "text": str(i)} for i in range(300)],
+        }],
+    }
+    assert UiDocument.decode(UiDocument.from_json(ui).encode()).to_json() == ui
+
+
+def test_structural_hash_ignores_key_order():
+    ui = sample_ui()
+    reordered = dict(reversed(list(ui.items())))
+    reordered["tree"] = [dict(reversed(list(node.items()))) for node in ui["tree"]]
+    assert UiDocument.from_json(reordered).structural_hash == UiDocument.from_json(ui).structural_hash
+    changed = sample_ui()
+    changed["tree"][0]["children"][0]["text"] = "Выйти"
+    assert UiDocument.from_json(changed).structural_hash != UiDocument.from_json(ui).structural_hash
+
+
+def test_encoding_is_smaller_than_json():
+    import json
+    ui = {"dsl_version": "1.0", "tree": [
+        {"type": "card", "bbox": [0.1, i / 100, 0.8, 0.01], "classes": ["shadow", "rounded"], "text": f"Item {i}"}
+        for i in range(100)
+    ]}
+    assert len(UiDocument.from_json(ui).encode()) < len(json.dumps(ui)) / 2
+
+
+@pytest.mark.parametrize("data", [b"", b"{}", MAGIC, MAGIC + b"\x94\x90", MAGIC + b"\x94\x90\xc0\x80\x90\x00"])
+def test_decode_rejects_garbage(data):
+    with pytest.raises(DslError):
+        UiDocument.decode(data)
+
+
+@pytest.mark.parametrize("ui", [[], {"tree": {}}, {"tree": ["node"]}])
+def test_from_json_rejects_invalid(ui):
+    with pytest.raises(DslError):
+        UiDocument.from_json(ui)
+
+
+def test_render_prompt_is_compact():
+    text = render_prompt(UiDocument.from_json(sample_ui()))
+    lines = text.splitlines()
+    assert lines[0] == "dsl 1.0"
+    assert lines[2] == 'navbar 0,0,1,.08 {"role":"navigation"}'
+    assert lines[3] == ' button .8,.01,.1,.05 "Войти"'
+    assert "score" not in text and "children" not in text
+
+
+def test_node_size_counts_subtree():
+    document = UiDocument.from_json(sample_ui())
+    assert document.tree[0].size() == 3
+    assert document.node_count() == 5
+    assert isinstance(document.tree[0].children[0], Node)
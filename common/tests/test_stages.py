@@ -0,0 +1,81 @@
+import asyncio
+
+from pix2fc.dag import StageFailed, run_dag
+from pix2fc.stages import (
+    batch_objects, batch_units, failure, input_hash, mesh_urls, normalize_3d_objects, pipeline_result,
+    pipeline_stages,
+)
+
+
+def test_input_hash_ignores_key_order():
+    assert input_hash({"a": 1, "b": [1, 2]}) == input_hash({"b": [1, 2], "a": 1})
+    assert input_hash({"a": 1}) != input_hash({"a": 2})
+
+
+def test_normalize_3d_objects_accepts_all_forms():
+    assert normalize_3d_objects(None, "j") == []
+    assert normalize_3d_objects("chair", "j") == [{"prompt": "chair", "job_id": "j"}]
+    assert normalize_3d_objects([{"prompt": "lamp", "lod": 2}], "j") == [{"prompt": "lamp", "lod": 2, "job_id": "j"}]
+
+
+def test_batch_units_put_components_before_screens():
+    segmented = {
+        "dsl_version": 1,
+        "components": {"NavBar": {"type": "nav"}, "Footer": {"type": "footer"}},
+        "screens": [{"tree": [], "3d": "chair"}, {"tree": [], "3d": ["chair", "lamp"]}],
+    }
+    units = batch_units("j", segmented)
+    assert [(title, unit_id) for title, unit_id, _ in units] == [
+        ("components/Footer", "j-component-Footer"),
+        ("components/NavBar", "j-component-NavBar"),
+        ("screens/screen-00", "j-screen-00"),
+        ("screens/screen-01", "j-screen-01"),
+    ]
+    assert units[1][2] == {"dsl_version": 1, "component": "NavBar", "tree": [{"type": "nav"}]}
+    assert [request["prompt"] for request in batch_objects("j", segmented)] == ["chair", "lamp"]
+
+
+def test_mesh_urls_dedupe_and_skip_missing():
+    assert mesh_urls(None) == []
+    assert mesh_urls([{"glb_url": "/b.glb"}, {"glb_url": "/a.glb"}, {"glb_url": "/a.glb"}, {}]) == ["/a.glb", "/b.glb"]
+
+
+def run(fail_fast=True, **failures):
+    def make(name, result):
+        async def stage(deps):
+            if name in failures:
+                raise failures[name]
+            return result
+        return stage
+
+    async def main():
+        stages = pipeline_stages(
+            make("vision", {}),
+            make("codegen", {}),
+            make("gen3d", [{"glb_url": "/m.glb"}]),
+            make("qa", {"warnings": ["contrast"]}),
+            make("export", {"url": "/download/j"}),
+        )
+        return await run_dag(stages, fail_fast=fail_fast)
+
+    return asyncio.run(main())
+
+
+def test_pipeline_result_success_and_skipped_gen3d():
+    assert pipeline_result("j", run(), []) == {
+        "status": "SUCCESS",
+        "download": "/download/j",
+        "job_id": "j",
+        "meshes": ["/m.glb"],
+        "warnings": ["contrast"],
+    }
+    skipped = pipeline_result("j", run(False, gen3d=StageFailed("GPU")), ["no 3d"])
+    assert skipped["status"] == "SUCCESS"
+    assert skipped["meshes"] == []
+    assert skipped["warnings"] == ["contrast", "no 3d"]
+
+
+def test_pipeline_result_reports_root_cause():
+    result = pipeline_result("j", run(False, codegen=RuntimeError("boom")), [], "WORKFLOW_ERROR")
+    assert result == {"status": "FAILED", "reason": "WORKFLOW_ERROR: boom", "job_id": "j"}
+    assert failure("j", StageFailed("VISION_TIMEOUT"))["reason"] == "VISION_TIMEOUT"
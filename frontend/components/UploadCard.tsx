@@ -1,6 +1,8 @@
-import { useState, useRef } from 'react';
+import { useState, useRef, useEffect } from 'react';
 import { motion } from 'framer-motion';
 
+const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
+
 interface UploadCardProps {
   onProcessingComplete?: (imageUrl?: string) => void;
 }
@@ -11,6 +13,10 @@ export default function UploadCard({ onProcessingComplete }: UploadCardProps = {
   const [progress, setProgress] = useState(0);
   const [previewUrl, setPreviewUrl] = useState<string | null>(null);
   const fileInputRef = useRef<HTMLInputElement>(null);
+  const eventsRef = useRef<EventSource | null>(null);
+  
+  // Close the progress stream when the card unmounts mid-upload
+  useEffect(() => () => eventsRef.current?.close(), []);
   
   const handleChange = (e: React.ChangeEvent<HTMLInputElement>) => {
     if (e.target.files?.[0]) {
@@ -30,28 +36,72 @@ export default function UploadCard({ onProcessingComplete }: UploadCardProps = {
     if (!file || !previewUrl) return;
     
     setUploading(true);
+    setProgress(0);
+    
+    const finish = () => {
+      setUploading(false);
+      // Notify parent component that processing is complete
+      if (onProcessingComplete) {
+        onProcessingComplete(previewUrl);
+      } else {
+        // Show alert if no callback provided
+        alert('Upload complete! Processing your image...');
+      }
+    };
     
-    // Simulate upload progress
-    const interval = setInterval(() => {
-      setProgress(prev => {
-        const newProgress = prev + Math.random() * 15;
-        if (newProgress >= 100) {
-          clearInterval(interval);
-          setTimeout(() => {
-            setUploading(false);
-            // Notify parent component that processing is complete
-            if (onProcessingComplete) {
-              onProcessingComplete(previewUrl);
-            } else {
-              // Show alert if no callback provided
-              alert('Upload complete! Processing your image...');
-            }
-          }, 500);
-          return 100;
+    try {
+      const body = new FormData();
+      body.append('file', file);
+      const response = await fetch(`${API_URL}/upload`, { method: 'POST', body });
+      if (!response.ok) {
+        throw new Error(`Upload failed: ${response.status}`);
+      }
+      const { job_id, status } = await response.json();
+      
+      if (status === 'COMPLETED') {
+        setProgress(100);
+        finish();
+        return;
+      }
+      
+      // The gateway pushes progress only when it changes, so no polling is needed
+      eventsRef.current?.close();
+      const events = new EventSource(`${API_URL}/status/${job_id}/stream`);
+      eventsRef.current = events;
+      const close = () => {
+        events.close();
+        if (eventsRef.current === events) {
+          eventsRef.current = null;
         }
-        return newProgress;
+      };
+      events.addEventListener('progress', (event) => {
+        const data = JSON.parse((event as MessageEvent).data);
+        setProgress(data.progress);
+        if (data.status === 'COMPLETED') {
+          close();
+          finish();
+        } else if (data.status === 'FAILED' || data.status === 'CANCELED' || data.status === 'TERMINATED') {
+          close();
+          setUploading(false);
+          alert(data.error || 'Processing failed');
+        }
+      });
+      // The job was deleted or finished without a final progress event
+      events.addEventListener('end', () => {
+        close();
+        setUploading(false);
       });
-    }, 400);
+      events.onerror = () => {
+        // EventSource reconnects by itself unless the stream was closed by the server
+        if (events.readyState === EventSource.CLOSED) {
+          close();
+          setUploading(false);
+        }
+      };
+    } catch (error) {
+      setUploading(false);
+      alert(error instanceof Error ? error.message : 'Upload failed');
+    }
   };
 
   const handleDragOver = (e: React.DragEvent) => {
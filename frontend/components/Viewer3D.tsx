@@ -1,6 +1,22 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
 import { motion } from 'framer-motion';
 
+// <model-viewer> подключается скриптом в _document.tsx
+declare global {
+  namespace JSX {
+    interface IntrinsicElements {
+      'model-viewer': React.DetailedHTMLProps<React.HTMLAttributes<HTMLElement>, HTMLElement> & {
+        src?: string;
+        alt?: string;
+        'camera-controls'?: boolean;
+        'auto-rotate'?: boolean;
+      };
+    }
+  }
+}
+
+const POLL_WAIT = 30; // секунды long polling тикета gen3d
+
 interface ViewerProps {
   data: {
     status: string;
@@ -9,12 +25,50 @@ interface ViewerProps {
     imageUrl?: string;
     fallback?: boolean;
     glb_url?: string | null;
+    lods?: Record<string, string>;  // готовые уровни детализации: LOD -> URL GLB
+    ticket_url?: string | null;     // тикет gen3d, пока старшие LOD ещё строятся
   };
   retry3D: () => void;
   backToUpload?: () => void;
 }
 
+// Самый детальный из готовых LOD; модель подменяется на месте по мере готовности уровней
+const bestLod = (lods: Record<string, string>): [number, string] | null => {
+  const levels = Object.keys(lods).map(Number).sort((a, b) => b - a);
+  return levels.length ? [levels[0], lods[String(levels[0])]] : null;
+};
+
 const Viewer3D: React.FC<ViewerProps> = ({ data, retry3D, backToUpload }) => {
+  const [lods, setLods] = useState<Record<string, string>>(data.lods || {});
+  const [upgrading, setUpgrading] = useState(false);
+
+  useEffect(() => {
+    setLods(data.lods || {});
+    if (!data.ticket_url) return;
+
+    let cancelled = false;
+    const poll = async () => {
+      setUpgrading(true);
+      try {
+        while (!cancelled) {
+          const res = await fetch(`${data.ticket_url}?wait=${POLL_WAIT}`);
+          if (!res.ok) break;
+          const ticket = await res.json();
+          if (cancelled) break;
+          setLods(prev => ({ ...prev, ...(ticket.lods || {}) }));
+          if (ticket.status === 'completed' || ticket.status === 'failed') break;
+        }
+      } catch (e) {
+        // Остаёмся на уже показанном LOD
+      } finally {
+        if (!cancelled) setUpgrading(false);
+      }
+    };
+    poll();
+    return () => { cancelled = true; };
+  }, [data.ticket_url, data.lods]);
+
+  const best = bestLod(lods);
   // Проверка на фейковый результат - когда fallback=true и нет glb_url
   if (data.fallback && !data.glb_url) {
     return (
@@ -141,8 +195,25 @@ const Viewer3D: React.FC<ViewerProps> = ({ data, retry3D, backToUpload }) => {
       >
         <h2 className="retro-title mb-6 text-xl">3D GENERATION COMPLETE!</h2>
         
-        <div className="retro-container p-4 mb-6 h-64 flex items-center justify-center">
-          {data.imageUrl ? (
+        <div className="retro-container p-4 mb-6 h-64 flex items-center justify-center relative">
+          {best ? (
+            <>
+              <model-viewer
+                src={best[1]}
+                alt="3D Model"
+                camera-controls
+                auto-rotate
+                style={{ width: '100%', height: '100%', background: 'transparent' }}
+              />
+              <motion.span
+                className="absolute bottom-2 right-2 retro-text text-xs"
+                animate={upgrading ? { opacity: [0.5, 1, 0.5] } : { opacity: 1 }}
+                transition={{ duration: 2, repeat: upgrading ? Infinity : 0 }}
+              >
+                {upgrading ? `LOD ${best[0]} · UPGRADING...` : `LOD ${best[0]}`}
+              </motion.span>
+            </>
+          ) : data.imageUrl ? (
             <motion.div 
               className="w-32 h-64 relative perspective-500"
               animate={{ 
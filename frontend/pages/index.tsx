@@ -11,6 +11,8 @@ interface ResultData {
   imageUrl?: string;
   fallback?: boolean;
   glb_url?: string | null;
+  lods?: Record<string, string>;
+  ticket_url?: string | null;
 }
 
 interface StarProps {
@@ -1,5 +1,5 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Depends, Header
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Depends, Header, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Dict, List, Optional, Any
@@ -13,12 +13,21 @@ import logging
 import json
 import shutil
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 
 # Импорт для Temporal Client
 from temporalio.client import Client as TemporalClient
-from temporalio.common import RetryPolicy
-from temporalio.service import RPCError
+
+from pix2fc.bundle import BUNDLE_NAME
+from downloads import RangeNotSatisfiable, etag_matches, file_chunks, file_etag, parse_range
+from ingest import stream_upload, UploadError, UploadTooLarge
+from job_store import TERMINAL_STATUSES, create_job_store
+from lifecycle import StorageLifecycle
+from pipeline import EmbeddedPipeline
+from progress import ProgressHub, new_log_lines, sse_event
+from ratelimit import create_rate_limiter
+from temporal_status import TemporalStatusCache, workflow_id
+from result_cache import ResultCache, COMPLETED as CACHE_COMPLETED, cache_key
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -26,11 +35,57 @@ logger = logging.getLogger(__name__)
 
 # Константы
 MAX_FILE_SIZE = 4 * 1024 * 1024  # 4 МБ
+MAX_BATCH_SCREENS = 50  # экранов в одной пакетной загрузке
 RATE_LIMIT_FREE = 60  # 60 запросов в час
 RATE_LIMIT_PRO = 600  # 600 запросов в час
+RATE_LIMIT_STATUS_FREE = 3600  # дешёвые эндпоинты (/status), запросов в час
+RATE_LIMIT_STATUS_PRO = 36000
+RATE_LIMIT_WINDOW = 3600  # секунды
 STORAGE_DIR = os.getenv("STORAGE_DIR", "/tmp/pix2fullcode")
 TEMPORAL_HOST = os.getenv("TEMPORAL_HOST", "localhost:7233")
 WORKFLOW_TASK_QUEUE = os.getenv("WORKFLOW_TASK_QUEUE", "pix2fullcode-tasks")
+JOB_STORE_BACKEND = os.getenv("JOB_STORE_BACKEND", "memory")  # memory | sqlite
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(STORAGE_DIR, "jobs.sqlite3"))
+JOB_TTL = int(os.getenv("JOB_TTL", str(7 * 24 * 3600)))  # секунды
+JOB_STORE_MAX_JOBS = int(os.getenv("JOB_STORE_MAX_JOBS", "10000"))
+JOB_LOG_LIMIT = int(os.getenv("JOB_LOG_LIMIT", "200"))  # строк лога на задание
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", str(24 * 3600)))  # секунды
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+PROGRESS_POLL_INTERVAL = float(os.getenv("PROGRESS_POLL_INTERVAL", "1.0"))  # секунды
+SSE_KEEPALIVE_INTERVAL = 15  # секунды
+LIFECYCLE_UPLOAD_TTL = int(os.getenv("LIFECYCLE_UPLOAD_TTL", str(24 * 3600)))  # секунды хранения исходных изображений
+LIFECYCLE_INTERMEDIATE_TTL = int(os.getenv("LIFECYCLE_INTERMEDIATE_TTL", str(6 * 3600)))  # секунды хранения чекпоинтов
+LIFECYCLE_BUNDLE_TTL = int(os.getenv("LIFECYCLE_BUNDLE_TTL", str(JOB_TTL)))  # секунды хранения архивов результата
+LIFECYCLE_MAX_BYTES = int(os.getenv("LIFECYCLE_MAX_BYTES", str(20 * 1024 ** 3)))  # 20 ГБ на файлы заданий
+LIFECYCLE_INTERVAL = float(os.getenv("LIFECYCLE_INTERVAL", "300"))  # секунды между обходами
+LIFECYCLE_DELETE_BATCH = int(os.getenv("LIFECYCLE_DELETE_BATCH", "200"))  # путей на одно удаление в потоке
+JOB_FORGET_TIMEOUT = float(os.getenv("JOB_FORGET_TIMEOUT", "5"))  # секунды на удаление задания в сервисе
+DOWNLOAD_CACHE_MAX_AGE = int(os.getenv("DOWNLOAD_CACHE_MAX_AGE", "3600"))  # секунды кэширования архива на CDN
+TEMPORAL_STATUS_TTL = float(os.getenv("TEMPORAL_STATUS_TTL", "2.0"))  # секунды
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | sqlite
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", os.path.join(STORAGE_DIR, "ratelimit.sqlite3"))
+# Встроенный пайплайн (используется, когда Temporal недоступен)
+SERVICE_URLS = {
+    "vision": os.getenv("VISION_URL", "http://vision:8001"),
+    "codegen": os.getenv("CODEGEN_URL", "http://codegen:8002"),
+    "gen3d": os.getenv("GEN3D_URL", "http://gen3d:8003"),
+    "qa": os.getenv("QA_URL", "http://qa:8004"),
+}
+PIPELINE_MAX_JOBS = int(os.getenv("PIPELINE_MAX_JOBS", "4"))  # одновременных заданий
+PIPELINE_STAGE_CONCURRENCY = {  # одновременных вызовов каждого сервиса
+    "vision": int(os.getenv("PIPELINE_VISION_CONCURRENCY", "2")),
+    "codegen": int(os.getenv("PIPELINE_CODEGEN_CONCURRENCY", "4")),
+    "gen3d": int(os.getenv("PIPELINE_GEN3D_CONCURRENCY", "1")),
+    "qa": int(os.getenv("PIPELINE_QA_CONCURRENCY", "2")),
+}
+PIPELINE_MAX_ATTEMPTS = int(os.getenv("PIPELINE_MAX_ATTEMPTS", "3"))
+PIPELINE_STAGE_TIMEOUT = float(os.getenv("PIPELINE_STAGE_TIMEOUT", "600"))  # секунды на вызов сервиса
+
+# Бюджеты запросов: дорогие (/upload) и дешёвые (/status) эндпоинты считаются отдельно
+RATE_LIMITS = {
+    "upload": {"free": RATE_LIMIT_FREE, "pro": RATE_LIMIT_PRO},
+    "status": {"free": RATE_LIMIT_STATUS_FREE, "pro": RATE_LIMIT_STATUS_PRO},
+}
 
 # Модели данных
 class UploadResponse(BaseModel):
@@ -38,6 +93,12 @@ class UploadResponse(BaseModel):
     status: str = "PENDING"
     message: str = "Image uploaded successfully"
 
+class BatchUploadResponse(BaseModel):
+    job_id: str
+    status: str = "PENDING"
+    screens: int
+    message: str = "Screens uploaded successfully"
+
 class StatusResponse(BaseModel):
     job_id: str
     status: str
@@ -56,8 +117,20 @@ class JobMetadata(BaseModel):
     progress: int = 0
     logs: List[str] = []
 
-# Временное хранилище состояния задания (в реальном приложении использовался бы Redis или БД)
-job_store = {}
+# Хранилище состояния заданий (memory — в процессе, sqlite — общее для нескольких воркеров)
+job_store = create_job_store(
+    JOB_STORE_BACKEND,
+    path=JOB_STORE_PATH,
+    ttl_seconds=JOB_TTL,
+    max_jobs=JOB_STORE_MAX_JOBS,
+    max_logs=JOB_LOG_LIMIT,
+)
+
+# Лимитер запросов (memory — в процессе, sqlite — общий для нескольких воркеров)
+rate_limiter = create_rate_limiter(RATE_LIMIT_BACKEND, path=RATE_LIMIT_PATH)
+
+# Кэш результатов по хешу загрузки и формату
+result_cache = ResultCache(ttl_seconds=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_MAX_ENTRIES)
 
 app = FastAPI(title="Pix2FC Gateway")
 
@@ -73,9 +146,16 @@ app.add_middleware(
 # Создание Temporal клиента
 temporal_client = None
 
+# Кэш describe/query/result для workflow с объединением одновременных запросов
+temporal_status = TemporalStatusCache(lambda: temporal_client, ttl_seconds=TEMPORAL_STATUS_TTL)
+
+# Задачи встроенного пайплайна этого процесса по job_id: удаление задания их отменяет
+pipeline_tasks: Dict[str, asyncio.Task] = {}
+
 @app.on_event("startup")
 async def startup_event():
     global temporal_client
+    await storage_lifecycle.start()
     try:
         # Подключение к Temporal серверу
         temporal_client = await TemporalClient.connect(TEMPORAL_HOST)
@@ -84,9 +164,18 @@ async def startup_event():
         logger.error(f"Failed to connect to Temporal server: {str(e)}")
         # Продолжаем работу в режиме симуляции
         temporal_client = None
+        await embedded_pipeline.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await embedded_pipeline.close()
+    await storage_lifecycle.close()
+    await job_store.close()
+    await rate_limiter.close()
 
 # Защита от превышения лимита запросов
-async def check_rate_limit(authorization: Optional[str] = Header(None)):
+async def client_identity(request: Request, authorization: Optional[str] = Header(None)) -> Dict[str, str]:
+    """Пользователь, тариф и ключ лимитера клиента"""
     user_id = "anonymous"
     tier = "free"
     
@@ -97,80 +186,158 @@ async def check_rate_limit(authorization: Optional[str] = Header(None)):
         user_id = "demo_user"
         tier = "free"
     
-    # Проверка лимита запросов (заглушка, в реальном приложении использовался бы Redis)
-    limit = RATE_LIMIT_PRO if tier == "pro" else RATE_LIMIT_FREE
-    current_requests = 1  # Заглушка - в реальном приложении счетчик из Redis
+    # Анонимные клиенты лимитируются по IP, а не одним общим счетчиком
+    client_key = user_id
+    if user_id == "anonymous":
+        client_key = f"ip:{request.client.host if request.client else 'unknown'}"
+    return {"user_id": user_id, "tier": tier, "client_key": client_key}
+
+async def charge_rate_limit(budget: str, client: Dict[str, str], response: Response, cost: int = 1):
+    """Списывает cost запросов из бюджета клиента; 429, если бюджета не хватает"""
+    limit = RATE_LIMITS[budget][client["tier"]]
+    decision = await rate_limiter.hit(f"{budget}:{client['client_key']}", limit, RATE_LIMIT_WINDOW, cost)
+    headers = decision.headers()
+    
+    if not decision.allowed:
+        raise HTTPException(status_code=429, detail="Rate limit exceeded", headers=headers)
     
-    if current_requests > limit:
-        raise HTTPException(status_code=429, detail="Rate limit exceeded")
+    response.headers.update(headers)
+
+def rate_limited(budget: str):
+    """Создает зависимость, проверяющую лимит запросов для заданного бюджета"""
+    async def check_rate_limit(response: Response, client: Dict[str, str] = Depends(client_identity)):
+        await charge_rate_limit(budget, client, response)
+        return client
     
-    return {"user_id": user_id, "tier": tier}
+    return check_rate_limit
+
+check_rate_limit = rate_limited("upload")
+check_status_rate_limit = rate_limited("status")
 
 # Вспомогательные функции
+async def resolve_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Возвращает данные задания; для алиасов из кэша — данные исходного задания.
+    Своих файлов у алиаса нет, поэтому он истекает вместе с исходным заданием:
+    если того уже нет (удалено, истекло), запись алиаса удаляется.
+    """
+    job_data = await job_store.get(job_id)
+    if job_data is None:
+        return None
+    source_id = job_data.get("alias_of")
+    if source_id:
+        source_data = await job_store.get(source_id)
+        if source_data is None:
+            await job_store.delete(job_id)
+            return None
+        return source_data
+    return job_data
+
 def ensure_storage_dir(job_id: str) -> Path:
     """Создает и возвращает директорию для хранения файлов задания"""
     job_dir = Path(STORAGE_DIR) / f"job-{job_id}"
     job_dir.mkdir(parents=True, exist_ok=True)
     return job_dir
 
-async def start_workflow(job_id: str, format: str):
-    """Запускает Temporal workflow для обработки загруженного изображения"""
+async def start_workflow(job_id: str, format: str, screens: Optional[int] = None):
+    """
+    Запускает Temporal workflow для обработки загруженного изображения;
+    для пакетной загрузки (screens — число экранов) — пакетный workflow.
+    """
     try:
         if temporal_client:
             # Запуск workflow через Temporal
+            if screens is None:
+                workflow_name, args = "GenerateSiteWorkflow", [job_id, format]
+            else:
+                workflow_name, args = "GenerateBatchWorkflow", [job_id, format, screens]
             await temporal_client.start_workflow(
-                "GenerateSiteWorkflow", 
-                args=[job_id, format],
-                id=f"pix2fullcode-{job_id}",
+                workflow_name, 
+                args=args,
+                id=workflow_id(job_id),
                 task_queue=WORKFLOW_TASK_QUEUE,
-                retry_policy=RetryPolicy(
-                    maximum_attempts=3,
-                    maximum_interval_seconds=60
-                )
+                # Без RetryPolicy workflow: повторами управляют политики activity,
+                # а упавший run продолжается с чекпоинтов при перезапуске
             )
+            await job_store.update(job_id, status="PROCESSING", engine="temporal")
             logger.info(f"Started workflow for job {job_id}")
         else:
-            # Симуляция workflow для демонстрации
-            logger.info(f"Simulating workflow for job {job_id}")
-            job_store[job_id]["status"] = "PROCESSING"
-            job_store[job_id]["logs"].append(f"Started processing at {datetime.now().isoformat()}")
+            # Без Temporal пайплайн выполняется встроенным исполнителем в этом процессе
+            logger.info(f"Running embedded pipeline for job {job_id}")
+            await job_store.update(job_id, status="PROCESSING", engine="embedded")
+            await job_store.append_log(job_id, f"Started processing at {datetime.now().isoformat()}")
             
-            # Запускаем бэкграунд-задачу для симуляции прогресса
-            asyncio.create_task(simulate_progress(job_id))
+            task = pipeline_tasks[job_id] = asyncio.create_task(run_embedded_pipeline(job_id, format, screens))
+            task.add_done_callback(lambda _: pipeline_tasks.pop(job_id, None))
             
     except Exception as e:
         logger.error(f"Failed to start workflow for job {job_id}: {str(e)}")
-        job_store[job_id]["status"] = "FAILED"
-        job_store[job_id]["error"] = str(e)
+        result_cache.invalidate_job(job_id)
+        await job_store.update(job_id, status="FAILED", error=str(e))
 
-async def simulate_progress(job_id: str):
-    """Симулирует прогресс обработки для демонстрации"""
-    for progress in range(0, 101, 10):
-        await asyncio.sleep(3)  # Симулируем задержку в обработке
-        
-        if job_id not in job_store:
-            return
-            
-        job_store[job_id]["progress"] = progress
-        job_store[job_id]["logs"].append(f"Progress: {progress}%")
-        
-        # Симулируем различные этапы
-        if progress == 30:
-            job_store[job_id]["logs"].append("Completed vision segmentation")
-        elif progress == 50:
-            job_store[job_id]["logs"].append("Generated code with DeepSeek")
-        elif progress == 70:
-            job_store[job_id]["logs"].append("Created 3D models")
-        elif progress == 90:
-            job_store[job_id]["logs"].append("Running quality checks")
-        elif progress == 100:
-            job_store[job_id]["status"] = "COMPLETED"
-            job_store[job_id]["logs"].append("Processing completed successfully")
-            
-            # Создаем симуляцию ZIP-файла
-            job_dir = ensure_storage_dir(job_id)
-            with open(job_dir / "result.txt", "w") as f:
-                f.write("This is a simulated result file")
+async def report_pipeline_progress(job_id: str, progress: int, message: str):
+    """Записывает прогресс этапа встроенного пайплайна и будит подписчиков SSE"""
+    if not await job_store.update(job_id, progress=progress):
+        return
+    await job_store.append_log(job_id, message)
+    progress_hub.notify(job_id)
+
+async def run_embedded_pipeline(job_id: str, format: str, screens: Optional[int] = None):
+    """Выполняет пайплайн встроенным исполнителем и записывает итог в хранилище заданий"""
+    if screens is None:
+        result = await embedded_pipeline.run(job_id, format)
+    else:
+        result = await embedded_pipeline.run_batch(job_id, format, screens)
+    if result["status"] == "SUCCESS":
+        await job_store.update(job_id, status="COMPLETED", progress=100, warnings=result["warnings"])
+        await job_store.append_log(job_id, "Processing completed successfully")
+        result_cache.complete(job_id)
+    else:
+        await job_store.update(job_id, status="FAILED", error=result["reason"])
+        await job_store.append_log(job_id, f"Processing failed: {result['reason']}")
+        result_cache.invalidate_job(job_id)
+    progress_hub.notify(job_id)
+
+# Встроенный исполнитель пайплайна: лимит заданий, лимиты этапов, чекпоинты в каталоге задания
+embedded_pipeline = EmbeddedPipeline(
+    STORAGE_DIR,
+    SERVICE_URLS,
+    report=report_pipeline_progress,
+    max_jobs=PIPELINE_MAX_JOBS,
+    stage_concurrency=PIPELINE_STAGE_CONCURRENCY,
+    max_attempts=PIPELINE_MAX_ATTEMPTS,
+    timeout=PIPELINE_STAGE_TIMEOUT,
+)
+
+async def job_is_active(job_id: str) -> Optional[bool]:
+    """Для жизненного цикла хранилища: None — записи нет, True — задание ещё выполняется"""
+    job_data = await job_store.get(job_id)
+    if job_data is None:
+        return None
+    return job_data["status"] not in TERMINAL_STATUSES
+
+async def expire_job(job_id: str):
+    """Файлы задания удалены по TTL или квоте — запись и кэш результата больше не нужны"""
+    await job_store.delete(job_id)
+    result_cache.invalidate_job(job_id)
+
+# Жизненный цикл файлов заданий: TTL по классам артефактов, общая квота, удаление в фоне
+storage_lifecycle = StorageLifecycle(
+    STORAGE_DIR,
+    ttls={
+        "uploads": LIFECYCLE_UPLOAD_TTL,
+        "intermediate": LIFECYCLE_INTERMEDIATE_TTL,
+        "bundles": LIFECYCLE_BUNDLE_TTL,
+    },
+    max_bytes=LIFECYCLE_MAX_BYTES,
+    is_active=job_is_active,
+    on_expire=expire_job,
+    interval=LIFECYCLE_INTERVAL,
+    batch_size=LIFECYCLE_DELETE_BATCH,
+    # Чужие каталоги видны как «без записи», если у каждого воркера своё хранилище в памяти
+    delete_orphans=JOB_STORE_BACKEND == "sqlite",
+    orphan_grace=JOB_TTL,
+)
 
 # API эндпоинты
 @app.post("/upload", response_model=UploadResponse)
@@ -188,7 +355,7 @@ async def upload_image(
     job_id = str(uuid4())
     
     # Сохраняем метаданные задания
-    job_store[job_id] = {
+    await job_store.create(job_id, {
         "job_id": job_id,
         "user_id": rate_limit["user_id"],
         "filename": file.filename,
@@ -197,22 +364,44 @@ async def upload_image(
         "status": "PENDING",
         "progress": 0,
         "logs": ["Job created"],
-    }
-    
-    # Сохраняем файл
-    job_dir = ensure_storage_dir(job_id)
-    file_extension = os.path.splitext(file.filename)[1]
-    file_path = job_dir / f"upload{file_extension}"
+    })
     
     try:
-        # Чтение и проверка размера файла
-        content = await file.read()
-        if len(content) > MAX_FILE_SIZE:
-            raise HTTPException(status_code=400, detail=f"File too large. Max size is {MAX_FILE_SIZE/1024/1024} MB")
+        # Потоковое сохранение файла: чанки, ранний обрыв по размеру, запись вне event loop
+        job_dir = await asyncio.to_thread(ensure_storage_dir, job_id)
+        upload = await stream_upload(file, job_dir, MAX_FILE_SIZE)
+        
+        await job_store.update(
+            job_id,
+            content_hash=upload.sha256,
+            size=upload.size,
+            image_format=upload.format,
+            width=upload.width,
+            height=upload.height,
+        )
+        
+        # Идентичная загрузка уже обработана или обрабатывается — не запускаем пайплайн повторно
+        key = cache_key(upload.sha256, format)
+        cached = result_cache.lookup(key)
+        if cached is not None and await job_store.exists(cached.job_id):
+            await asyncio.to_thread(shutil.rmtree, job_dir, True)
+            if cached.state == CACHE_COMPLETED:
+                await job_store.update(job_id, alias_of=cached.job_id, status="COMPLETED", progress=100)
+                await job_store.append_log(job_id, f"Served from result cache (job {cached.job_id})")
+                return UploadResponse(
+                    job_id=job_id,
+                    status="COMPLETED",
+                    message="Identical image already processed, result served from cache"
+                )
+            await job_store.update(job_id, alias_of=cached.job_id)
+            await job_store.append_log(job_id, f"Joined in-flight job {cached.job_id}")
+            return UploadResponse(
+                job_id=job_id,
+                status="PENDING",
+                message="Identical image is already being processed, job joined"
+            )
         
-        # Запись файла на диск
-        with open(file_path, "wb") as f:
-            f.write(content)
+        result_cache.register(key, job_id)
         
         # Запуск обработки в фоновом режиме
         background_tasks.add_task(start_workflow, job_id, format)
@@ -222,12 +411,14 @@ async def upload_image(
             status="PENDING",
             message="Image uploaded successfully, processing started"
         )
+    except UploadError as e:
+        await job_store.update(job_id, status="FAILED", error=str(e))
+        status_code = 413 if isinstance(e, UploadTooLarge) else 400
+        raise HTTPException(status_code=status_code, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing upload for job {job_id}: {str(e)}")
         # Очистка в случае ошибки
-        if job_id in job_store:
-            job_store[job_id]["status"] = "FAILED"
-            job_store[job_id]["error"] = str(e)
+        await job_store.update(job_id, status="FAILED", error=str(e))
         
         if temporal_client:
             # TODO: отмена workflow в случае ошибки
@@ -235,54 +426,128 @@ async def upload_image(
             
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
-@app.get("/status/{job_id}", response_model=StatusResponse)
-async def status(job_id: str):
-    """Возвращает текущий статус обработки задания"""
-    # Проверка наличия задания
-    if job_id not in job_store:
+@app.post("/upload/batch", response_model=BatchUploadResponse)
+async def upload_batch(
+    response: Response,
+    files: List[UploadFile] = File(...),
+    format: str = "next",
+    rate_limit: Dict = Depends(client_identity),
+    background_tasks: BackgroundTasks = BackgroundTasks()
+):
+    """
+    Загрузка всех экранов приложения одним запросом. Экраны обрабатываются одним
+    пакетным заданием: общая сегментация, однократная генерация общих компонентов
+    и один архив на выходе. Экраны хранятся в job-<id>/screen-NN/.
+    Каждый экран списывает из бюджета "upload" столько же, сколько одиночная загрузка.
+    """
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    if len(files) > MAX_BATCH_SCREENS:
+        raise HTTPException(status_code=400, detail=f"Too many screens. Max is {MAX_BATCH_SCREENS}")
+    for file in files:
+        if file.content_type not in ("image/png", "image/jpeg"):
+            raise HTTPException(status_code=400, detail=f"Only PNG/JPEG allowed ({file.filename})")
+    # До записи на диск: отклонённый пакет ничего не оставляет в STORAGE_DIR
+    await charge_rate_limit("upload", rate_limit, response, cost=len(files))
+    
+    job_id = str(uuid4())
+    await job_store.create(job_id, {
+        "job_id": job_id,
+        "user_id": rate_limit["user_id"],
+        "filename": f"{len(files)} screens",
+        "format": format,
+        "timestamp": datetime.now().isoformat(),
+        "status": "PENDING",
+        "progress": 0,
+        "logs": [f"Batch job created ({len(files)} screens)"],
+    })
+    
+    job_dir = await asyncio.to_thread(ensure_storage_dir, job_id)
+    try:
+        screens = []
+        for number, file in enumerate(files):
+            screen_dir = job_dir / f"screen-{number:02d}"
+            await asyncio.to_thread(screen_dir.mkdir, exist_ok=True)
+            upload = await stream_upload(file, screen_dir, MAX_FILE_SIZE)
+            screens.append({
+                "filename": file.filename,
+                "content_hash": upload.sha256,
+                "size": upload.size,
+                "image_format": upload.format,
+                "width": upload.width,
+                "height": upload.height,
+            })
+        await job_store.update(job_id, batch=True, screens=screens)
+    except UploadError as e:
+        await job_store.update(job_id, status="FAILED", error=f"{file.filename}: {str(e)}")
+        await asyncio.to_thread(shutil.rmtree, job_dir, True)
+        status_code = 413 if isinstance(e, UploadTooLarge) else 400
+        raise HTTPException(status_code=status_code, detail=f"{file.filename}: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error processing batch upload for job {job_id}: {str(e)}")
+        await job_store.update(job_id, status="FAILED", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    
+    background_tasks.add_task(start_workflow, job_id, format, len(files))
+    
+    return BatchUploadResponse(
+        job_id=job_id,
+        screens=len(files),
+        message="Screens uploaded successfully, processing started"
+    )
+
+async def sync_temporal_job(job_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Переносит прогресс workflow в хранилище заданий и обновляет кэш результатов"""
+    source_id = job_data["job_id"]
+    snapshot = await temporal_status.get(source_id)
+    if snapshot is None:
+        return job_data
+    
+    changes = {}
+    if snapshot["status"] != job_data["status"]:
+        changes["status"] = snapshot["status"]
+    if snapshot["progress"] != job_data["progress"]:
+        changes["progress"] = snapshot["progress"]
+    if snapshot["error"] and snapshot["error"] != job_data.get("error"):
+        changes["error"] = snapshot["error"]
+    if snapshot["stage"] and snapshot["stage"] != job_data.get("stage"):
+        changes["stage"] = snapshot["stage"]
+    if changes:
+        await job_store.update(source_id, **changes)
+        if changes.get("status") in TERMINAL_STATUSES:
+            await job_store.append_log(source_id, f"Workflow finished with status {changes['status']}")
+            if changes["status"] == "COMPLETED":
+                result_cache.complete(source_id)
+            else:
+                result_cache.invalidate_job(source_id)
+    
+    # Логи workflow отдаем поверх локальных строк задания
+    job_data = dict(job_data, **changes)
+    job_data["logs"] = job_data["logs"] + snapshot["logs"]
+    return job_data
+
+async def build_status(job_id: str) -> Optional[StatusResponse]:
+    """Собирает статус задания со всеми строками лога; None, если задание не найдено"""
+    # Проверка наличия задания (алиасы кэша отражают исходное задание)
+    job_data = await resolve_job(job_id)
+    if job_data is None:
         # Проверка Temporal (если доступен)
-        if temporal_client:
-            try:
-                # Получаем статус из Temporal
-                handle = temporal_client.get_workflow_handle(f"pix2fullcode-{job_id}")
-                desc = await handle.describe()
-                
-                # Возвращаем статус на основе описания workflow
-                status_map = {
-                    "RUNNING": "PROCESSING",
-                    "COMPLETED": "COMPLETED",
-                    "FAILED": "FAILED",
-                    "CANCELED": "CANCELED",
-                    "TERMINATED": "TERMINATED",
-                    "CONTINUED_AS_NEW": "PROCESSING",
-                    "TIMED_OUT": "FAILED"
-                }
-                
-                status = status_map.get(desc.status.name, "UNKNOWN")
-                
-                # Получаем результат, если workflow завершен
-                result = None
-                if status == "COMPLETED":
-                    try:
-                        result = await handle.result()
-                    except Exception as e:
-                        logger.error(f"Error getting workflow result for {job_id}: {str(e)}")
-                
-                return StatusResponse(
-                    job_id=job_id,
-                    status=status,
-                    progress=100 if status == "COMPLETED" else 0,
-                    logs=[f"Workflow status: {status}"],
-                    error=str(desc.failure) if desc.failure else None
-                )
-            except RPCError:
-                raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
-        else:
-            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        snapshot = await temporal_status.get(job_id)
+        if snapshot is None:
+            return None
+        return StatusResponse(
+            job_id=job_id,
+            status=snapshot["status"],
+            progress=snapshot["progress"],
+            logs=snapshot["logs"],
+            error=snapshot["error"]
+        )
     
-    # Возвращаем статус из локального хранилища
-    job_data = job_store[job_id]
+    # Задания, запущенные в Temporal, синхронизируем с кэшированным состоянием workflow
+    if job_data.get("engine") == "temporal" and job_data["status"] not in TERMINAL_STATUSES:
+        job_data = await sync_temporal_job(job_data)
     
+    # Возвращаем статус из локального хранилища
     # Расчет приблизительного ETA (если задание в процессе)
     eta = None
     if job_data["status"] == "PROCESSING" and job_data["progress"] > 0:
@@ -299,19 +564,79 @@ async def status(job_id: str):
         job_id=job_id,
         status=job_data["status"],
         progress=job_data["progress"],
-        logs=job_data["logs"][-10:],  # Возвращаем только последние 10 записей лога
+        logs=job_data["logs"],
         eta=eta,
         error=job_data.get("error")
     )
 
-@app.get("/download/{job_id}")
-async def download(job_id: str):
-    """Скачивание ZIP-архива с результатом обработки"""
-    # Проверка наличия задания
-    if job_id not in job_store:
+async def fetch_progress_snapshot(job_id: str) -> Optional[Dict[str, Any]]:
+    status_response = await build_status(job_id)
+    return status_response.model_dump() if status_response is not None else None
+
+# Один наблюдатель на задание для всех SSE-подписчиков
+progress_hub = ProgressHub(fetch_progress_snapshot, poll_interval=PROGRESS_POLL_INTERVAL)
+
+@app.get("/status/{job_id}", response_model=StatusResponse)
+async def status(job_id: str, rate_limit: Dict = Depends(check_status_rate_limit)):
+    """Возвращает текущий статус обработки задания"""
+    status_response = await build_status(job_id)
+    if status_response is None:
         raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
     
-    job_data = job_store[job_id]
+    # Возвращаем только последние 10 записей лога
+    status_response.logs = status_response.logs[-10:]
+    return status_response
+
+@app.get("/status/{job_id}/stream")
+async def status_stream(job_id: str, request: Request, rate_limit: Dict = Depends(check_status_rate_limit)):
+    """
+    Поток Server-Sent Events с прогрессом задания.
+    Событие progress отправляется только при изменении статуса, прогресса или лога
+    и содержит лишь новые строки лога; поток закрывается на финальном статусе.
+    """
+    if await build_status(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    
+    async def event_stream():
+        queue = progress_hub.subscribe(job_id)
+        sent_logs: List[str] = []
+        try:
+            while True:
+                try:
+                    snapshot = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                
+                if snapshot is None:
+                    yield sse_event("end", {"job_id": job_id})
+                    break
+                
+                event = dict(snapshot)
+                event["logs"] = new_log_lines(sent_logs, snapshot["logs"])
+                sent_logs = snapshot["logs"]
+                yield sse_event("progress", event)
+        finally:
+            progress_hub.unsubscribe(job_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.api_route("/download/{job_id}", methods=["GET", "HEAD"])
+async def download(job_id: str, request: Request):
+    """
+    Скачивание ZIP-архива с результатом обработки. Поддерживает Range
+    (докачка) и ETag/If-None-Match, так что архив можно кэшировать на CDN.
+    """
+    # Проверка наличия задания
+    job_data = await resolve_job(job_id)
+    if job_data is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
     
     # Проверка статуса задания
     if job_data["status"] != "COMPLETED":
@@ -320,49 +645,123 @@ async def download(job_id: str):
             detail=f"Job is not completed yet. Current status: {job_data['status']}"
         )
     
-    # Путь к файлу результата
-    job_dir = ensure_storage_dir(job_id)
-    result_file = job_dir / "result.txt"  # В реальном приложении здесь был бы ZIP
+    bundle_file = Path(STORAGE_DIR) / f"job-{job_data['job_id']}" / BUNDLE_NAME
+    try:
+        etag, size = await asyncio.to_thread(file_etag, bundle_file)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Result bundle not found")
+    
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": f"public, max-age={DOWNLOAD_CACHE_MAX_AGE}",
+        "Content-Disposition": f'attachment; filename="pix2fullcode-{job_id}.zip"',
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
     
-    if not result_file.exists():
-        raise HTTPException(status_code=404, detail="Result file not found")
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    # If-Range с другой версией архива — докачка невозможна, отдаём файл целиком
+    if not if_range or etag_matches(if_range, etag):
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers=dict(headers, **{"Content-Range": f"bytes */{size}"}))
     
-    return FileResponse(
-        result_file,
-        filename=f"pix2fullcode-{job_id}.txt",  # В реальном приложении здесь был бы ZIP
-        media_type="text/plain"  # В реальном приложении здесь был бы application/zip
+    status_code = 200
+    start, end = 0, size - 1
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    if request.method == "HEAD" or size == 0:
+        return Response(status_code=status_code, headers=headers, media_type="application/zip")
+    # Скачиваемое задание вытесняется по квоте последним
+    await storage_lifecycle.touch(job_data["job_id"])
+    return StreamingResponse(
+        file_chunks(bundle_file, start, end),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/zip"
     )
 
 @app.delete("/job/{job_id}")
 async def delete_job(job_id: str):
     """Удаление задания и всех связанных с ним данных (GDPR)"""
-    if job_id not in job_store:
+    # Удаление данных из хранилища заданий
+    if not await job_store.delete(job_id):
         raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    result_cache.invalidate_job(job_id)
     
-    # Удаление данных из локального хранилища
-    del job_store[job_id]
+    # Пайплайн задания останавливается до удаления файлов, иначе его чекпоинты и архив
+    # создали бы каталог заново. Запись, которую успеет сделать уже запущенный поток,
+    # уберёт следующий обход жизненного цикла: записи задания больше нет.
+    task = pipeline_tasks.pop(job_id, None)
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
     
-    # Удаление файлов
-    job_dir = Path(STORAGE_DIR) / f"job-{job_id}"
-    if job_dir.exists():
-        shutil.rmtree(job_dir)
+    # Файлы сразу становятся недоступны, а удаляются в фоне — без rmtree в event loop
+    await storage_lifecycle.discard(job_id)
+    
+    # Состояние генерации и кэши сервисов, в которых осталось задание
+    async with httpx.AsyncClient(timeout=JOB_FORGET_TIMEOUT) as client:
+        await asyncio.gather(*(
+            forget_in_service(client, service, job_id) for service in ("codegen", "gen3d")
+        ))
     
-    # Остановка workflow в Temporal (если он запущен)
+    # Остановка workflow в Temporal (если он запущен) и удаление его артефактов
     if temporal_client:
         try:
-            handle = temporal_client.get_workflow_handle(f"pix2fullcode-{job_id}")
+            temporal_status.forget(job_id)
+            handle = temporal_client.get_workflow_handle(workflow_id(job_id))
             await handle.terminate("Deleted due to GDPR request")
         except Exception as e:
             logger.warning(f"Could not terminate workflow for job {job_id}: {str(e)}")
+        try:
+            await temporal_client.start_workflow(
+                "ForgetJobWorkflow",
+                job_id,
+                id=f"forget-{job_id}",
+                task_queue=WORKFLOW_TASK_QUEUE,
+            )
+        except Exception as e:
+            logger.warning(f"Could not start artifact cleanup for job {job_id}: {str(e)}")
     
     return {"status": "deleted", "job_id": job_id}
 
+async def forget_in_service(client: httpx.AsyncClient, service: str, job_id: str):
+    """Удаляет данные задания в сервисе; недоступный сервис не мешает удалению"""
+    try:
+        response = await client.delete(f"{SERVICE_URLS[service]}/job/{job_id}")
+        response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"Could not delete job {job_id} in {service}: {str(e)}")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Счётчики попаданий/промахов кэша результатов"""
+    return result_cache.stats()
+
+@app.get("/pipeline/stats")
+async def pipeline_stats():
+    """Очередь и счётчики встроенного исполнителя пайплайна"""
+    return embedded_pipeline.stats()
+
+@app.get("/storage/stats")
+async def storage_stats():
+    """Объём файлов заданий и счётчики удалений по TTL и квоте"""
+    return storage_lifecycle.stats()
+
 @app.get("/health")
 async def health_check():
     """Проверка состояния сервиса"""
     return {
         "status": "ok",
         "temporal_connected": temporal_client is not None,
+        "job_store": JOB_STORE_BACKEND,
         "version": "1.0.0",
         "timestamp": datetime.now().isoformat()
     }
@@ -0,0 +1,81 @@
+"""
+Отдача архива результата с HTTP Range и ETag.
+
+ETag — sha256 манифеста архива (комментарий ZIP) и размер файла; он
+читается из центрального каталога один раз на версию файла. Поддерживается
+один диапазон bytes=start-end, bytes=start- и bytes=-suffix: этого хватает
+для докачки браузером и CDN. Несколько диапазонов в одном запросе отдаются
+целым файлом (RFC 9110 это допускает).
+"""
+import functools
+import os
+import re
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from pix2fc.bundle import bundle_etag
+
+READ_CHUNK = 256 * 1024
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    """Диапазон за пределами файла (416)"""
+
+
+@functools.lru_cache(maxsize=1024)
+def _etag(path: str, mtime_ns: int, size: int) -> str:
+    digest = bundle_etag(Path(path))
+    # Архив без комментария (собран не BundleWriter) — ETag по версии файла
+    return f'"{digest[:32]}-{size:x}"' if digest else f'"{mtime_ns:x}-{size:x}"'
+
+
+def file_etag(path: Path) -> Tuple[str, int]:
+    """(ETag, размер) текущей версии файла; синхронно"""
+    stat = os.stat(path)
+    return _etag(str(path), stat.st_mtime_ns, stat.st_size), stat.st_size
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match / If-Range: список тегов или *, слабые теги сравниваются по значению"""
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Включительный диапазон (start, end) или None — отдавать файл целиком"""
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N — последние N байт
+        suffix = int(last)
+        if suffix == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def file_chunks(path: Path, start: int, end: int) -> Iterator[bytes]:
+    """Байты [start, end] файла; синхронный генератор — StreamingResponse читает его в пуле потоков"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(READ_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
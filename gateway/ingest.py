@@ -0,0 +1,163 @@
+"""
+Потоковый приём загружаемых изображений.
+
+Файл читается фиксированными чанками, запись на диск и хеширование выполняются
+вне event loop, а формат и размеры изображения определяются по заголовку в том же
+проходе. Память на одну загрузку ограничена размером чанка и буфером заголовка.
+"""
+import asyncio
+import hashlib
+import os
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+# Размер чанка при чтении тела запроса
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Сколько байт заголовка храним для определения формата и размеров
+SNIFF_LIMIT = 256 * 1024
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SOI = b"\xff\xd8"
+# SOF-маркеры JPEG (кроме DHT/JPG/DAC, которые попадают в тот же диапазон)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+EXTENSIONS = {"png": ".png", "jpeg": ".jpg"}
+
+
+class UploadError(Exception):
+    """Базовая ошибка приёма загрузки"""
+
+
+class UploadTooLarge(UploadError):
+    """Размер загрузки превысил лимит"""
+
+
+class UnsupportedImage(UploadError):
+    """Содержимое не является PNG/JPEG"""
+
+
+@dataclass
+class UploadInfo:
+    path: Path
+    size: int
+    sha256: str
+    format: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+
+def _sniff_png(header: bytes) -> Optional[Tuple[int, int]]:
+    # IHDR всегда первый чанк: сигнатура (8) + длина (4) + тип (4) + width/height
+    if len(header) < 24 or header[12:16] != b"IHDR":
+        return None
+    width, height = struct.unpack(">II", header[16:24])
+    return width, height
+
+
+def _sniff_jpeg(header: bytes) -> Optional[Tuple[int, int]]:
+    pos = 2
+    size = len(header)
+    while pos + 4 <= size:
+        if header[pos] != 0xFF:
+            return None
+        marker = header[pos + 1]
+        if marker == 0xFF:  # заполняющие байты
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        (length,) = struct.unpack(">H", header[pos + 2:pos + 4])
+        if marker in JPEG_SOF_MARKERS:
+            if pos + 9 > size:
+                return None
+            height, width = struct.unpack(">HH", header[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def sniff_image(header: bytes) -> Tuple[Optional[str], Optional[int], Optional[int]]:
+    """Определяет формат и размеры изображения по первым байтам файла"""
+    if header.startswith(PNG_SIGNATURE):
+        dims = _sniff_png(header)
+        return ("png",) + (dims or (None, None))
+    if header.startswith(JPEG_SOI):
+        dims = _sniff_jpeg(header)
+        return ("jpeg",) + (dims or (None, None))
+    return None, None, None
+
+
+def _write_chunk(fh, hasher, chunk: bytes) -> None:
+    # hashlib отпускает GIL на больших буферах, поэтому хеш считаем в том же потоке
+    hasher.update(chunk)
+    fh.write(chunk)
+
+
+def _discard(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+async def stream_upload(
+    file,
+    job_dir: Path,
+    max_size: int,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> UploadInfo:
+    """
+    Потоково сохраняет загрузку в job_dir/upload.<ext>.
+    Прерывается, как только превышен max_size; файл пишется во временный путь
+    и переименовывается только после успешной проверки формата.
+    """
+    # Starlette знает размер заранее, если multipart уже разобран
+    declared_size = getattr(file, "size", None)
+    if declared_size is not None and declared_size > max_size:
+        raise UploadTooLarge(f"File too large. Max size is {max_size / 1024 / 1024} MB")
+
+    tmp_path = job_dir / f".upload-{os.getpid()}-{id(file)}.part"
+    hasher = hashlib.sha256()
+    header = bytearray()
+    size = 0
+
+    fh = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLarge(f"File too large. Max size is {max_size / 1024 / 1024} MB")
+            if len(header) < SNIFF_LIMIT:
+                header += chunk[:SNIFF_LIMIT - len(header)]
+                # Неизвестный формат отсекаем по первому же чанку
+                if len(header) >= len(PNG_SIGNATURE) and sniff_image(bytes(header))[0] is None:
+                    raise UnsupportedImage("Only PNG/JPEG allowed")
+            await asyncio.to_thread(_write_chunk, fh, hasher, chunk)
+    except BaseException:
+        await asyncio.to_thread(fh.close)
+        await asyncio.to_thread(_discard, tmp_path)
+        raise
+    await asyncio.to_thread(fh.close)
+
+    image_format, width, height = sniff_image(bytes(header))
+    if image_format is None:
+        await asyncio.to_thread(_discard, tmp_path)
+        raise UnsupportedImage("Only PNG/JPEG allowed")
+
+    final_path = job_dir / f"upload{EXTENSIONS[image_format]}"
+    await asyncio.to_thread(os.replace, tmp_path, final_path)
+
+    return UploadInfo(
+        path=final_path,
+        size=size,
+        sha256=hasher.hexdigest(),
+        format=image_format,
+        width=width,
+        height=height,
+    )
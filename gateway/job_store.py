@@ -0,0 +1,306 @@
+"""
+Хранилище состояния заданий.
+
+JobStore — общий асинхронный интерфейс; MemoryJobStore хранит задания в процессе
+с TTL/LRU-вытеснением, SQLiteJobStore — в SQLite (WAL), что позволяет нескольким
+воркерам uvicorn видеть одно и то же состояние; сверх max_jobs он вытесняет
+самые старые завершённые задания. Логи заданий в обоих бэкендах
+ограничены кольцевым буфером из max_logs строк.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Статусы, после которых задание больше не меняется
+TERMINAL_STATUSES = {"COMPLETED", "FAILED", "CANCELED", "TERMINATED"}
+
+
+class JobStore(ABC):
+    """Интерфейс хранилища заданий; все операции — поиск по ключу job_id"""
+
+    @abstractmethod
+    async def create(self, job_id: str, data: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Возвращает копию данных задания (с полем logs) или None"""
+
+    @abstractmethod
+    async def update(self, job_id: str, **fields: Any) -> bool:
+        """Обновляет поля задания; False, если задания нет"""
+
+    @abstractmethod
+    async def append_log(self, job_id: str, line: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def delete(self, job_id: str) -> bool:
+        ...
+
+    async def exists(self, job_id: str) -> bool:
+        return await self.get(job_id) is not None
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryJobStore(JobStore):
+    """Хранилище в памяти процесса с TTL, LRU-вытеснением и кольцевым буфером логов"""
+
+    def __init__(self, ttl_seconds: float, max_jobs: int, max_logs: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max_jobs
+        self.max_logs = max_logs
+        # job_id -> (updated_at, data, logs)
+        self._jobs: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _live(self, job_id: str) -> Optional[tuple]:
+        record = self._jobs.get(job_id)
+        if record is None:
+            return None
+        if time.monotonic() - record[0] > self.ttl_seconds:
+            del self._jobs[job_id]
+            return None
+        return record
+
+    def _touch(self, job_id: str, record: tuple) -> None:
+        self._jobs[job_id] = (time.monotonic(), record[1], record[2])
+        self._jobs.move_to_end(job_id)
+
+    async def create(self, job_id: str, data: Dict[str, Any]) -> None:
+        data = dict(data)
+        logs = deque(data.pop("logs", []), maxlen=self.max_logs)
+        self._jobs[job_id] = (time.monotonic(), data, logs)
+        self._jobs.move_to_end(job_id)
+        # Вытесняем просроченные и самые давно не использованные задания
+        while self._jobs:
+            oldest_id, (updated_at, _, _) = next(iter(self._jobs.items()))
+            if len(self._jobs) <= self.max_jobs and time.monotonic() - updated_at <= self.ttl_seconds:
+                break
+            del self._jobs[oldest_id]
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        record = self._live(job_id)
+        if record is None:
+            return None
+        self._jobs.move_to_end(job_id)
+        result = dict(record[1])
+        result["logs"] = list(record[2])
+        return result
+
+    async def update(self, job_id: str, **fields: Any) -> bool:
+        record = self._live(job_id)
+        if record is None:
+            return False
+        record[1].update(fields)
+        self._touch(job_id, record)
+        return True
+
+    async def append_log(self, job_id: str, line: str) -> bool:
+        record = self._live(job_id)
+        if record is None:
+            return False
+        record[2].append(line)
+        self._touch(job_id, record)
+        return True
+
+    async def delete(self, job_id: str) -> bool:
+        return self._jobs.pop(job_id, None) is not None
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Общее для нескольких процессов хранилище в SQLite (WAL).
+    Запросы выполняются в пуле потоков, чтобы не блокировать event loop.
+    При вставке сверх max_jobs удаляются самые давно обновлённые завершённые
+    задания; задания в работе не вытесняются, их срок ограничивает только TTL.
+    """
+
+    # Как часто (в операциях create) удалять просроченные задания
+    PURGE_EVERY = 256
+
+    def __init__(self, path: str, ttl_seconds: float, max_jobs: int, max_logs: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max_jobs
+        self.max_logs = max_logs
+        self._lock = threading.Lock()
+        self._creates = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs(updated_at);
+            CREATE TABLE IF NOT EXISTS job_logs (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                line TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            ) WITHOUT ROWID;
+            """
+        )
+
+    async def _run(self, fn, *args):
+        return await asyncio.to_thread(self._locked, fn, *args)
+
+    def _locked(self, fn, *args):
+        with self._lock:
+            return fn(*args)
+
+    def _create(self, job_id: str, data: Dict[str, Any]) -> None:
+        data = dict(data)
+        logs = data.pop("logs", [])[-self.max_logs:]
+        now = time.time()
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, data, updated_at) VALUES (?, ?, ?)",
+                (job_id, json.dumps(data), now),
+            )
+            conn.execute("DELETE FROM job_logs WHERE job_id = ?", (job_id,))
+            conn.executemany(
+                "INSERT INTO job_logs (job_id, seq, line) VALUES (?, ?, ?)",
+                [(job_id, seq, line) for seq, line in enumerate(logs)],
+            )
+            self._creates += 1
+            if self._creates % self.PURGE_EVERY == 0:
+                self._purge(now)
+            self._evict(job_id)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _purge(self, now: float) -> None:
+        cutoff = now - self.ttl_seconds
+        self._conn.execute(
+            "DELETE FROM job_logs WHERE job_id IN (SELECT job_id FROM jobs WHERE updated_at < ?)", (cutoff,)
+        )
+        self._conn.execute("DELETE FROM jobs WHERE updated_at < ?", (cutoff,))
+
+    def _evict(self, keep: str) -> None:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()
+        if count <= self.max_jobs:
+            return
+        statuses = sorted(TERMINAL_STATUSES)
+        placeholders = ", ".join("?" * len(statuses))
+        evicted = self._conn.execute(
+            f"SELECT job_id FROM jobs WHERE json_extract(data, '$.status') IN ({placeholders}) AND job_id != ? "
+            "ORDER BY updated_at LIMIT ?",
+            (*statuses, keep, count - self.max_jobs),
+        ).fetchall()
+        self._conn.executemany("DELETE FROM job_logs WHERE job_id = ?", evicted)
+        self._conn.executemany("DELETE FROM jobs WHERE job_id = ?", evicted)
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT data, updated_at FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        data = json.loads(row[0])
+        data["logs"] = [
+            line for (line,) in self._conn.execute(
+                "SELECT line FROM job_logs WHERE job_id = ? ORDER BY seq", (job_id,)
+            )
+        ]
+        return data
+
+    def _update(self, job_id: str, fields: Dict[str, Any]) -> bool:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return False
+            data = json.loads(row[0])
+            data.update(fields)
+            conn.execute(
+                "UPDATE jobs SET data = ?, updated_at = ? WHERE job_id = ?",
+                (json.dumps(data), time.time(), job_id),
+            )
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _append_log(self, job_id: str, line: str) -> bool:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE job_id = ?", (time.time(), job_id)
+            )
+            if cur.rowcount == 0:
+                conn.execute("ROLLBACK")
+                return False
+            (last_seq,) = conn.execute(
+                "SELECT COALESCE(MAX(seq), -1) FROM job_logs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            seq = last_seq + 1
+            conn.execute("INSERT INTO job_logs (job_id, seq, line) VALUES (?, ?, ?)", (job_id, seq, line))
+            # Кольцевой буфер: удаляем строки старше max_logs
+            conn.execute(
+                "DELETE FROM job_logs WHERE job_id = ? AND seq <= ?", (job_id, seq - self.max_logs)
+            )
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _delete(self, job_id: str) -> bool:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM job_logs WHERE job_id = ?", (job_id,))
+            conn.execute("COMMIT")
+            return cur.rowcount > 0
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def create(self, job_id: str, data: Dict[str, Any]) -> None:
+        await self._run(self._create, job_id, data)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get, job_id)
+
+    async def update(self, job_id: str, **fields: Any) -> bool:
+        return await self._run(self._update, job_id, fields)
+
+    async def append_log(self, job_id: str, line: str) -> bool:
+        return await self._run(self._append_log, job_id, line)
+
+    async def delete(self, job_id: str) -> bool:
+        return await self._run(self._delete, job_id)
+
+    async def close(self) -> None:
+        await self._run(self._conn.close)
+
+
+def create_job_store(backend: str, path: str, ttl_seconds: float, max_jobs: int, max_logs: int) -> JobStore:
+    """Создаёт хранилище по имени бэкенда (memory | sqlite)"""
+    if backend == "memory":
+        return MemoryJobStore(ttl_seconds=ttl_seconds, max_jobs=max_jobs, max_logs=max_logs)
+    if backend == "sqlite":
+        return SQLiteJobStore(path=path, ttl_seconds=ttl_seconds, max_jobs=max_jobs, max_logs=max_logs)
+    raise ValueError(f"Unknown job store backend: {backend}")
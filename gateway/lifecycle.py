@@ -0,0 +1,277 @@
+"""
+Жизненный цикл файлов заданий в STORAGE_DIR.
+
+Фоновая задача раз в interval секунд обходит каталоги job-<id> и удаляет:
+  * файлы завершённых заданий, которые старше TTL своего класса —
+    uploads (upload.*), bundles (bundle.zip) и intermediate (чекпоинты
+    встроенного пайплайна и всё остальное);
+  * задания целиком, когда у них истёк архив или ничего не осталось;
+  * каталоги, для которых в job_store нет записи, — только если хранилище
+    общее для всех воркеров (delete_orphans) и каталог не менялся дольше
+    orphan_grace: в памяти процесса видны лишь собственные задания воркера;
+  * при превышении общей квоты max_bytes — завершённые задания целиком,
+    начиная с давно не использованных (LRU по mtime; скачивание обновляет
+    mtime каталога).
+Задания в работе не трогаются; первый обход — через interval после старта.
+Обход и удаление выполняются в потоке пачками по batch_size путей, event
+loop не блокируется даже на больших каталогах.
+
+Удаление по запросу (GDPR) — discard(): каталог задания за O(1)
+переименовывается в .trash и сразу становится недоступен, а сами файлы
+удаляет фоновая задача. Остальные кэши STORAGE_DIR (тайлы vision, кэши
+моделей и кода) ограничены своими лимитами и здесь не учитываются.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from pix2fc.bundle import BUNDLE_NAME
+
+logger = logging.getLogger(__name__)
+
+JOB_DIR_PREFIX = "job-"
+TRASH_DIR = ".trash"
+
+
+def artifact_class(relative: Path) -> str:
+    if relative.name.startswith("upload."):
+        return "uploads"
+    if relative.name == BUNDLE_NAME:
+        return "bundles"
+    return "intermediate"
+
+
+@dataclass
+class JobUsage:
+    job_id: str
+    path: Path
+    last_used: float
+    size: int = 0
+    # (путь, класс, размер, mtime) каждого файла
+    files: List[Tuple[Path, str, int, float]] = field(default_factory=list)
+
+
+def scan_jobs(storage_dir: Path) -> List[JobUsage]:
+    """Размеры и время использования каталогов заданий; синхронно"""
+    jobs = []
+    try:
+        entries = list(os.scandir(storage_dir))
+    except FileNotFoundError:
+        return jobs
+    for entry in entries:
+        if not entry.name.startswith(JOB_DIR_PREFIX) or not entry.is_dir(follow_symlinks=False):
+            continue
+        try:
+            usage = JobUsage(entry.name[len(JOB_DIR_PREFIX):], Path(entry.path), entry.stat().st_mtime)
+        except FileNotFoundError:
+            continue
+        for root, _, names in os.walk(entry.path):
+            for name in names:
+                path = Path(root) / name
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                usage.files.append((path, artifact_class(path.relative_to(usage.path)), stat.st_size, stat.st_mtime))
+                usage.size += stat.st_size
+                usage.last_used = max(usage.last_used, stat.st_mtime)
+        jobs.append(usage)
+    return jobs
+
+
+def delete_paths(paths: List[Path]) -> int:
+    """Удаляет файлы и каталоги; возвращает освобождённые байты (для файлов); синхронно"""
+    freed = 0
+    for path in paths:
+        try:
+            if path.is_dir() and not path.is_symlink():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                freed += path.stat().st_size
+                path.unlink()
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            logger.warning(f"Cannot delete {path}: {str(e)}")
+    return freed
+
+
+class StorageLifecycle:
+    """
+    is_active(job_id) → True, пока задание выполняется, None — записи нет;
+    on_expire(job_id) вызывается, когда задание удалено целиком.
+    """
+
+    def __init__(
+        self,
+        storage_dir: str,
+        ttls: Dict[str, float],
+        max_bytes: int,
+        is_active: Callable[[str], Awaitable[Optional[bool]]],
+        on_expire: Callable[[str], Awaitable[None]],
+        interval: float = 300.0,
+        batch_size: int = 200,
+        delete_orphans: bool = False,
+        orphan_grace: float = 7 * 24 * 3600,
+    ):
+        self.storage_dir = Path(storage_dir)
+        self.trash_dir = self.storage_dir / TRASH_DIR
+        self.ttls = ttls
+        self.max_bytes = max_bytes
+        self.is_active = is_active
+        self.on_expire = on_expire
+        self.interval = interval
+        self.batch_size = batch_size
+        self.delete_orphans = delete_orphans
+        self.orphan_grace = orphan_grace
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.sweeps = 0
+        self.deleted_files = 0
+        self.deleted_bytes = 0
+        self.expired_jobs = 0
+        self.evicted_jobs = 0
+        self.discarded_jobs = 0
+        self.total_bytes = 0
+        self.last_sweep_seconds = 0.0
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _job_dir(self, job_id: str) -> Path:
+        return self.storage_dir / f"{JOB_DIR_PREFIX}{job_id}"
+
+    def _move_to_trash(self, job_id: str) -> bool:
+        source = self._job_dir(job_id)
+        self.trash_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(source, self.trash_dir / f"{job_id}-{uuid.uuid4().hex}")
+        except FileNotFoundError:
+            return False
+        return True
+
+    async def discard(self, job_id: str) -> bool:
+        """Делает файлы задания недоступными сразу; удаляются они в фоне"""
+        moved = await asyncio.to_thread(self._move_to_trash, job_id)
+        if moved:
+            self.discarded_jobs += 1
+            self._wake.set()
+        return moved
+
+    async def touch(self, job_id: str) -> None:
+        """Отмечает использование задания (скачивание) для LRU-вытеснения"""
+        def utime():
+            try:
+                os.utime(self._job_dir(job_id))
+            except FileNotFoundError:
+                pass
+        await asyncio.to_thread(utime)
+
+    async def _delete(self, paths: List[Path]) -> int:
+        freed = 0
+        for start in range(0, len(paths), self.batch_size):
+            freed += await asyncio.to_thread(delete_paths, paths[start:start + self.batch_size])
+        return freed
+
+    async def _empty_trash(self) -> None:
+        def list_trash():
+            try:
+                return [Path(entry.path) for entry in os.scandir(self.trash_dir)]
+            except FileNotFoundError:
+                return []
+        await self._delete(await asyncio.to_thread(list_trash))
+
+    async def _expire_job(self, usage: JobUsage) -> None:
+        await self._delete([usage.path])
+        self.deleted_files += len(usage.files)
+        self.deleted_bytes += usage.size
+        await self.on_expire(usage.job_id)
+
+    async def sweep(self) -> None:
+        started = time.monotonic()
+        now = time.time()
+        jobs = await asyncio.to_thread(scan_jobs, self.storage_dir)
+        kept: List[JobUsage] = []
+        for usage in jobs:
+            active = await self.is_active(usage.job_id)
+            if active is None:
+                # Записи нет: задание истекло или удалено — либо принадлежит другому воркеру
+                # (хранилище в памяти) или только что создано; удаляем лишь давно заброшенные
+                if self.delete_orphans and now - usage.last_used > self.orphan_grace:
+                    self.expired_jobs += 1
+                    await self._expire_job(usage)
+                continue
+            if active:
+                kept.append(usage)
+                continue
+            expired = [
+                (path, cls, size) for path, cls, size, mtime in usage.files
+                if now - mtime > self.ttls.get(cls, float("inf"))
+            ]
+            classes: Set[str] = {cls for _, cls, _ in expired}
+            if "bundles" in classes or len(expired) == len(usage.files):
+                self.expired_jobs += 1
+                await self._expire_job(usage)
+                continue
+            if expired:
+                self.deleted_bytes += await self._delete([path for path, _, _ in expired])
+                self.deleted_files += len(expired)
+                usage.size -= sum(size for _, _, size in expired)
+            kept.append(usage)
+
+        self.total_bytes = sum(usage.size for usage in kept)
+        if self.total_bytes > self.max_bytes:
+            for usage in sorted(kept, key=lambda usage: usage.last_used):
+                if self.total_bytes <= self.max_bytes:
+                    break
+                if await self.is_active(usage.job_id):
+                    continue
+                self.evicted_jobs += 1
+                await self._expire_job(usage)
+                self.total_bytes -= usage.size
+
+        self.sweeps += 1
+        self.last_sweep_seconds = time.monotonic() - started
+
+    async def _run(self) -> None:
+        # Первый обход — не сразу: рестарт не должен превращаться в массовое удаление
+        next_sweep = time.monotonic() + self.interval
+        while True:
+            try:
+                await self._empty_trash()
+                if time.monotonic() >= next_sweep:
+                    await self.sweep()
+                    next_sweep = time.monotonic() + self.interval
+            except Exception as e:
+                logger.error(f"Storage lifecycle sweep failed: {str(e)}")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(0.0, next_sweep - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sweeps": self.sweeps,
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "ttls": self.ttls,
+            "deleted_files": self.deleted_files,
+            "deleted_bytes": self.deleted_bytes,
+            "expired_jobs": self.expired_jobs,
+            "evicted_jobs": self.evicted_jobs,
+            "discarded_jobs": self.discarded_jobs,
+            "last_sweep_seconds": round(self.last_sweep_seconds, 3),
+        }
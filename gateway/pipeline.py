@@ -0,0 +1,355 @@
+"""
+Встроенный исполнитель пайплайна для развёртываний без Temporal (один узел, CI).
+
+Граф этапов, его выполнение и сборка архива — общие с Temporal workflow
+(pix2fc.dag, pix2fc.stages, pix2fc.bundle): vision → (codegen ∥ gen3d) → qa → export.
+Здесь только вызовы сервисов с повторами. Сервисы вызываются через один пул HTTP-соединений; число одновременных заданий
+ограничено, у каждого этапа свой лимит параллелизма. Успешный результат этапа
+сохраняется чекпоинтом в каталоге задания, поэтому перезапуск задания после
+сбоя продолжает работу с первого незавершённого этапа.
+"""
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from pix2fc.bundle import BUNDLE_NAME, write_job_bundle
+from pix2fc.dag import StageFailed, gather_or_cancel, run_dag
+from pix2fc.stages import (
+    GEN3D_SKIPPED_WARNING, STAGE_WEIGHTS, batch_objects, batch_units, failure, input_hash, mesh_urls,
+    normalize_3d_objects, pipeline_result, pipeline_stages,
+)
+
+logger = logging.getLogger(__name__)
+
+GEN3D_POLL_WAIT = 30  # секунды long polling тикета gen3d
+BUNDLE_READ_CHUNK = 1024 * 1024  # байт за одно чтение mesh'а или тепловой карты в архив
+
+class EmbeddedPipeline:
+    """
+    Исполнитель пайплайна внутри процесса gateway.
+    report(job_id, progress, message) вызывается после каждого этапа;
+    run() возвращает результат в том же формате, что и workflow.
+    """
+
+    def __init__(
+        self,
+        storage_dir: str,
+        service_urls: Dict[str, str],
+        report: Callable[[str, int, str], Awaitable[None]],
+        max_jobs: int = 4,
+        stage_concurrency: Optional[Dict[str, int]] = None,
+        max_attempts: int = 3,
+        timeout: float = 600.0,
+    ):
+        self.storage_dir = Path(storage_dir)
+        self.service_urls = service_urls
+        self.report = report
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self._jobs = asyncio.Semaphore(max_jobs)
+        self._stages = {
+            stage: asyncio.Semaphore(limit)
+            for stage, limit in (stage_concurrency or {}).items()
+        }
+        self._client: Optional[httpx.AsyncClient] = None
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.checkpoint_hits = 0
+
+    async def start(self) -> None:
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout, connect=10.0),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # --- чекпоинты ---
+
+    def _checkpoint_path(self, job_id: str, stage: str, key: str) -> Path:
+        return self.storage_dir / f"job-{job_id}" / "checkpoints" / f"{stage}-{key[:16]}.json"
+
+    def _load_checkpoint(self, path: Path) -> Optional[Any]:
+        try:
+            with open(path, "rb") as f:
+                return json.loads(f.read())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _save_checkpoint(self, path: Path, output: Any) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(output, f)
+        os.replace(tmp_path, path)
+
+    # --- вызовы сервисов ---
+
+    async def _request(self, method: str, service: str, path: str, payload: Any = None, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        url = f"{self.service_urls[service]}{path}"
+        try:
+            response = await self._client.request(method, url, json=payload, params=params)
+        except httpx.HTTPError as e:
+            raise StageFailed(f"SERVICE_UNAVAILABLE: {service}: {str(e)}", retryable=True) from e
+        if response.status_code >= 400:
+            retryable = response.status_code == 429 or response.status_code >= 500
+            retry_after = response.headers.get("Retry-After")
+            raise StageFailed(
+                f"{service.upper()}_ERROR: {response.status_code}: {response.text[:500]}",
+                retryable,
+                float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        return response.json()
+
+    async def _post(self, service: str, path: str, payload: Any) -> Dict[str, Any]:
+        return await self._request("POST", service, path, payload)
+
+    async def _stage(
+        self,
+        job_id: str,
+        stage: str,
+        payload: Any,
+        call: Callable[[], Awaitable[Any]],
+        succeeded: Callable[[Any], bool] = lambda result: True,
+    ) -> Any:
+        """Чекпоинт → лимит этапа → вызов с повторами → сохранение чекпоинта"""
+        path = self._checkpoint_path(job_id, stage, input_hash(payload))
+        cached = await asyncio.to_thread(self._load_checkpoint, path)
+        if cached is not None:
+            self.checkpoint_hits += 1
+            return cached
+
+        semaphore = self._stages.get(stage)
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                if semaphore is None:
+                    result = await call()
+                else:
+                    async with semaphore:
+                        result = await call()
+                break
+            except StageFailed as e:
+                if not e.retryable or attempt == self.max_attempts:
+                    raise
+                logger.warning(f"Stage {stage} for job {job_id} failed (attempt {attempt}): {e.reason}")
+                # Перегруженный сервис сам говорит, когда повторить (Retry-After)
+                await asyncio.sleep(min(max(2 ** attempt, e.retry_after or 0), 60))
+
+        if succeeded(result):
+            await asyncio.to_thread(self._save_checkpoint, path, result)
+        return result
+
+    # --- этапы ---
+
+    async def _vision(self, job_id: str) -> Dict[str, Any]:
+        return await self._stage(
+            job_id, "vision", job_id,
+            lambda: self._post("vision", "/segment", {"job_id": job_id}),
+        )
+
+    async def _vision_batch(self, job_id: str, screens: int) -> Dict[str, Any]:
+        params = {"job_id": job_id, "screens": screens}
+        return await self._stage(
+            job_id, "vision", params,
+            lambda: self._post("vision", "/segment/batch", params),
+        )
+
+    async def _codegen(self, job_id: str, ui_json: Dict[str, Any], format: str, unit_id: Optional[str] = None) -> Dict[str, Any]:
+        # unit_id — отдельный ключ генерации для экрана или компонента пакетного задания
+        params = {"ui_json": ui_json, "format": format, "job_id": unit_id or job_id}
+        result = await self._stage(
+            job_id, "codegen", params,
+            lambda: self._post("codegen", "/generate", params),
+            succeeded=lambda result: result.get("complete", False),
+        )
+        if not result.get("complete", False):
+            raise StageFailed("CODE_GENERATION_FAILED: Unable to generate code")
+        return result
+
+    async def _generate_mesh(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Ставит генерацию в очередь gen3d и ждёт тикет через long polling"""
+        ticket = await self._post("gen3d", "/generate3d", request)
+        while ticket["status"] not in ("completed", "failed"):
+            ticket = await self._request(
+                "GET", "gen3d", f"/generate3d/{ticket['ticket_id']}", params={"wait": GEN3D_POLL_WAIT}
+            )
+        return {key: ticket.get(key) for key in ("glb_url", "lods", "fallback", "error")}
+
+    async def _gen3d_object(self, job_id: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        result = await self._stage(
+            job_id, "gen3d", request,
+            lambda: self._generate_mesh(request),
+            succeeded=lambda result: bool(result.get("glb_url")),
+        )
+        if result.get("fallback", False):
+            raise StageFailed(result.get("error") or "Unknown 3D generation error")
+        if not result.get("glb_url"):
+            raise StageFailed("NO_MESH: 3D generation failed, no mesh URL provided.")
+        return result
+
+    async def _qa(self, job_id: str) -> Dict[str, Any]:
+        return await self._stage(
+            job_id, "qa", job_id,
+            lambda: self._post("qa", "/qa", {"job_id": job_id}),
+        )
+
+    def _download(self, client: httpx.Client, service: str, path: str) -> Iterator[bytes]:
+        """Тело ответа сервиса потоком — прямо в запись архива"""
+        url = f"{self.service_urls[service]}{path}"
+        try:
+            with client.stream("GET", url) as response:
+                if response.status_code >= 400:
+                    retryable = response.status_code == 429 or response.status_code >= 500
+                    raise StageFailed(f"{service.upper()}_ERROR: {response.status_code} for {path}", retryable)
+                yield from response.iter_bytes(BUNDLE_READ_CHUNK)
+        except httpx.HTTPError as e:
+            raise StageFailed(f"SERVICE_UNAVAILABLE: {service}: {str(e)}", retryable=True) from e
+
+    def _write_bundle(self, job_id: str, format: str, sections: List[Tuple[Optional[str], Dict[str, Any]]],
+                      meshes: List[str], qa_report: Dict[str, Any]) -> Dict[str, Any]:
+        with httpx.Client(timeout=httpx.Timeout(self.timeout, connect=10.0)) as client:
+            return write_job_bundle(
+                self.storage_dir / f"job-{job_id}" / BUNDLE_NAME,
+                job_id,
+                format,
+                [(title, code.get("chunks", [])) for title, code in sections],
+                meshes,
+                qa_report,
+                lambda service, path: self._download(client, service, path),
+            )
+
+    async def _export(self, job_id: str, format: str, sections: List[Tuple[Optional[str], Dict[str, Any]]],
+                      meshes: List[Dict[str, Any]], qa_report: Dict[str, Any]) -> Dict[str, Any]:
+        urls = mesh_urls(meshes)
+
+        async def bundle():
+            written = await asyncio.to_thread(self._write_bundle, job_id, format, sections, urls, qa_report)
+            return {"url": f"/download/{job_id}", **written}
+        return await self._stage(job_id, "export", {"job_id": job_id, "format": format, "meshes": urls, "qa": qa_report}, bundle)
+
+    # --- задание целиком ---
+
+    async def _limited(self, run: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        self.waiting += 1
+        async with self._jobs:
+            self.waiting -= 1
+            self.running += 1
+            try:
+                result = await run()
+            finally:
+                self.running -= 1
+        if result["status"] == "SUCCESS":
+            self.completed += 1
+        else:
+            self.failed += 1
+        return result
+
+    async def run(self, job_id: str, format: str = "next", fail_fast: bool = True) -> Dict[str, Any]:
+        async def codegen(ui_json):
+            code = await self._codegen(job_id, ui_json, format)
+            return [(None, code)], f"Generated {len(code.get('chunks', []))} code chunks"
+
+        return await self._limited(lambda: self._execute(
+            job_id,
+            format,
+            fail_fast,
+            segment=lambda: self._vision(job_id),
+            codegen=codegen,
+            objects=lambda ui_json: normalize_3d_objects(ui_json.get("3d"), job_id),
+        ))
+
+    async def run_batch(self, job_id: str, format: str = "next", screens: int = 1, fail_fast: bool = True) -> Dict[str, Any]:
+        """
+        Пакетное задание: все экраны сегментируются одним вызовом vision, общие
+        компоненты и экраны генерируются по одному разу, результат — один архив.
+        """
+        async def codegen(segmented):
+            units = batch_units(job_id, segmented)
+            codes = await gather_or_cancel(
+                self._codegen(job_id, ui_json, format, unit_id) for _, unit_id, ui_json in units
+            )
+            message = f"Generated {len(segmented['components'])} shared components and {len(segmented['screens'])} screens"
+            return [(title, code) for (title, _, _), code in zip(units, codes)], message
+
+        return await self._limited(lambda: self._execute(
+            job_id,
+            format,
+            fail_fast,
+            segment=lambda: self._vision_batch(job_id, screens),
+            codegen=codegen,
+            objects=lambda segmented: batch_objects(job_id, segmented),
+        ))
+
+    async def _execute(self, job_id: str, format: str, fail_fast: bool, segment, codegen, objects) -> Dict[str, Any]:
+        """
+        Граф этапов pipeline_stages: segment() → (codegen(ui) ∥ gen3d по objects(ui)) → qa → export.
+        codegen возвращает разделы результата (заголовок, ответ codegen) и строку лога.
+        """
+        progress = 0
+        warnings: List[str] = []
+
+        async def done(stage: str, message: str):
+            nonlocal progress
+            progress += STAGE_WEIGHTS[stage]
+            await self.report(job_id, progress, message)
+
+        async def vision(_):
+            ui_json = await segment()
+            await done("vision", "Completed vision segmentation")
+            return ui_json
+
+        async def generate(deps):
+            sections, message = await codegen(deps["vision"])
+            await done("codegen", message)
+            return sections
+
+        async def gen3d(deps):
+            try:
+                meshes = await gather_or_cancel(self._gen3d_object(job_id, request) for request in objects(deps["vision"]))
+            except StageFailed as e:
+                if not fail_fast:
+                    await self.report(job_id, progress, f"3D generation failed: {e.reason}")
+                raise
+            await done("gen3d", f"Created {len(meshes)} 3D models")
+            return meshes
+
+        async def qa(deps):
+            if deps.get("gen3d") is None:
+                warnings.append(GEN3D_SKIPPED_WARNING)
+            qa_result = await self._qa(job_id)
+            await done("qa", "Quality checks passed" if qa_result.get("passed", True) else "QA check reported warnings")
+            return qa_result
+
+        async def export(deps):
+            result = await self._export(job_id, format, deps["codegen"], deps.get("gen3d") or [], deps["qa"])
+            await done("export", "Bundle exported")
+            return result
+
+        try:
+            outcome = await run_dag(pipeline_stages(vision, generate, gen3d, qa, export), fail_fast=fail_fast)
+        except Exception as e:
+            logger.error(f"Pipeline failed for job: {job_id}, error: {str(e)}")
+            return failure(job_id, e)
+        result = pipeline_result(job_id, outcome, warnings)
+        if result["status"] == "FAILED":
+            logger.error(f"Pipeline failed for job: {job_id}, error: {result['reason']}")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "checkpoint_hits": self.checkpoint_hits,
+        }
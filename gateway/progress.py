@@ -0,0 +1,132 @@
+"""
+Раздача прогресса заданий подписчикам (SSE).
+
+На каждое задание запускается один наблюдатель, который опрашивает источник
+статуса и рассылает снимок всем подписчикам только при его изменении. Сколько бы
+вкладок ни следило за заданием, к хранилищу или Temporal идёт один поток запросов.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from job_store import TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+Snapshot = Dict[str, Any]
+Fetcher = Callable[[str], Awaitable[Optional[Snapshot]]]
+
+
+class ProgressHub:
+    """Fan-out снимков статуса: один наблюдатель на задание, много подписчиков"""
+
+    def __init__(self, fetch: Fetcher, poll_interval: float = 1.0, volatile_keys=("eta",)):
+        self.fetch = fetch
+        self.poll_interval = poll_interval
+        # Поля, изменение которых само по себе не повод для рассылки (ETA пересчитывается каждый опрос)
+        self.volatile_keys = set(volatile_keys)
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._watchers: Dict[str, asyncio.Task] = {}
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._last: Dict[str, Snapshot] = {}
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        # Короткая очередь: медленный подписчик получает только последние снимки,
+        # но финальный снимок и маркер конца (None) всегда помещаются вместе
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        if job_id in self._last:
+            queue.put_nowait(self._last[job_id])
+        if job_id not in self._watchers:
+            self._wakeups[job_id] = asyncio.Event()
+            self._watchers[job_id] = asyncio.create_task(self._watch(job_id))
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            self._stop(job_id)
+
+    def notify(self, job_id: str) -> None:
+        """Будит наблюдателя задания, не дожидаясь следующего опроса"""
+        event = self._wakeups.get(job_id)
+        if event is not None:
+            event.set()
+
+    def subscriber_count(self, job_id: str) -> int:
+        return len(self._subscribers.get(job_id, ()))
+
+    def _stop(self, job_id: str) -> None:
+        self._subscribers.pop(job_id, None)
+        self._wakeups.pop(job_id, None)
+        self._last.pop(job_id, None)
+        watcher = self._watchers.pop(job_id, None)
+        if watcher is not None and watcher is not asyncio.current_task():
+            watcher.cancel()
+
+    def _changed(self, previous: Optional[Snapshot], current: Snapshot) -> bool:
+        if previous is None:
+            return True
+        return any(
+            previous.get(key) != value
+            for key, value in current.items()
+            if key not in self.volatile_keys
+        )
+
+    def _publish(self, job_id: str, snapshot: Optional[Snapshot]) -> None:
+        for queue in self._subscribers.get(job_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(snapshot)
+
+    async def _watch(self, job_id: str) -> None:
+        try:
+            while True:
+                try:
+                    snapshot = await self.fetch(job_id)
+                except Exception as e:
+                    logger.warning(f"Progress fetch failed for job {job_id}: {str(e)}")
+                    snapshot = self._last.get(job_id)
+
+                if snapshot is None:
+                    # Задание удалено — закрываем все потоки
+                    self._publish(job_id, None)
+                    break
+                if self._changed(self._last.get(job_id), snapshot):
+                    self._last[job_id] = snapshot
+                    self._publish(job_id, snapshot)
+                if snapshot["status"] in TERMINAL_STATUSES:
+                    self._publish(job_id, None)
+                    break
+
+                wakeup = self._wakeups.get(job_id)
+                if wakeup is None:
+                    break
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                wakeup.clear()
+        finally:
+            if self._watchers.get(job_id) is asyncio.current_task():
+                self._watchers.pop(job_id, None)
+                self._wakeups.pop(job_id, None)
+                self._last.pop(job_id, None)
+                # Завершённое задание: подписчики уже получили финальный снимок и None
+                self._subscribers.pop(job_id, None)
+
+
+def new_log_lines(previous: List[str], current: List[str]) -> List[str]:
+    """Возвращает строки current, которых ещё не было в хвосте previous"""
+    for overlap in range(min(len(previous), len(current)), 0, -1):
+        if previous[-overlap:] == current[:overlap]:
+            return current[overlap:]
+    return current
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
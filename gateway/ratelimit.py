@@ -0,0 +1,178 @@
+"""
+Ограничение частоты запросов по скользящему окну.
+
+Используется приближение sliding window counter: хранятся только счётчики
+текущего и предыдущего фиксированных окон, а оценка числа запросов за последние
+window секунд — их взвешенная сумма. Это O(1) по памяти и времени на запрос.
+MemoryRateLimiter работает в пределах процесса, SQLiteRateLimiter — общий для
+нескольких воркеров.
+"""
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Tuple
+
+
+@dataclass
+class RateLimitDecision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: int  # секунды до смены текущего окна
+    retry_after: int = 0  # секунды до следующего разрешённого запроса
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(self.reset_after),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+def _decide(prev: int, cur: int, limit: int, window: int, now: float, cost: int = 1) -> Tuple[RateLimitDecision, int]:
+    """
+    Принимает решение по счётчикам окон и возвращает его вместе с новым значением cur.
+    cost — сколько запросов бюджета списывает этот (пакетная загрузка — по экрану).
+    """
+    elapsed = now % window
+    weight = 1.0 - elapsed / window
+    estimate = prev * weight + cur
+    reset_after = max(1, math.ceil(window - elapsed))
+
+    if estimate + cost <= limit:
+        cur += cost
+        remaining = max(0, int(limit - (prev * weight + cur)))
+        return RateLimitDecision(True, limit, remaining, reset_after), cur
+
+    # Сколько ждать, пока вклад предыдущего окна не уменьшится достаточно
+    if cur + cost > limit or prev == 0:
+        retry_after = reset_after
+    else:
+        needed_weight = (limit - cost - cur) / prev
+        retry_after = max(1, math.ceil((1.0 - needed_weight) * window - elapsed))
+    return RateLimitDecision(False, limit, 0, reset_after, retry_after), cur
+
+
+class RateLimiter(ABC):
+    """Интерфейс лимитера: hit() учитывает cost запросов и возвращает решение"""
+
+    @abstractmethod
+    async def hit(self, key: str, limit: int, window: int, cost: int = 1) -> RateLimitDecision:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryRateLimiter(RateLimiter):
+    """Лимитер в памяти процесса"""
+
+    # Как часто (в запросах) вычищать ключи, не активные больше двух окон
+    PURGE_EVERY = 4096
+
+    def __init__(self):
+        # key -> [номер окна, счётчик предыдущего окна, счётчик текущего окна]
+        self._counters: Dict[str, list] = {}
+        self._hits = 0
+
+    async def hit(self, key: str, limit: int, window: int, cost: int = 1) -> RateLimitDecision:
+        now = time.time()
+        index = int(now // window)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = [index, 0, 0]
+        elif counter[0] != index:
+            counter[1] = counter[2] if counter[0] == index - 1 else 0
+            counter[2] = 0
+            counter[0] = index
+
+        decision, counter[2] = _decide(counter[1], counter[2], limit, window, now, cost)
+
+        self._hits += 1
+        if self._hits % self.PURGE_EVERY == 0:
+            self._purge(now, window)
+        return decision
+
+    def _purge(self, now: float, window: int) -> None:
+        stale = int(now // window) - 1
+        for key in [k for k, c in self._counters.items() if c[0] < stale]:
+            del self._counters[key]
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """Общий для нескольких процессов лимитер в SQLite (WAL)"""
+
+    PURGE_EVERY = 4096
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._hits = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                window_index INTEGER NOT NULL,
+                prev INTEGER NOT NULL,
+                cur INTEGER NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+
+    def _hit(self, key: str, limit: int, window: int, cost: int) -> RateLimitDecision:
+        now = time.time()
+        index = int(now // window)
+        conn = self._conn
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT window_index, prev, cur FROM rate_limits WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    prev, cur = 0, 0
+                elif row[0] == index:
+                    prev, cur = row[1], row[2]
+                else:
+                    prev, cur = (row[2] if row[0] == index - 1 else 0), 0
+
+                decision, cur = _decide(prev, cur, limit, window, now, cost)
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits (key, window_index, prev, cur) VALUES (?, ?, ?, ?)",
+                    (key, index, prev, cur),
+                )
+                self._hits += 1
+                if self._hits % self.PURGE_EVERY == 0:
+                    conn.execute("DELETE FROM rate_limits WHERE window_index < ?", (index - 1,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return decision
+
+    async def hit(self, key: str, limit: int, window: int, cost: int = 1) -> RateLimitDecision:
+        return await asyncio.to_thread(self._hit, key, limit, window, cost)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self._conn.close)
+
+
+def create_rate_limiter(backend: str, path: str) -> RateLimiter:
+    """Создаёт лимитер по имени бэкенда (memory | sqlite)"""
+    if backend == "memory":
+        return MemoryRateLimiter()
+    if backend == "sqlite":
+        return SQLiteRateLimiter(path=path)
+    raise ValueError(f"Unknown rate limiter backend: {backend}")
@@ -0,0 +1,107 @@
+"""
+Контентно-адресуемый кэш результатов.
+
+Ключ — sha256 загруженного файла плюс формат генерации. Завершённый результат
+отдаётся новым заданием-алиасом без запуска пайплайна, а идентичное задание,
+которое ещё выполняется, присоединяется к уже запущенному.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+INFLIGHT = "INFLIGHT"
+COMPLETED = "COMPLETED"
+
+
+@dataclass
+class CacheEntry:
+    job_id: str
+    state: str
+    created_at: float
+    completed_at: Optional[float] = None
+
+
+def cache_key(content_hash: str, format: str) -> str:
+    return f"{content_hash}:{format}"
+
+
+class ResultCache:
+    """LRU-кэш с TTL для завершённых результатов и учётом заданий в работе"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int, inflight_ttl_seconds: float = 3600):
+        self.ttl_seconds = ttl_seconds
+        self.inflight_ttl_seconds = inflight_ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        # Обратный индекс job_id -> ключ для инвалидации при удалении задания
+        self._by_job: Dict[str, str] = {}
+        self.hits = 0
+        self.joins = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, entry: CacheEntry, now: float) -> bool:
+        if entry.state == COMPLETED:
+            return now - entry.completed_at > self.ttl_seconds
+        return now - entry.created_at > self.inflight_ttl_seconds
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None and self._by_job.get(entry.job_id) == key:
+            del self._by_job[entry.job_id]
+
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        """Возвращает живую запись (завершённую или в работе) и обновляет счётчики"""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and self._expired(entry, now):
+            self._drop(key)
+            self.evictions += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        if entry.state == COMPLETED:
+            self.hits += 1
+        else:
+            self.joins += 1
+        return entry
+
+    def register(self, key: str, job_id: str) -> None:
+        """Регистрирует задание, которое будет выполнять пайплайн для данного ключа"""
+        self._drop(key)
+        self._entries[key] = CacheEntry(job_id=job_id, state=INFLIGHT, created_at=time.monotonic())
+        self._by_job[job_id] = key
+        while len(self._entries) > self.max_entries:
+            oldest, _ = next(iter(self._entries.items()))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def complete(self, job_id: str) -> None:
+        key = self._by_job.get(job_id)
+        if key is None:
+            return
+        entry = self._entries[key]
+        entry.state = COMPLETED
+        entry.completed_at = time.monotonic()
+
+    def invalidate_job(self, job_id: str) -> None:
+        """Удаляет запись, если её результат принадлежит данному заданию (ошибка или удаление)"""
+        key = self._by_job.get(job_id)
+        if key is not None:
+            self._drop(key)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.joins + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "joins": self.joins,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.joins) / lookups, 4) if lookups else 0.0,
+        }
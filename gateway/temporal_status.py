@@ -0,0 +1,146 @@
+"""
+Кэш статусов workflow в Temporal.
+
+describe/query для работающих workflow кэшируются на короткий TTL, результат
+завершённого workflow запоминается навсегда (в пределах LRU-лимита) — только
+если его результат удалось получить, а
+одновременные запросы статуса одного workflow объединяются в один RPC.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from temporalio.service import RPCError
+
+from job_store import TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Соответствие статусов Temporal статусам задания
+STATUS_MAP = {
+    "RUNNING": "PROCESSING",
+    "COMPLETED": "COMPLETED",
+    "FAILED": "FAILED",
+    "CANCELED": "CANCELED",
+    "TERMINATED": "TERMINATED",
+    "CONTINUED_AS_NEW": "PROCESSING",
+    "TIMED_OUT": "FAILED"
+}
+
+
+def workflow_id(job_id: str) -> str:
+    return f"pix2fullcode-{job_id}"
+
+
+class TemporalStatusCache:
+    """Кэширует и объединяет запросы статуса workflow"""
+
+    def __init__(self, get_client: Callable[[], Any], ttl_seconds: float = 2.0, max_terminal: int = 10000):
+        self.get_client = get_client
+        self.ttl_seconds = ttl_seconds
+        self.max_terminal = max_terminal
+        # job_id -> (время получения, снимок) для работающих workflow
+        self._live: Dict[str, tuple] = {}
+        # job_id -> снимок для завершённых workflow
+        self._terminal: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.rpc_calls = 0
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает снимок {status, progress, stage, logs, error, result}
+        или None, если workflow не найден.
+        """
+        snapshot = self._terminal.get(job_id)
+        if snapshot is not None:
+            self._terminal.move_to_end(job_id)
+            return snapshot
+
+        cached = self._live.get(job_id)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl_seconds:
+            return cached[1]
+
+        future = self._inflight.get(job_id)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(job_id))
+            self._inflight[job_id] = future
+            future.add_done_callback(lambda _: self._inflight.pop(job_id, None))
+        return await asyncio.shield(future)
+
+    def forget(self, job_id: str) -> None:
+        self._live.pop(job_id, None)
+        self._terminal.pop(job_id, None)
+
+    async def _fetch(self, job_id: str) -> Optional[Dict[str, Any]]:
+        client = self.get_client()
+        if client is None:
+            return None
+        handle = client.get_workflow_handle(workflow_id(job_id))
+        try:
+            self.rpc_calls += 1
+            desc = await handle.describe()
+        except RPCError:
+            self._live.pop(job_id, None)
+            return None
+
+        status = STATUS_MAP.get(desc.status.name, "UNKNOWN")
+        snapshot = {
+            "status": status,
+            "progress": 0,
+            "stage": None,
+            "logs": [f"Workflow status: {status}"],
+            "error": str(desc.failure) if getattr(desc, "failure", None) else None,
+            "result": None,
+        }
+
+        # Снимок завершённого workflow без результата нельзя запоминать навсегда
+        settled = status != "COMPLETED"
+        if status == "PROCESSING":
+            try:
+                self.rpc_calls += 1
+                progress = await handle.query("progress")
+                snapshot.update(
+                    progress=progress.get("progress", 0),
+                    stage=progress.get("stage"),
+                    logs=progress.get("logs") or snapshot["logs"],
+                )
+            except Exception as e:
+                # Старые версии workflow без query-обработчика
+                logger.debug(f"Progress query failed for job {job_id}: {str(e)}")
+        elif status == "COMPLETED":
+            try:
+                self.rpc_calls += 1
+                result = await handle.result()
+                snapshot["result"] = result
+                snapshot["progress"] = 100
+                # Workflow перехватывает исключения и сам возвращает FAILED
+                if isinstance(result, dict) and result.get("status") == "FAILED":
+                    snapshot["status"] = "FAILED"
+                    snapshot["error"] = result.get("reason")
+                settled = True
+            except Exception as e:
+                logger.error(f"Error getting workflow result for {job_id}: {str(e)}")
+
+        if settled and snapshot["status"] in TERMINAL_STATUSES:
+            self._live.pop(job_id, None)
+            self._terminal[job_id] = snapshot
+            while len(self._terminal) > self.max_terminal:
+                self._terminal.popitem(last=False)
+        else:
+            now = time.monotonic()
+            self._live[job_id] = (now, snapshot)
+            if len(self._live) > self.max_terminal:
+                # Вычищаем снимки workflow, которые давно никто не запрашивал
+                for stale_id in [k for k, (t, _) in self._live.items() if now - t > self.ttl_seconds]:
+                    del self._live[stale_id]
+        return snapshot
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self._live),
+            "terminal": len(self._terminal),
+            "inflight": len(self._inflight),
+            "rpc_calls": self.rpc_calls,
+        }
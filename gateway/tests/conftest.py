@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Модули сервиса импортируются по имени, как в образе; pix2fc — из исходников
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SERVICE_DIR.parent / "common"))
+sys.path.insert(0, str(SERVICE_DIR))
+
+# app.py читает настройки при импорте: файлы заданий — во временном каталоге
+os.environ.setdefault("STORAGE_DIR", tempfile.mkdtemp(prefix="pix2fc-gateway-"))
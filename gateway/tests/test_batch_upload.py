@@ -0,0 +1,50 @@
+import struct
+import zlib
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from ratelimit import MemoryRateLimiter
+
+
+def png() -> bytes:
+    ihdr = struct.pack(">IIBBBBB", 4, 4, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + ihdr + struct.pack(">I", zlib.crc32(b"IHDR" + ihdr))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    started = []
+
+    async def start_workflow(job_id, format, screens=None):
+        started.append((job_id, screens))
+
+    monkeypatch.setattr(app, "start_workflow", start_workflow)
+    monkeypatch.setattr(app, "rate_limiter", MemoryRateLimiter())
+    monkeypatch.setitem(app.RATE_LIMITS["upload"], "free", 5)
+    return TestClient(app.app), started
+
+
+def screens(count):
+    return [("files", (f"screen-{i}.png", png(), "image/png")) for i in range(count)]
+
+
+def job_dirs():
+    return {path.name for path in Path(app.STORAGE_DIR).glob("job-*")}
+
+
+def test_batch_is_charged_per_screen(client):
+    client, started = client
+    before = job_dirs()
+    response = client.post("/upload/batch", files=screens(3))
+    assert response.status_code == 200
+    assert response.headers["X-RateLimit-Remaining"] == "2"
+    assert started == [(response.json()["job_id"], 3)]
+
+    # Три экрана не помещаются в остаток бюджета: 429 до записи файлов
+    response = client.post("/upload/batch", files=screens(3))
+    assert response.status_code == 429 and "Retry-After" in response.headers
+    assert len(job_dirs() - before) == 1
+    assert client.post("/upload/batch", files=screens(2)).status_code == 200
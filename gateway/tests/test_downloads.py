@@ -0,0 +1,44 @@
+import pytest
+
+from downloads import RangeNotSatisfiable, etag_matches, file_chunks, file_etag, parse_range
+from pix2fc.bundle import BundleWriter
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=95-200", 100) == (95, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=-500", 100) == (0, 99)
+    # Несколько диапазонов и чужие единицы — файл целиком
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    for header in ("bytes=100-", "bytes=9-3", "bytes=-0"):
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range(header, 100)
+
+
+def test_etag_from_manifest_and_conditional_headers(tmp_path):
+    path = tmp_path / "bundle.zip"
+    writer = BundleWriter(path)
+    writer.add_bytes("index.html", b"<html></html>")
+    digest = writer.close(job_id="job", format="html")["etag"]
+
+    etag, size = file_etag(path)
+    assert etag == f'"{digest[:32]}-{size:x}"'
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_file_chunks_reads_inclusive_range(tmp_path, monkeypatch):
+    import downloads
+
+    monkeypatch.setattr(downloads, "READ_CHUNK", 4)
+    path = tmp_path / "data.bin"
+    path.write_bytes(bytes(range(20)))
+    chunks = list(file_chunks(path, 3, 12))
+    assert b"".join(chunks) == bytes(range(3, 13))
+    assert max(len(chunk) for chunk in chunks) == 4
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from pipeline import EmbeddedPipeline
+from pix2fc.dag import StageFailed
+
+real_sleep = asyncio.sleep
+
+
+class FakeServices:
+    """Заглушки сервисов вместо HTTP: журнал вызовов, отказы и пик параллелизма gen3d"""
+
+    def __init__(self):
+        self.calls = []
+        self.failures = {}
+        self.active = 0
+        self.peak = 0
+
+    async def request(self, method, service, path, payload=None, params=None):
+        self.calls.append(service)
+        if self.failures.get(service):
+            self.failures[service] -= 1
+            raise StageFailed(f"{service.upper()}_ERROR: 503", retryable=True)
+        if service == "vision":
+            return {"tree": [], "3d": ["cube", "ball", "cone", "torus"]}
+        if service == "codegen":
+            return {"complete": True, "chunks": [{"chunk_id": 0, "content": "<main />"}]}
+        if service == "gen3d":
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await real_sleep(0.01)
+            self.active -= 1
+            return {"status": "completed", "ticket_id": "t", "glb_url": f"/models/{payload['prompt']}.glb"}
+        return {"passed": True}
+
+
+@pytest.fixture
+def embedded(tmp_path, monkeypatch):
+    services = FakeServices()
+    reports = []
+    delays = []
+
+    async def report(job_id, progress, message):
+        reports.append((progress, message))
+
+    async def sleep(delay):
+        delays.append(delay)
+        await real_sleep(0)
+
+    def create(**kwargs):
+        pipeline = EmbeddedPipeline(str(tmp_path), {}, report, **kwargs)
+        pipeline._request = services.request
+        pipeline._write_bundle = lambda job_id, format, sections, meshes, qa_report: {
+            "files": len(sections) + len(meshes),
+        }
+        return pipeline
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    return create, services, reports, delays
+
+
+def test_stages_run_in_dag_order(embedded):
+    create, services, reports, _ = embedded
+    result = asyncio.run(create().run("job-order"))
+    assert result["status"] == "SUCCESS"
+    # codegen и gen3d идут параллельно, но после vision и до qa
+    assert services.calls[0] == "vision" and services.calls[-1] == "qa"
+    assert sorted(services.calls[1:-1]) == ["codegen", "gen3d", "gen3d", "gen3d", "gen3d"]
+    assert reports[-1] == (100, "Bundle exported")
+
+
+def test_rerun_reuses_checkpoints(embedded):
+    create, services, _, _ = embedded
+    services.failures["qa"] = 3
+    first = create(max_attempts=3)
+    assert asyncio.run(first.run("job-resume"))["status"] == "FAILED"
+    assert first.failed == 1
+
+    # Новый исполнитель (рестарт gateway): готовые этапы берутся из чекпоинтов
+    services.calls.clear()
+    second = create()
+    assert asyncio.run(second.run("job-resume"))["status"] == "SUCCESS"
+    assert services.calls == ["qa"]
+    assert second.checkpoint_hits == 6  # vision, codegen и четыре mesh'а
+
+
+def test_retryable_failures_are_retried_with_backoff(embedded):
+    create, services, _, delays = embedded
+    services.failures["codegen"] = 2
+    pipeline = create(max_attempts=3)
+    assert asyncio.run(pipeline.run("job-retry"))["status"] == "SUCCESS"
+    assert services.calls.count("codegen") == 3
+    assert delays == [2, 4]
+
+
+def test_non_retryable_failure_is_not_retried(embedded):
+    create, services, _, _ = embedded
+
+    async def request(method, service, path, payload=None, params=None):
+        services.calls.append(service)
+        raise StageFailed("VISION_ERROR: 400", retryable=False)
+
+    pipeline = create(max_attempts=3)
+    pipeline._request = request
+    result = asyncio.run(pipeline.run("job-bad-input"))
+    assert result["status"] == "FAILED"
+    assert services.calls == ["vision"]
+
+
+def test_stage_concurrency_limit(embedded):
+    create, services, _, _ = embedded
+    assert asyncio.run(create(stage_concurrency={"gen3d": 2}).run("job-limited"))["status"] == "SUCCESS"
+    assert services.peak == 2
+
+    services.peak = 0
+    assert asyncio.run(create().run("job-unlimited"))["status"] == "SUCCESS"
+    assert services.peak == 4
@@ -0,0 +1,54 @@
+import asyncio
+import hashlib
+import io
+import struct
+import zlib
+
+import pytest
+
+from ingest import UnsupportedImage, UploadTooLarge, sniff_image, stream_upload
+
+
+class FakeUpload:
+    """Минимальный UploadFile: только async read(n)"""
+
+    def __init__(self, data: bytes):
+        self._data = io.BytesIO(data)
+
+    async def read(self, n: int) -> bytes:
+        return self._data.read(n)
+
+
+def png(width: int, height: int, payload: bytes = b"") -> bytes:
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    chunk = struct.pack(">I", len(ihdr)) + b"IHDR" + ihdr
+    return b"\x89PNG\r\n\x1a\n" + chunk + struct.pack(">I", zlib.crc32(b"IHDR" + ihdr)) + payload
+
+
+def jpeg(width: int, height: int) -> bytes:
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + bytes(9)
+    sof = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + bytes(3)
+    return b"\xff\xd8" + app0 + sof + b"\xff\xd9"
+
+
+def test_sniff_image():
+    assert sniff_image(png(640, 480)) == ("png", 640, 480)
+    assert sniff_image(jpeg(1280, 720)) == ("jpeg", 1280, 720)
+    assert sniff_image(b"GIF89a......") == (None, None, None)
+
+
+def test_stream_upload_writes_file_in_chunks(tmp_path):
+    data = png(32, 16, payload=bytes(range(256)) * 100)
+    info = asyncio.run(stream_upload(FakeUpload(data), tmp_path, max_size=1 << 20, chunk_size=1000))
+    assert info.path == tmp_path / "upload.png"
+    assert info.path.read_bytes() == data
+    assert (info.size, info.format, info.width, info.height) == (len(data), "png", 32, 16)
+    assert info.sha256 == hashlib.sha256(data).hexdigest()
+
+
+def test_stream_upload_rejects_and_cleans_up(tmp_path):
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(stream_upload(FakeUpload(png(1, 1, payload=bytes(5000))), tmp_path, max_size=4096, chunk_size=1024))
+    with pytest.raises(UnsupportedImage):
+        asyncio.run(stream_upload(FakeUpload(b"not an image at all"), tmp_path, max_size=4096))
+    assert list(tmp_path.iterdir()) == []
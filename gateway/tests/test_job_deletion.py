@@ -0,0 +1,66 @@
+import asyncio
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+import app
+
+
+def job(job_id, status="PENDING", **fields):
+    return dict({
+        "job_id": job_id, "user_id": "u", "format": "next", "timestamp": datetime.now().isoformat(),
+        "status": status, "progress": 0, "logs": [],
+    }, **fields)
+
+
+@pytest.fixture(autouse=True)
+def no_services(monkeypatch):
+    async def forget_in_service(client, service, job_id):
+        pass
+
+    monkeypatch.setattr(app, "forget_in_service", forget_in_service)
+    monkeypatch.setattr(app, "temporal_client", None)
+
+
+def test_alias_expires_with_its_source():
+    async def main():
+        await app.job_store.create("source", job("source", "COMPLETED"))
+        await app.job_store.create("alias", job("alias", "COMPLETED", alias_of="source"))
+        assert (await app.resolve_job("alias"))["job_id"] == "source"
+        await app.delete_job("source")
+        assert await app.resolve_job("alias") is None
+        assert not await app.job_store.exists("alias")
+        assert await app.build_status("alias") is None
+
+    asyncio.run(main())
+
+
+def test_delete_cancels_running_embedded_pipeline(monkeypatch):
+    job_dir = Path(app.STORAGE_DIR) / "job-running"
+
+    async def run(job_id, format, fail_fast=True):
+        job_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+        # Без отмены пайплайн дописал бы чекпоинт после удаления
+        (job_dir / "checkpoint.json").write_text("{}")
+
+    state = {}
+    monkeypatch.setattr(app.embedded_pipeline, "run", run)
+
+    async def main():
+        await app.job_store.create("running", job("running"))
+        await app.start_workflow("running", "next")
+        await asyncio.sleep(0.01)
+        assert "running" in app.pipeline_tasks
+        assert await app.delete_job("running") == {"status": "deleted", "job_id": "running"}
+        assert "running" not in app.pipeline_tasks
+        await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert state == {"cancelled": True}
+    assert not job_dir.exists()
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+
+from job_store import JobStore, MemoryJobStore, SQLiteJobStore, create_job_store
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    store = create_job_store(request.param, str(tmp_path / "jobs.sqlite3"), ttl_seconds=60, max_jobs=100, max_logs=3)
+    yield store
+    asyncio.run(store.close())
+
+
+def test_interface_is_abstract():
+    with pytest.raises(TypeError):
+        JobStore()
+
+
+def test_crud_and_log_ring_buffer(store):
+    async def main():
+        await store.create("a", {"job_id": "a", "status": "PENDING", "logs": ["created"]})
+        assert await store.update("a", status="PROCESSING", progress=20)
+        for line in ("one", "two", "three"):
+            assert await store.append_log("a", line)
+        job = await store.get("a")
+        assert job["status"] == "PROCESSING" and job["progress"] == 20
+        assert job["logs"] == ["one", "two", "three"]
+        # Копия: изменения вызывающего кода не попадают в хранилище
+        job["status"] = "BROKEN"
+        assert (await store.get("a"))["status"] == "PROCESSING"
+        assert await store.exists("a")
+        assert await store.delete("a")
+        assert not await store.delete("a")
+        assert await store.get("a") is None
+        assert not await store.update("a", status="COMPLETED")
+        assert not await store.append_log("a", "late")
+
+    asyncio.run(main())
+
+
+def test_memory_store_evicts_least_recently_used():
+    async def main():
+        store = MemoryJobStore(ttl_seconds=60, max_jobs=2, max_logs=10)
+        await store.create("a", {})
+        await store.create("b", {})
+        await store.get("a")
+        await store.create("c", {})
+        return [await store.exists(job_id) for job_id in "abc"]
+
+    assert asyncio.run(main()) == [True, False, True]
+
+
+def test_sqlite_store_evicts_oldest_finished_jobs(tmp_path):
+    async def main():
+        store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"), ttl_seconds=60, max_jobs=2, max_logs=10)
+        try:
+            await store.create("running", {"status": "PROCESSING", "logs": ["started"]})
+            await store.create("done", {"status": "COMPLETED", "logs": ["finished"]})
+            await store.create("failed", {"status": "FAILED"})
+            # Задание в работе не вытесняется, даже если оно самое старое
+            after_first = [await store.exists(job_id) for job_id in ("running", "done", "failed")]
+            await store.create("new", {"status": "PENDING"})
+            after_second = [await store.exists(job_id) for job_id in ("running", "failed", "new")]
+            (logs,) = store._conn.execute("SELECT COUNT(*) FROM job_logs WHERE job_id = 'done'").fetchone()
+            return after_first, after_second, logs
+        finally:
+            await store.close()
+
+    assert asyncio.run(main()) == ([True, False, True], [True, False, True], 0)
+
+
+def test_expired_jobs_disappear(tmp_path, monkeypatch):
+    async def main(store):
+        await store.create("a", {"status": "PENDING"})
+        now = time.monotonic() + 120, time.time() + 120
+        monkeypatch.setattr(time, "monotonic", lambda: now[0])
+        monkeypatch.setattr(time, "time", lambda: now[1])
+        try:
+            return await store.get("a")
+        finally:
+            monkeypatch.undo()
+            await store.close()
+
+    assert asyncio.run(main(MemoryJobStore(ttl_seconds=60, max_jobs=10, max_logs=10))) is None
+    assert asyncio.run(main(SQLiteJobStore(str(tmp_path / "jobs.sqlite3"), ttl_seconds=60, max_jobs=10, max_logs=10))) is None
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import time
+
+from lifecycle import StorageLifecycle
+
+DAY = 86400
+
+
+def make_job(storage, job_id, files, age=0):
+    job_dir = storage / f"job-{job_id}"
+    job_dir.mkdir(parents=True)
+    mtime = time.time() - age
+    for name, size in files.items():
+        path = job_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * size)
+        os.utime(path, (mtime, mtime))
+    os.utime(job_dir, (mtime, mtime))
+    return job_dir
+
+
+def lifecycle(storage, states, max_bytes=1 << 30, delete_orphans=True):
+    expired = []
+
+    async def is_active(job_id):
+        return states.get(job_id)
+
+    async def on_expire(job_id):
+        expired.append(job_id)
+
+    ttls = {"uploads": DAY, "bundles": 7 * DAY, "intermediate": 2 * DAY}
+    manager = StorageLifecycle(
+        str(storage), ttls, max_bytes, is_active, on_expire,
+        batch_size=2, delete_orphans=delete_orphans, orphan_grace=7 * DAY,
+    )
+    return manager, expired
+
+
+def test_sweep_applies_ttl_per_artifact_class(tmp_path):
+    make_job(tmp_path, "old-upload", {"upload.png": 10, "bundle.zip": 10, "screens/page.json": 10}, age=1.5 * DAY)
+    make_job(tmp_path, "old-bundle", {"bundle.zip": 10}, age=8 * DAY)
+    make_job(tmp_path, "running", {"upload.png": 10}, age=30 * DAY)
+    make_job(tmp_path, "orphan", {"upload.png": 10}, age=8 * DAY)
+    states = {"old-upload": False, "old-bundle": False, "running": True}
+    manager, expired = lifecycle(tmp_path, states)
+
+    asyncio.run(manager.sweep())
+
+    assert sorted(expired) == ["old-bundle", "orphan"]
+    remaining = sorted(str(p.relative_to(tmp_path)) for p in tmp_path.rglob("*") if p.is_file())
+    assert remaining == ["job-old-upload/bundle.zip", "job-old-upload/screens/page.json", "job-running/upload.png"]
+    stats = manager.stats()
+    assert stats["expired_jobs"] == 2 and stats["total_bytes"] == 30
+
+
+def test_quota_evicts_least_recently_used_finished_jobs(tmp_path):
+    make_job(tmp_path, "a", {"bundle.zip": 100}, age=300)
+    make_job(tmp_path, "b", {"bundle.zip": 100}, age=200)
+    make_job(tmp_path, "c", {"bundle.zip": 100}, age=100)
+    make_job(tmp_path, "busy", {"upload.png": 100}, age=400)
+    manager, expired = lifecycle(tmp_path, {"a": False, "b": False, "c": False, "busy": True}, max_bytes=250)
+
+    asyncio.run(manager.sweep())
+
+    assert expired == ["a", "b"]
+    assert manager.stats()["evicted_jobs"] == 2 and manager.total_bytes == 200
+
+
+def test_discard_hides_job_and_background_task_empties_trash(tmp_path):
+    make_job(tmp_path, "gone", {"upload.png": 10, "bundle.zip": 10})
+    manager, _ = lifecycle(tmp_path, {"gone": False})
+
+    async def main():
+        await manager.start()
+        assert await manager.discard("gone")
+        assert not (tmp_path / "job-gone").exists()
+        assert not await manager.discard("gone")
+        for _ in range(100):
+            if not any((tmp_path / ".trash").iterdir()):
+                break
+            await asyncio.sleep(0.01)
+        await manager.close()
+
+    asyncio.run(main())
+    assert list((tmp_path / ".trash").iterdir()) == []
+    assert manager.stats()["discarded_jobs"] == 1
+
+
+def test_recent_or_unshared_orphans_are_kept(tmp_path):
+    # Каталог без записи может принадлежать другому воркеру или только что созданному заданию
+    make_job(tmp_path, "fresh", {"upload.png": 10}, age=DAY)
+    make_job(tmp_path, "old", {"upload.png": 10}, age=8 * DAY)
+    shared, expired = lifecycle(tmp_path, {})
+    asyncio.run(shared.sweep())
+    assert expired == ["old"]
+
+    make_job(tmp_path, "old", {"upload.png": 10}, age=8 * DAY)
+    per_worker, expired = lifecycle(tmp_path, {}, delete_orphans=False)
+    asyncio.run(per_worker.sweep())
+    assert expired == []
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["job-fresh", "job-old"]
+
+
+def test_first_sweep_waits_one_interval(tmp_path):
+    make_job(tmp_path, "old", {"upload.png": 10}, age=8 * DAY)
+    manager, expired = lifecycle(tmp_path, {})
+    manager.interval = 3600
+
+    async def main():
+        await manager.start()
+        await asyncio.sleep(0.05)
+        await manager.close()
+
+    asyncio.run(main())
+    assert expired == [] and manager.stats()["sweeps"] == 0
@@ -0,0 +1,64 @@
+import asyncio
+
+from progress import ProgressHub, new_log_lines, sse_event
+
+
+def test_one_watcher_fans_out_changes_until_terminal():
+    snapshots = [
+        {"status": "PROCESSING", "progress": 10, "eta": 30},
+        {"status": "PROCESSING", "progress": 10, "eta": 25},
+        {"status": "PROCESSING", "progress": 60, "eta": 10},
+        {"status": "COMPLETED", "progress": 100, "eta": 0},
+    ]
+    calls = []
+
+    async def fetch(job_id):
+        calls.append(job_id)
+        return snapshots[min(len(calls), len(snapshots)) - 1]
+
+    async def drain(queue):
+        received = []
+        while (snapshot := await queue.get()) is not None:
+            received.append(snapshot["progress"])
+        return received
+
+    async def main():
+        hub = ProgressHub(fetch, poll_interval=0.01)
+        first, second = hub.subscribe("job"), hub.subscribe("job")
+        results = await asyncio.wait_for(asyncio.gather(drain(first), drain(second)), timeout=5)
+        return hub, results
+
+    hub, results = asyncio.run(main())
+    # Изменение только ETA не рассылается; источник опрашивается одним наблюдателем
+    assert results == [[10, 60, 100], [10, 60, 100]]
+    assert len(calls) == len(snapshots)
+    assert hub.subscriber_count("job") == 0
+
+
+def test_deleted_job_closes_stream_and_unsubscribe_stops_watcher():
+    async def gone(job_id):
+        return None
+
+    async def running(job_id):
+        return {"status": "PROCESSING", "progress": 5}
+
+    async def main():
+        hub = ProgressHub(gone, poll_interval=0.01)
+        assert await asyncio.wait_for(hub.subscribe("a").get(), timeout=5) is None
+
+        hub = ProgressHub(running, poll_interval=0.01)
+        queue = hub.subscribe("b")
+        assert (await queue.get())["progress"] == 5
+        watcher = hub._watchers["b"]
+        hub.unsubscribe("b", queue)
+        await asyncio.sleep(0)
+        return watcher
+
+    assert asyncio.run(main()).cancelled()
+
+
+def test_new_log_lines_and_sse_event():
+    assert new_log_lines(["a", "b", "c"], ["b", "c", "d", "e"]) == ["d", "e"]
+    assert new_log_lines([], ["a"]) == ["a"]
+    assert new_log_lines(["x"], ["a", "b"]) == ["a", "b"]
+    assert sse_event("status", {"progress": 5}) == 'event: status\ndata: {"progress": 5}\n\n'
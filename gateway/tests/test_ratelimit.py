@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+import ratelimit
+from ratelimit import RateLimiter, _decide, create_rate_limiter
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def limiter(request, tmp_path, monkeypatch):
+    clock = Clock(6000.0)  # начало 60-секундного окна
+    monkeypatch.setattr(ratelimit.time, "time", clock)
+    limiter = create_rate_limiter(request.param, str(tmp_path / "ratelimit.sqlite3"))
+    yield limiter, clock
+    asyncio.run(limiter.close())
+
+
+def test_interface_is_abstract():
+    with pytest.raises(TypeError):
+        RateLimiter()
+
+
+def test_limit_within_window_and_headers(limiter):
+    limiter, clock = limiter
+
+    async def main():
+        decisions = [await limiter.hit("user", limit=3, window=60) for _ in range(4)]
+        other = await limiter.hit("other", limit=3, window=60)
+        return decisions, other
+
+    decisions, other = asyncio.run(main())
+    assert [d.allowed for d in decisions] == [True, True, True, False]
+    assert [d.remaining for d in decisions[:3]] == [2, 1, 0]
+    assert decisions[-1].headers()["Retry-After"] == "60"
+    assert "Retry-After" not in decisions[0].headers()
+    assert other.allowed
+
+
+def test_previous_window_is_weighted(limiter):
+    limiter, clock = limiter
+
+    async def main():
+        for _ in range(4):
+            await limiter.hit("user", limit=4, window=60)
+        # Середина следующего окна: из 4 запросов прошлого окна учитывается половина
+        clock.now += 90
+        return [await limiter.hit("user", limit=4, window=60) for _ in range(3)]
+
+    assert [d.allowed for d in asyncio.run(main())] == [True, True, False]
+
+
+def test_retry_after_waits_for_previous_window_to_fade():
+    decision, cur = _decide(prev=10, cur=0, limit=5, window=60, now=6000.0)
+    assert not decision.allowed and cur == 0
+    assert decision.retry_after == 36  # вес прошлого окна опустится до 0.4 через 36 с
+
+
+def test_cost_charges_several_requests_at_once():
+    decision, cur = _decide(prev=0, cur=2, limit=5, window=60, now=6000.0, cost=3)
+    assert decision.allowed and decision.remaining == 0 and cur == 5
+    decision, cur = _decide(prev=0, cur=3, limit=5, window=60, now=6000.0, cost=3)
+    assert not decision.allowed and cur == 3
@@ -0,0 +1,65 @@
+import pytest
+
+import result_cache
+from result_cache import COMPLETED, INFLIGHT, ResultCache, cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_inflight_join_then_completed_hit(clock):
+    cache = ResultCache(ttl_seconds=60, max_entries=10)
+    key = cache_key("abc", "next")
+    assert cache.lookup(key) is None
+    cache.register(key, "job-1")
+    assert cache.lookup(key).state == INFLIGHT
+    cache.complete("job-1")
+    entry = cache.lookup(key)
+    assert entry.state == COMPLETED and entry.job_id == "job-1"
+    # Другой формат — другой ключ
+    assert cache.lookup(cache_key("abc", "html")) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["joins"], stats["misses"]) == (1, 1, 2)
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_completed_entry_expires_after_ttl(clock):
+    cache = ResultCache(ttl_seconds=60, max_entries=10, inflight_ttl_seconds=600)
+    cache.register("a", "job-a")
+    cache.register("b", "job-b")
+    cache.complete("job-a")
+    clock.now += 61
+    assert cache.lookup("a") is None
+    # Задание в работе живёт по своему TTL
+    assert cache.lookup("b").state == INFLIGHT
+    clock.now += 600
+    assert cache.lookup("b") is None
+    assert cache.stats()["evictions"] == 2
+
+
+def test_lru_eviction_and_invalidation(clock):
+    cache = ResultCache(ttl_seconds=60, max_entries=2)
+    cache.register("a", "job-a")
+    cache.register("b", "job-b")
+    cache.lookup("a")
+    cache.register("c", "job-c")
+    assert cache.lookup("b") is None
+    assert cache.lookup("a") is not None
+    cache.invalidate_job("job-a")
+    assert cache.lookup("a") is None
+    # Завершение вытесненного или удалённого задания ничего не делает
+    cache.complete("job-a")
+    cache.complete("job-b")
+    assert cache.stats()["entries"] == 1
@@ -0,0 +1,112 @@
+import asyncio
+from types import SimpleNamespace
+
+import temporal_status
+from temporal_status import TemporalStatusCache, workflow_id
+
+
+class FakeHandle:
+    def __init__(self, client, workflow):
+        self.client = client
+        self.workflow = workflow
+
+    async def describe(self):
+        await asyncio.sleep(0)
+        return SimpleNamespace(status=SimpleNamespace(name=self.client.status), failure=None)
+
+    async def query(self, name):
+        assert name == "progress"
+        return {"progress": 40, "stage": "codegen", "logs": ["codegen started"]}
+
+    async def result(self):
+        return {"status": "COMPLETED", "files": 3}
+
+
+class FakeClient:
+    def __init__(self, status):
+        self.status = status
+        self.workflows = []
+
+    def get_workflow_handle(self, workflow):
+        self.workflows.append(workflow)
+        return FakeHandle(self, workflow)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_running_status_is_coalesced_and_cached(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(temporal_status.time, "monotonic", clock)
+    client = FakeClient("RUNNING")
+    cache = TemporalStatusCache(lambda: client, ttl_seconds=2.0)
+
+    async def main():
+        first = await asyncio.gather(*(cache.get("job") for _ in range(5)))
+        cached = await cache.get("job")
+        clock.now += 3
+        refreshed = await cache.get("job")
+        return first, cached, refreshed
+
+    first, cached, refreshed = asyncio.run(main())
+    assert client.workflows == [workflow_id("job")] * 2
+    # describe + query на каждое обращение к Temporal
+    assert cache.rpc_calls == 4
+    assert first[0]["status"] == "PROCESSING" and first[0]["stage"] == "codegen"
+    assert all(snapshot is first[0] for snapshot in first) and cached is first[0]
+    assert refreshed["progress"] == 40
+
+
+def test_terminal_status_is_kept():
+    client = FakeClient("COMPLETED")
+    cache = TemporalStatusCache(lambda: client, max_terminal=1)
+
+    async def main():
+        snapshot = await cache.get("a")
+        assert await cache.get("a") is snapshot
+        await cache.get("b")
+        await cache.get("a")
+
+    asyncio.run(main())
+    # a вытеснено из LRU завершённых снимков после b и запрошено заново
+    assert client.workflows == [workflow_id(job_id) for job_id in "aba"]
+    assert cache.stats()["terminal"] == 1
+    cache.forget("a")
+    assert cache.stats()["terminal"] == 0
+
+
+def test_missing_client_means_unknown_job():
+    cache = TemporalStatusCache(lambda: None)
+    assert asyncio.run(cache.get("job")) is None
+
+
+def test_completed_without_result_is_not_kept(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(temporal_status.time, "monotonic", clock)
+    client = FakeClient("COMPLETED")
+    calls = []
+
+    async def flaky_result(self):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("history fetch timed out")
+        return {"status": "COMPLETED", "files": 3}
+
+    monkeypatch.setattr(FakeHandle, "result", flaky_result)
+    cache = TemporalStatusCache(lambda: client, ttl_seconds=2.0)
+
+    async def main():
+        first = await cache.get("job")
+        clock.now += 3
+        return first, await cache.get("job")
+
+    first, second = asyncio.run(main())
+    # Первый снимок без результата живёт только ttl, второй запоминается навсегда
+    assert first["result"] is None and cache.stats()["live"] == 0
+    assert second["result"] == {"status": "COMPLETED", "files": 3}
+    assert cache.stats()["terminal"] == 1
@@ -0,0 +1,364 @@
+"""
+Очередь генераций 3D с приоритетами и пулом процессов.
+
+Тяжёлый пайплайн выполняется в ProcessPoolExecutor, а не в event loop uvicorn.
+Задания ждут в очереди с приоритетом (платный тариф, затем меньший LOD);
+при заполненной очереди новые запросы отклоняются с оценкой Retry-After.
+Клиент получает тикет и опрашивает его; запросы с тем же промптом
+присоединяются к уже стоящему в очереди заданию.
+
+Модель генерируется один раз с полной детализацией, затем уровни LOD строятся
+в том же пуле параллельно и по готовности кладутся в кэш под ключом
+(промпт, LOD). Тикет видит каждый готовый LOD сразу: клиент показывает
+грубую модель через секунды и подменяет её более детальной.
+
+forget_job() удаляет данные задания пайплайна (GDPR): его тикеты, ещё не
+начатые генерации и модели его промптов в кэше — если те же промпты не
+запрошены другими заданиями. Генерация в работе доделывается, а её модели
+удаляются сразу по завершении.
+"""
+import asyncio
+import itertools
+import logging
+import math
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+DELETED_ERROR = "DELETED: job data was deleted"
+
+# Меньшее значение — выше приоритет
+TIER_PRIORITY = {"pro": 0, "free": 1}
+
+
+class QueueFull(Exception):
+    """Очередь заполнена; retry_after — оценка в секундах, когда стоит повторить"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Generation queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+@dataclass
+class GenerationJob:
+    key: str
+    prompt: str
+    priority: Tuple[int, int]
+    seq: int = 0
+    status: str = QUEUED
+    # LOD -> digest GLB в кэше моделей
+    lods: Dict[int, str] = field(default_factory=dict)
+    error: Optional[str] = None
+    finished_at: Optional[float] = None
+    # Срабатывает и заменяется новым при каждом готовом LOD и по завершении задания
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+    # Задание пайплайна удалено во время генерации — модели удаляются из кэша по завершении
+    discarded: bool = False
+
+
+@dataclass
+class Ticket:
+    ticket_id: str
+    job: GenerationJob
+    lod: int
+    created_at: float
+    job_id: Optional[str] = None
+
+    @property
+    def status(self) -> str:
+        """Тикет завершён, как только готов запрошенный LOD, не дожидаясь остальных"""
+        if self.lod in self.job.lods:
+            return COMPLETED
+        if self.job.status in (COMPLETED, FAILED):
+            return FAILED
+        return self.job.status
+
+    @property
+    def digest(self) -> Optional[str]:
+        return self.job.lods.get(self.lod)
+
+
+class GenerationQueue:
+    """
+    submit() ставит генерацию в очередь и возвращает тикет; get()/wait() отдают
+    его состояние. workers процессов выполняют generate(prompt, output_dir) и
+    затем build(mesh_path, lod, output_dir) для каждого из lods уровней;
+    key(prompt, lod) — ключ LOD в кэше моделей.
+    """
+
+    def __init__(
+        self,
+        mesh_cache,
+        generate: Callable[[str, str], Optional[str]],
+        build: Callable[[str, int, str], str],
+        key: Callable[[str, int], str],
+        output_dir: str,
+        lods: int = 3,
+        workers: int = 2,
+        max_queue: int = 100,
+        ticket_ttl: float = 3600.0,
+        max_tickets: int = 10000,
+    ):
+        self.mesh_cache = mesh_cache
+        self.generate = generate
+        self.build = build
+        self.key = key
+        self.lods = lods
+        self.output_dir = Path(output_dir)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.ticket_ttl = ticket_ttl
+        self.max_tickets = max_tickets
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._by_key: Dict[str, GenerationJob] = {}
+        self._tickets: "OrderedDict[str, Ticket]" = OrderedDict()
+        # job_id пайплайна -> его промпты; живёт дольше тикетов, чтобы удаление задания нашло модели
+        self._job_prompts: "OrderedDict[str, set]" = OrderedDict()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._dispatchers: List[asyncio.Task] = []
+        # Живые задания в очереди: в куче ещё лежат записи отменённых и повышенных в приоритете
+        self.queued = 0
+        self.running = 0
+        # Скользящее среднее длительности генерации для оценки Retry-After
+        self.avg_duration = 30.0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.forgotten = 0
+
+    async def start(self) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        for task in self._dispatchers:
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def retry_after(self) -> int:
+        backlog = self.queued + self.running
+        return max(1, math.ceil(self.avg_duration * backlog / self.workers))
+
+    async def _cached_lods(self, prompt: str) -> Dict[int, str]:
+        cached = {}
+        for lod in range(self.lods):
+            digest = await self.mesh_cache.get(self.key(prompt, lod))
+            if digest is not None:
+                cached[lod] = digest
+        return cached
+
+    async def submit(self, prompt: str, lod: int, tier: str = "free", job_id: Optional[str] = None) -> Ticket:
+        self._purge()
+        # Задание генерирует все LOD сразу, поэтому идентифицируется ключом полной детализации
+        key = self.key(prompt, self.lods - 1)
+        priority = (TIER_PRIORITY.get(tier, 1), lod)
+        job = self._by_key.get(key)
+        if job is None:
+            cached = await self._cached_lods(prompt)
+            if lod in cached:
+                # Модель уже в кэше — тикет сразу завершён, очередь не нужна
+                job = GenerationJob(key, prompt, (0, 0), status=COMPLETED, lods=cached, finished_at=time.time())
+            else:
+                if self.queued >= self.max_queue:
+                    self.rejected += 1
+                    raise QueueFull(self.retry_after())
+                # Уцелевшие в кэше LOD отдаются сразу и не перестраиваются
+                job = GenerationJob(key, prompt, priority, next(self._seq), lods=cached)
+                self._by_key[key] = job
+                self.queued += 1
+                self._queue.put_nowait((job.priority, job.seq, job))
+        elif priority < job.priority and job.status == QUEUED:
+            # Платный клиент или запрос меньшего LOD присоединился к заданию — поднимаем его в очереди
+            job.priority = priority
+            self._queue.put_nowait((job.priority, job.seq, job))
+
+        ticket = Ticket(uuid.uuid4().hex, job, lod, time.time(), job_id)
+        self._tickets[ticket.ticket_id] = ticket
+        if job_id is not None:
+            prompts = self._job_prompts.pop(job_id, set())
+            prompts.add(prompt)
+            self._job_prompts[job_id] = prompts
+            while len(self._job_prompts) > self.max_tickets:
+                self._job_prompts.popitem(last=False)
+        return ticket
+
+    def _lod_keys(self, prompt: str) -> List[str]:
+        return [self.key(prompt, lod) for lod in range(self.lods)]
+
+    def _shared(self, job_key: str) -> bool:
+        """Промпт запрошен каким-либо из оставшихся заданий"""
+        return any(
+            self.key(prompt, self.lods - 1) == job_key
+            for prompts in self._job_prompts.values() for prompt in prompts
+        )
+
+    async def forget_job(self, job_id: str) -> int:
+        """Удаляет тикеты, генерации и модели задания пайплайна; возвращает число его промптов"""
+        prompts = self._job_prompts.pop(job_id, set())
+        for ticket_id, ticket in list(self._tickets.items()):
+            if ticket.job_id == job_id:
+                prompts.add(ticket.job.prompt)
+                del self._tickets[ticket_id]
+        keys = []
+        for prompt in prompts:
+            job_key = self.key(prompt, self.lods - 1)
+            if self._shared(job_key):
+                continue
+            job = self._by_key.get(job_key)
+            if job is not None and job.status == RUNNING:
+                job.discarded = True
+                continue
+            if job is not None:
+                # Ещё в очереди: диспетчер пропустит задание, раз оно уже не QUEUED
+                self.queued -= 1
+                job.status = FAILED
+                job.error = DELETED_ERROR
+                job.finished_at = time.time()
+                self._by_key.pop(job_key, None)
+                self._notify(job)
+            keys.extend(self._lod_keys(prompt))
+        await self.mesh_cache.delete(keys)
+        self.forgotten += 1
+        return len(prompts)
+
+    def get(self, ticket_id: str) -> Optional[Ticket]:
+        return self._tickets.get(ticket_id)
+
+    async def wait(self, ticket: Ticket, timeout: float) -> None:
+        """
+        Ждёт не дольше timeout секунд (long polling) следующего готового LOD
+        или завершения тикета — так клиент получает каждый уровень детализации сразу.
+        """
+        if timeout <= 0 or ticket.status in (COMPLETED, FAILED):
+            return
+        try:
+            await asyncio.wait_for(ticket.job.changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def position(self, ticket: Ticket) -> Optional[int]:
+        """Сколько заданий в очереди впереди; None, если задание уже не в очереди"""
+        job = ticket.job
+        if job.status != QUEUED:
+            return None
+        ahead = {
+            id(queued) for priority, seq, queued in self._queue._queue
+            if (priority, seq) < (job.priority, job.seq) and priority == queued.priority and queued.status == QUEUED
+        }
+        return len(ahead)
+
+    @staticmethod
+    def _notify(job: GenerationJob) -> None:
+        changed, job.changed = job.changed, asyncio.Event()
+        changed.set()
+
+    def _purge(self) -> None:
+        now = time.time()
+        while self._tickets:
+            ticket = next(iter(self._tickets.values()))
+            finished = ticket.job.finished_at
+            expired = finished is not None and now - finished > self.ticket_ttl
+            if not expired and len(self._tickets) <= self.max_tickets:
+                break
+            self._tickets.popitem(last=False)
+
+    async def _dispatch(self) -> None:
+        while True:
+            priority, _, job = await self._queue.get()
+            # Устаревшая запись после повышения приоритета: задание уже взято другим диспетчером
+            if job.status != QUEUED or priority != job.priority:
+                continue
+            self.queued -= 1
+            job.status = RUNNING
+            self.running += 1
+            started = time.monotonic()
+            try:
+                mesh_path = await self._run_in_pool(self.generate, job.prompt, str(self.output_dir))
+                if mesh_path is None:
+                    job.status = FAILED
+                    job.error = "NO_MESH: 3D generation failed, no mesh was produced."
+                else:
+                    try:
+                        # LOD 0 отправляется в пул первым и готов раньше остальных
+                        await asyncio.gather(*(
+                            self._build_lod(job, lod, mesh_path) for lod in range(self.lods) if lod not in job.lods
+                        ))
+                    finally:
+                        Path(mesh_path).unlink(missing_ok=True)
+                    job.status = COMPLETED if job.lods else FAILED
+            except Exception as e:
+                logger.error(f"3D generation failed for '{job.prompt}': {str(e)}")
+                job.status = FAILED
+                job.error = f"PIPELINE_ERROR: {e}"
+            finally:
+                self.running -= 1
+                self.avg_duration = 0.8 * self.avg_duration + 0.2 * (time.monotonic() - started)
+                if job.status == COMPLETED:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                job.finished_at = time.time()
+                self._by_key.pop(job.key, None)
+                self._notify(job)
+                if job.discarded and not self._shared(job.key):
+                    await self.mesh_cache.delete(self._lod_keys(job.prompt))
+
+    async def _build_lod(self, job: GenerationJob, lod: int, mesh_path: str) -> None:
+        try:
+            digest, _ = await self.mesh_cache.get_or_create(
+                self.key(job.prompt, lod),
+                lambda: self._run_in_pool(self.build, mesh_path, lod, str(self.output_dir)),
+            )
+        except Exception as e:
+            # Неудача одного LOD не отменяет остальные: тикеты на него получат ошибку
+            logger.error(f"LOD {lod} build failed for '{job.prompt}': {str(e)}")
+            job.error = job.error or f"PIPELINE_ERROR: LOD {lod}: {e}"
+            return
+        if digest is not None:
+            job.lods[lod] = digest
+            self._notify(job)
+
+    async def _run_in_pool(self, fn: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        try:
+            return await loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            # Воркер упал (OOM, segfault в нативной библиотеке) — пересоздаём пул для следующих заданий;
+            # сломанный пул видят все его задачи, пересоздаёт только первая
+            if self._executor is executor:
+                logger.error("3D worker process died, restarting process pool")
+                executor.shutdown(wait=False, cancel_futures=False)
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self.queued,
+            "running": self.running,
+            "max_queue": self.max_queue,
+            "tickets": len(self._tickets),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "forgotten_jobs": self.forgotten,
+            "avg_duration": round(self.avg_duration, 2),
+            "retry_after": self.retry_after(),
+        }
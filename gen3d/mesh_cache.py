@@ -0,0 +1,225 @@
+"""
+Дисковый кэш готовых GLB-моделей с объединением одновременных генераций.
+
+Ключ — хеш (нормализованный промпт, LOD, версия пайплайна); ключ ссылается на
+blob с именем sha256 содержимого GLB, поэтому одинаковые модели хранятся один
+раз. Общий объём blob'ов ограничен, при превышении удаляются давно не
+использованные записи. Одновременные запросы с одним ключом ждут один и тот
+же запуск пайплайна вместо параллельных дубликатов.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """'  Coffee   Cup! ' и 'coffee cup' дают один ключ"""
+    text = unicodedata.normalize("NFKC", prompt).lower()
+    text = re.sub(r"[^\w\s-]", " ", text)
+    return " ".join(text.split())
+
+
+def mesh_cache_key(prompt: str, lod: int, pipeline_version: str) -> str:
+    return hashlib.sha256(f"{normalize_prompt(prompt)}\0{lod}\0{pipeline_version}".encode()).hexdigest()
+
+
+def _file_digest(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+class MeshCache:
+    """LRU-кэш GLB по ключу с контент-адресуемым хранением и лимитом по байтам"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.objects_dir = self.directory / "objects"
+        self.keys_dir = self.directory / "keys"
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> digest; порядок — от давно использованных к недавним
+        self._index: "OrderedDict[str, str]" = OrderedDict()
+        # digest -> (размер, число ссылающихся ключей)
+        self._blobs: Dict[str, Tuple[int, int]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._load_index()
+
+    def blob_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / f"{digest}.glb"
+
+    def _key_path(self, key: str) -> Path:
+        return self.keys_dir / key[:2] / key
+
+    def _load_index(self) -> None:
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.keys_dir.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for path in self.keys_dir.glob("*/*"):
+            try:
+                digest = path.read_text().strip()
+                mtime = path.stat().st_mtime
+                size = self.blob_path(digest).stat().st_size
+            except (FileNotFoundError, OSError):
+                path.unlink(missing_ok=True)
+                continue
+            entries.append((mtime, path.name, digest, size))
+        for _, key, digest, size in sorted(entries):
+            self._link(key, digest, size)
+
+    def _link(self, key: str, digest: str, size: int) -> None:
+        self._index[key] = digest
+        blob_size, refs = self._blobs.get(digest, (size, 0))
+        if refs == 0:
+            self.total_bytes += blob_size
+        self._blobs[digest] = (blob_size, refs + 1)
+
+    def _unlink(self, key: str) -> Optional[str]:
+        """Убирает ключ из индекса; возвращает digest blob'а, если на него больше никто не ссылается"""
+        digest = self._index.pop(key, None)
+        if digest is None:
+            return None
+        size, refs = self._blobs[digest]
+        if refs > 1:
+            self._blobs[digest] = (size, refs - 1)
+            return None
+        del self._blobs[digest]
+        self.total_bytes -= size
+        return digest
+
+    def _remove_files(self, keys, digests) -> None:
+        for key in keys:
+            self._key_path(key).unlink(missing_ok=True)
+        for digest in digests:
+            self.blob_path(digest).unlink(missing_ok=True)
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            digest = self._index.get(key)
+            if digest is not None:
+                self._index.move_to_end(key)
+        if digest is None:
+            return None
+        if not self.blob_path(digest).exists():
+            with self._lock:
+                self._unlink(key)
+            self._remove_files([key], [])
+            return None
+        # mtime файла-ключа служит временем последнего доступа для LRU после рестарта
+        now = time.time()
+        os.utime(self._key_path(key), (now, now))
+        return digest
+
+    def _put(self, key: str, source: Path) -> str:
+        digest = _file_digest(source)
+        target = self.blob_path(digest)
+        size = source.stat().st_size
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Файл пайплайна переходит во владение кэша: перемещается или удаляется
+        if target.exists():
+            source.unlink(missing_ok=True)
+        else:
+            tmp_path = target.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                os.replace(source, tmp_path)
+            except OSError:
+                # Другая файловая система
+                shutil.copyfile(source, tmp_path)
+                source.unlink(missing_ok=True)
+            os.replace(tmp_path, target)
+        key_path = self._key_path(key)
+        key_path.parent.mkdir(parents=True, exist_ok=True)
+        key_path.write_text(digest)
+
+        with self._lock:
+            orphans = [self._unlink(key)]
+            self._link(key, digest, size)
+            victims = []
+            while self.total_bytes > self.max_bytes and len(self._index) > 1:
+                victim = next(iter(self._index))
+                if victim == key:
+                    break
+                victims.append(victim)
+                orphans.append(self._unlink(victim))
+                self.evictions += 1
+        self._remove_files(victims, [orphan for orphan in orphans if orphan and orphan != digest])
+        return digest
+
+    def _delete(self, keys: List[str]) -> None:
+        with self._lock:
+            orphans = [self._unlink(key) for key in keys]
+        self._remove_files(keys, [orphan for orphan in orphans if orphan])
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def delete(self, keys: List[str]) -> None:
+        """Удаляет ключи и GLB, на которые больше никто не ссылается"""
+        if keys:
+            await asyncio.to_thread(self._delete, list(keys))
+
+    async def get_or_create(
+        self,
+        key: str,
+        produce: Callable[[], Awaitable[Optional[Path]]],
+    ) -> Tuple[Optional[str], bool]:
+        """
+        Возвращает (digest GLB, взят ли результат из кэша). produce() запускает
+        пайплайн и возвращает путь к готовому GLB (файл забирает кэш) или None; одновременные вызовы
+        с тем же ключом ждут один запуск. Неудачи не кэшируются.
+        """
+        digest = await self.get(key)
+        if digest is not None:
+            self.hits += 1
+            return digest, True
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task), True
+
+        async def produce_and_store() -> Optional[str]:
+            try:
+                path = await produce()
+                if path is None:
+                    return None
+                return await asyncio.to_thread(self._put, key, Path(path))
+            finally:
+                self._inflight.pop(key, None)
+
+        self.misses += 1
+        # Генерация идёт отдельной задачей: отключение первого клиента не отменяет её для остальных
+        task = asyncio.ensure_future(produce_and_store())
+        self._inflight[key] = task
+        return await asyncio.shield(task), False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._index),
+            "blobs": len(self._blobs),
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,206 @@
+"""
+Уровни детализации (LOD) и компактный GLB.
+
+Пайплайн генерирует одну детальную модель; младшие LOD получаются из неё
+векторизованной децимацией: вершины кластеризуются по равномерной сетке, и
+каждый кластер заменяется точкой с минимальной квадрикой ошибки (QEM) его
+граней. Разрешение сетки подбирается бинарным поиском под бюджет граней.
+
+GLB пишется с KHR_mesh_quantization: позиции — uint16 (масштаб и сдвиг в
+узле сцены), нормали — нормализованные int8, индексы — uint16, если хватает.
+"""
+import json
+import struct
+from typing import Tuple
+
+import numpy as np
+
+# Доля граней детальной модели на каждом LOD: 0 — быстрый предпросмотр, 2 — полная детализация
+LOD_FACE_RATIOS = (0.05, 0.25, 1.0)
+MIN_LOD_FACES = 256  # грани; меньше — модель теряет узнаваемость
+
+_MAX_GRID = 1024  # ячеек по длинной оси при поиске разрешения сетки
+
+_GLB_MAGIC = 0x46546C67
+_CHUNK_JSON = 0x4E4F534A
+_CHUNK_BIN = 0x004E4942
+_BYTE = 5120
+_UNSIGNED_SHORT = 5123
+_UNSIGNED_INT = 5125
+_ARRAY_BUFFER = 34962
+_ELEMENT_ARRAY_BUFFER = 34963
+
+
+def lod_face_budget(face_count: int, lod: int) -> int:
+    return max(MIN_LOD_FACES, int(face_count * LOD_FACE_RATIOS[lod]))
+
+
+def _cluster(vertices: np.ndarray, resolution: int) -> np.ndarray:
+    """Номер ячейки сетки resolution³ для каждой вершины"""
+    lo = vertices.min(axis=0)
+    extent = float((vertices.max(axis=0) - lo).max()) or 1.0
+    cells = np.floor((vertices - lo) / (extent / resolution)).astype(np.int64)
+    np.clip(cells, 0, resolution - 1, out=cells)
+    cell_ids = cells[:, 0] + resolution * (cells[:, 1] + resolution * cells[:, 2])
+    _, labels = np.unique(cell_ids, return_inverse=True)
+    return labels.reshape(-1)
+
+
+def _collapse(faces: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """Переиндексирует грани на кластеры, выбрасывая вырожденные и повторяющиеся"""
+    collapsed = labels[faces]
+    a, b, c = collapsed[:, 0], collapsed[:, 1], collapsed[:, 2]
+    collapsed = collapsed[(a != b) & (b != c) & (a != c)]
+    if len(collapsed) == 0:
+        return collapsed
+    # Один треугольник с разным порядком вершин оставляем один раз, сохраняя ориентацию первого
+    _, first = np.unique(np.sort(collapsed, axis=1), axis=0, return_index=True)
+    return collapsed[np.sort(first)]
+
+
+def _face_quadrics(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """Квадрики плоскостей граней (F, 4, 4), взвешенные площадью"""
+    v0, v1, v2 = (vertices[faces[:, k]] for k in range(3))
+    normals = np.cross(v1 - v0, v2 - v0)
+    double_area = np.linalg.norm(normals, axis=1)
+    valid = double_area > 1e-12
+    normals[valid] /= double_area[valid, None]
+    normals[~valid] = 0.0
+    planes = np.concatenate([normals, -np.einsum("ij,ij->i", normals, v0)[:, None]], axis=1)
+    return planes[:, :, None] * planes[:, None, :] * (0.5 * double_area)[:, None, None]
+
+
+def _representatives(vertices: np.ndarray, faces: np.ndarray, labels: np.ndarray, count: int) -> np.ndarray:
+    """Для каждого кластера — точка с минимальной суммарной квадрикой, иначе центр масс"""
+    face_q = _face_quadrics(vertices, faces)
+    cluster_q = np.zeros((count, 4, 4))
+    for k in range(3):
+        np.add.at(cluster_q, labels[faces[:, k]], face_q)
+
+    sizes = np.bincount(labels, minlength=count)[:, None]
+    means = np.zeros((count, 3))
+    np.add.at(means, labels, vertices)
+    means /= np.maximum(sizes, 1)
+    lo = np.full((count, 3), np.inf)
+    hi = np.full((count, 3), -np.inf)
+    np.minimum.at(lo, labels, vertices)
+    np.maximum.at(hi, labels, vertices)
+
+    a = cluster_q[:, :3, :3]
+    b = -cluster_q[:, :3, 3]
+    # Плоские и почти плоские кластеры дают вырожденную систему — для них оставляем центр масс
+    scale = np.abs(a).max(axis=(1, 2))
+    solvable = np.abs(np.linalg.det(a)) > 1e-9 * np.maximum(scale, 1e-30) ** 3
+    points = means.copy()
+    if solvable.any():
+        optimal = np.linalg.solve(a[solvable], b[solvable][:, :, None])[:, :, 0]
+        # Оптимум за пределами своей ячейки порождает «шипы» — такие точки отбрасываем
+        inside = np.all((optimal >= lo[solvable] - 1e-9) & (optimal <= hi[solvable] + 1e-9), axis=1)
+        index = np.flatnonzero(solvable)[inside]
+        points[index] = optimal[inside]
+    return points
+
+
+def decimate(vertices: np.ndarray, faces: np.ndarray, target_faces: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Упрощает сетку до не более target_faces граней (если это возможно кластеризацией)"""
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    if len(faces) <= target_faces:
+        return vertices, faces
+
+    # Число граней монотонно растёт с разрешением сетки — ищем самое детальное, влезающее в бюджет
+    low, high = 1, _MAX_GRID
+    best = None
+    while low <= high:
+        resolution = (low + high) // 2
+        labels = _cluster(vertices, resolution)
+        collapsed = _collapse(faces, labels)
+        if len(collapsed) <= target_faces:
+            best = (labels, collapsed)
+            low = resolution + 1
+        else:
+            high = resolution - 1
+    if best is None:
+        best = (_cluster(vertices, 1), np.empty((0, 3), dtype=np.int64))
+    labels, collapsed = best
+
+    count = int(labels.max()) + 1
+    points = _representatives(vertices, faces, labels, count)
+    # Кластеры без граней не попадают в результат
+    used = np.unique(collapsed)
+    remap = np.full(count, -1, dtype=np.int64)
+    remap[used] = np.arange(len(used))
+    return points[used], remap[collapsed]
+
+
+def vertex_normals(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    v0, v1, v2 = (vertices[faces[:, k]] for k in range(3))
+    face_normals = np.cross(v1 - v0, v2 - v0)
+    normals = np.zeros_like(vertices)
+    for k in range(3):
+        np.add.at(normals, faces[:, k], face_normals)
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    return np.divide(normals, length, out=np.zeros_like(normals), where=length > 0)
+
+
+def _pad(data: bytes, fill: bytes) -> bytes:
+    return data + fill * (-len(data) % 4)
+
+
+def write_glb(vertices: np.ndarray, faces: np.ndarray, path: str) -> None:
+    """Записывает сетку в GLB с квантованными атрибутами (KHR_mesh_quantization)"""
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    normals = vertex_normals(vertices, faces)
+
+    lo = vertices.min(axis=0)
+    # Единый масштаб по осям, чтобы нормали не искажались преобразованием узла
+    step = float((vertices.max(axis=0) - lo).max()) / 65535 or 1.0
+    quantized = np.rint((vertices - lo) / step).astype(np.uint16)
+
+    # Элементы вершинных атрибутов выравниваются по 4 байта: xyz + один байт/слово заполнения
+    positions = np.zeros((len(vertices), 4), dtype=np.uint16)
+    positions[:, :3] = quantized
+    packed_normals = np.zeros((len(vertices), 4), dtype=np.int8)
+    packed_normals[:, :3] = np.rint(normals * 127)
+    small = len(vertices) < 65536
+    indices = faces.astype(np.uint16 if small else np.uint32)
+
+    views = [positions.tobytes(), packed_normals.tobytes(), indices.tobytes()]
+    offsets = np.cumsum([0] + [len(_pad(view, b"\0")) for view in views])
+    binary = b"".join(_pad(view, b"\0") for view in views)
+
+    gltf = {
+        "asset": {"version": "2.0", "generator": "pix2fullcode-gen3d"},
+        "extensionsUsed": ["KHR_mesh_quantization"],
+        "extensionsRequired": ["KHR_mesh_quantization"],
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0, "translation": lo.tolist(), "scale": [step] * 3}],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0, "NORMAL": 1}, "indices": 2, "mode": 4}]}],
+        "buffers": [{"byteLength": len(binary)}],
+        "bufferViews": [
+            {"buffer": 0, "byteOffset": int(offsets[0]), "byteLength": len(views[0]), "byteStride": 8, "target": _ARRAY_BUFFER},
+            {"buffer": 0, "byteOffset": int(offsets[1]), "byteLength": len(views[1]), "byteStride": 4, "target": _ARRAY_BUFFER},
+            {"buffer": 0, "byteOffset": int(offsets[2]), "byteLength": len(views[2]), "target": _ELEMENT_ARRAY_BUFFER},
+        ],
+        "accessors": [
+            {
+                "bufferView": 0, "componentType": _UNSIGNED_SHORT, "count": len(vertices), "type": "VEC3",
+                "min": quantized.min(axis=0).tolist(), "max": quantized.max(axis=0).tolist(),
+            },
+            {"bufferView": 1, "componentType": _BYTE, "normalized": True, "count": len(vertices), "type": "VEC3"},
+            {
+                "bufferView": 2, "componentType": _UNSIGNED_SHORT if small else _UNSIGNED_INT,
+                "count": int(indices.size), "type": "SCALAR",
+            },
+        ],
+    }
+    document = _pad(json.dumps(gltf, separators=(",", ":")).encode(), b" ")
+    length = 12 + 8 + len(document) + 8 + len(binary)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<III", _GLB_MAGIC, 2, length))
+        f.write(struct.pack("<II", len(document), _CHUNK_JSON))
+        f.write(document)
+        f.write(struct.pack("<II", len(binary), _CHUNK_BIN))
+        f.write(binary)
@@ -0,0 +1,38 @@
+"""
+3D-пайплайн (Shap-E → DreamGaussian → GS-GS). Выполняется в отдельном процессе
+пула воркеров, поэтому функции здесь синхронные и принимают только простые
+(сериализуемые pickle) аргументы.
+
+Генерация идёт один раз с полной детализацией (generate_mesh); уровни LOD
+строятся из неё отдельными дешёвыми задачами (build_lod), чтобы быстрый
+предпросмотр был готов раньше полной модели.
+"""
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from mesh_lod import decimate, lod_face_budget, write_glb
+
+
+# Заглушка для симуляции pipeline
+def generate_mesh(prompt: str, output_dir: str) -> Optional[str]:
+    """Генерирует детальную модель и возвращает путь к .npz (vertices, faces) в output_dir или None"""
+    # Симуляция длительной обработки
+    time.sleep(2)
+
+    # Эта заглушка всегда возвращает None для имитации отсутствия mesh
+    # В реальной реализации тут будет DreamGaussian или подобная библиотека
+    return None
+
+
+def build_lod(mesh_path: str, lod: int, output_dir: str) -> str:
+    """Упрощает детальную модель до бюджета граней LOD и записывает квантованный GLB"""
+    with np.load(mesh_path) as mesh:
+        vertices, faces = mesh["vertices"], mesh["faces"]
+    vertices, faces = decimate(vertices, faces, lod_face_budget(len(faces), lod))
+    path = Path(output_dir) / f"{uuid.uuid4().hex}-lod{lod}.glb"
+    write_glb(vertices, faces, str(path))
+    return str(path)
@@ -1,15 +1,66 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Response
+from fastapi.responses import FileResponse
 from pydantic import BaseModel, Field
+from typing import Dict, Literal
 import uuid, pathlib, tempfile
 import asyncio
+import os
+import re
+
+from job_queue import COMPLETED, FAILED, GenerationQueue, QueueFull, Ticket
+from mesh_cache import MeshCache, mesh_cache_key
+from mesh_lod import LOD_FACE_RATIOS
+from pipeline import build_lod, generate_mesh
+
+# Версия пайплайна входит в ключ кэша моделей: меняйте при смене моделей или параметров генерации
+PIPELINE_VERSION = "2"
+MESH_CACHE_DIR = os.getenv("MESH_CACHE_DIR", "/tmp/pix2fullcode/mesh-cache")
+MESH_CACHE_MAX_BYTES = int(os.getenv("MESH_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+GEN3D_WORKERS = int(os.getenv("GEN3D_WORKERS", "2"))  # процессов пайплайна
+GEN3D_MAX_QUEUE = int(os.getenv("GEN3D_MAX_QUEUE", "50"))  # ожидающих генераций, сверх — 503
+GEN3D_OUTPUT_DIR = os.getenv("GEN3D_OUTPUT_DIR", "/tmp/pix2fullcode/gen3d-work")
+TICKET_TTL = int(os.getenv("GEN3D_TICKET_TTL", "3600"))  # секунды хранения завершённых тикетов
+MAX_POLL_WAIT = 60  # секунды long polling на один запрос
 
 app = FastAPI()
 
+# Кэш GLB по (нормализованный промпт, LOD, версия пайплайна) с объединением одновременных генераций
+mesh_cache = MeshCache(MESH_CACHE_DIR, max_bytes=MESH_CACHE_MAX_BYTES)
+
+
+def lod_cache_key(prompt: str, lod: int) -> str:
+    return mesh_cache_key(prompt, lod, PIPELINE_VERSION)
+
+
+# Очередь с приоритетами перед пулом процессов: пайплайн не блокирует event loop
+generation_queue = GenerationQueue(
+    mesh_cache,
+    generate_mesh,
+    build_lod,
+    lod_cache_key,
+    output_dir=GEN3D_OUTPUT_DIR,
+    lods=len(LOD_FACE_RATIOS),
+    workers=GEN3D_WORKERS,
+    max_queue=GEN3D_MAX_QUEUE,
+    ticket_ttl=TICKET_TTL,
+)
+
+
+@app.on_event("startup")
+async def startup_event():
+    await generation_queue.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await generation_queue.close()
+
 
 class Gen3DRequest(BaseModel):
     prompt: str = Field(..., min_length=4, description="Object prompt (e.g. 'coffee cup')")
-    lod: int = Field(ge=0, le=2, default=1)
+    lod: int = Field(ge=0, le=len(LOD_FACE_RATIOS) - 1, default=1)
     job_id: str
+    tier: Literal["free", "pro"] = "free"
 
 
 class Gen3DResponse(BaseModel):
@@ -18,21 +69,42 @@ class Gen3DResponse(BaseModel):
     error: str | None = None     # human-readable reason
 
 
-# Заглушка для симуляции pipeline
-async def run_pipeline(req: Gen3DRequest):
-    # Симуляция длительной обработки
-    await asyncio.sleep(2)
-    
-    # Эта заглушка всегда возвращает None для имитации отсутствия mesh
-    # В реальной реализации тут будет DreamGaussian или подобная библиотека
-    return None
+class Gen3DTicket(Gen3DResponse):
+    ticket_id: str
+    status: str                  # queued | running | completed | failed
+    position: int | None = None  # заданий впереди в очереди
+    glb_url: str | None = None
+    lods: Dict[int, str] = {}    # готовые уровни детализации: LOD -> URL, пополняется по ходу генерации
+
+
+def mesh_url(digest: str) -> str:
+    return f"/meshes/{digest}.glb"
 
 
-@app.post("/generate3d", response_model=Gen3DResponse)
-async def generate3d(req: Gen3DRequest):
+def ticket_response(ticket: Ticket) -> Gen3DTicket:
+    job = ticket.job
+    response = Gen3DTicket(
+        ticket_id=ticket.ticket_id,
+        status=ticket.status,
+        position=generation_queue.position(ticket),
+        lods={lod: mesh_url(digest) for lod, digest in sorted(job.lods.items())},
+    )
+    if ticket.status == COMPLETED:
+        response.glb_url = mesh_url(ticket.digest)
+    elif ticket.status == FAILED:
+        # Никогда не возвращаем изображение вместо mesh, только честную ошибку
+        response.fallback = True
+        response.error = job.error
+    return response
+
+
+@app.post("/generate3d", response_model=Gen3DTicket, status_code=202)
+async def generate3d(req: Gen3DRequest, response: Response):
     """
-    Main 3-D pipeline entrypoint.
-    Raises HTTP 422 on vague prompt instead of producing placeholder geometry.
+    Main 3-D pipeline entrypoint: ставит генерацию в очередь и возвращает тикет,
+    результат — GET /generate3d/{ticket_id}.
+    Raises HTTP 422 on vague prompt instead of producing placeholder geometry,
+    HTTP 503 + Retry-After when the queue is saturated.
     """
     # 1. Basic prompt sanity (no generic 'object', '3d', etc.)
     banned = {"object", "thing", "stuff", "3d"}
@@ -42,23 +114,53 @@ async def generate3d(req: Gen3DRequest):
             detail="3D_GENERATION_FAILED: Prompt too vague for reliable mesh"
         )
 
+    # 2. Shap-E → DreamGaussian → GS-GS в пуле процессов; одинаковые промпты генерируются один раз,
+    #    все LOD строятся из одной детальной модели
     try:
-        # 2. Shap-E → DreamGaussian → GS-GS
-        mesh_path = await run_pipeline(req)
-    except Exception as e:
-        # Hard failure ⇒ report, but **no** placeholder cube or image
-        return Gen3DResponse(
-            glb_url=None,
-            fallback=True,
-            error=f"PIPELINE_ERROR: {e}"
-        )
+        ticket = await generation_queue.submit(req.prompt, req.lod, req.tier, req.job_id)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    response.headers["Location"] = f"/generate3d/{ticket.ticket_id}"
+    if ticket.status == COMPLETED:
+        # Модель уже в кэше
+        response.status_code = 200
+    return ticket_response(ticket)
+
+
+@app.get("/generate3d/{ticket_id}", response_model=Gen3DTicket)
+async def generate3d_result(ticket_id: str, wait: float = Query(0, ge=0, le=MAX_POLL_WAIT)):
+    """Состояние тикета; wait > 0 — дождаться следующего готового LOD или завершения не дольше wait секунд"""
+    ticket = generation_queue.get(ticket_id)
+    if ticket is None:
+        raise HTTPException(status_code=404, detail=f"Ticket {ticket_id} not found")
+    await generation_queue.wait(ticket, wait)
+    return ticket_response(ticket)
+
+
+@app.get("/meshes/{digest}.glb")
+async def get_mesh(digest: str):
+    """Отдаёт GLB из кэша; имя — sha256 содержимого, поэтому ответ можно кэшировать навсегда"""
+    if not re.fullmatch(r"[0-9a-f]{64}", digest):
+        raise HTTPException(status_code=404, detail="Mesh not found")
+    path = mesh_cache.blob_path(digest)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Mesh not found")
+    return FileResponse(
+        path,
+        media_type="model/gltf-binary",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+
+@app.delete("/job/{job_id}")
+async def delete_job(job_id: str):
+    """Удаляет тикеты, генерации и модели задания из кэша (GDPR)"""
+    prompts = await generation_queue.forget_job(job_id)
+    return {"status": "deleted", "job_id": job_id, "prompts": prompts}
 
-    if mesh_path is None:        # pipeline returned nothing
-        # Никогда не возвращаем изображение вместо mesh, только честную ошибку
-        return Gen3DResponse(
-            glb_url=None,
-            fallback=True,
-            error="NO_MESH: 3D generation failed, no mesh was produced."
-        )
 
-    return Gen3DResponse(glb_url=str(mesh_path), fallback=False)
+@app.get("/metrics")
+async def metrics():
+    """Счётчики кэша моделей и очереди генераций"""
+    return {"mesh_cache": mesh_cache.stats(), "queue": generation_queue.stats()}
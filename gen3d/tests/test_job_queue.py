@@ -0,0 +1,128 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+
+from job_queue import COMPLETED, DELETED_ERROR, FAILED, QUEUED, GenerationQueue, QueueFull
+from mesh_cache import MeshCache, mesh_cache_key
+
+
+def fake_generate(prompt, output_dir):
+    if prompt == "broken":
+        return None
+    path = os.path.join(output_dir, f"{uuid.uuid4().hex}.mesh")
+    with open(path, "w") as f:
+        f.write(prompt)
+    return path
+
+
+def fake_build(mesh_path, lod, output_dir):
+    with open(mesh_path) as f:
+        prompt = f.read()
+    path = os.path.join(output_dir, f"{uuid.uuid4().hex}.glb")
+    with open(path, "w") as f:
+        f.write(f"{prompt}:{lod}")
+    return path
+
+
+def make_queue(tmp_path, **kwargs):
+    cache = MeshCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    queue = GenerationQueue(
+        cache, fake_generate, fake_build, lambda prompt, lod: mesh_cache_key(prompt, lod, "test"),
+        str(tmp_path / "work"), **kwargs,
+    )
+    return queue, cache
+
+
+async def finish(ticket):
+    # Тикет завершается с готовностью своего LOD; ждём завершения всего задания
+    for _ in range(200):
+        if ticket.job.finished_at is not None:
+            return
+        await asyncio.wait_for(ticket.job.changed.wait(), timeout=5)
+    raise AssertionError("generation did not finish")
+
+
+def test_generation_builds_every_lod_once(tmp_path):
+    queue, cache = make_queue(tmp_path, workers=1)
+
+    async def main():
+        await queue.start()
+        try:
+            preview = await queue.submit("Coffee cup", lod=0)
+            full = await queue.submit("coffee  cup!", lod=2, tier="pro")
+            assert preview.job is full.job
+            await finish(preview)
+            cached = await queue.submit("coffee cup", lod=1)
+            broken = await queue.submit("broken", lod=0)
+            await finish(broken)
+            return preview, full, cached, broken
+        finally:
+            await queue.close()
+
+    preview, full, cached, broken = asyncio.run(main())
+    assert preview.status == full.status == COMPLETED
+    assert sorted(full.job.lods) == [0, 1, 2]
+    assert cache.blob_path(full.digest).read_text() == "Coffee cup:2"
+    # Повторный запрос — из кэша, без очереди
+    assert cached.status == COMPLETED and cached.job is not full.job
+    assert broken.status == FAILED and broken.job.error.startswith("NO_MESH")
+    assert queue.stats()["completed"] == 1 and queue.stats()["failed"] == 1
+    assert list((tmp_path / "work").iterdir()) == []
+
+
+def test_admission_control_and_priority(tmp_path):
+    queue, _ = make_queue(tmp_path, max_queue=2)
+
+    async def main():
+        # Диспетчеры не запущены: задания остаются в очереди
+        free = await queue.submit("chair", lod=2)
+        pro = await queue.submit("table", lod=2, tier="pro")
+        with pytest.raises(QueueFull) as rejected:
+            await queue.submit("lamp", lod=0)
+        # Присоединение к стоящему заданию не занимает места в очереди
+        joined = await queue.submit("chair", lod=0, tier="pro")
+        return free, pro, joined, rejected.value
+
+    free, pro, joined, rejected = asyncio.run(main())
+    assert rejected.retry_after >= 1 and queue.stats()["rejected"] == 1
+    assert joined.job is free.job
+    # chair поднялся в приоритете выше table после запроса LOD 0 платным клиентом
+    assert (queue.position(free), queue.position(pro)) == (0, 1)
+
+
+def test_forget_job_cancels_queued_generation(tmp_path):
+    queue, _ = make_queue(tmp_path)
+
+    async def main():
+        mine = await queue.submit("vase", lod=1, job_id="job-1")
+        shared = await queue.submit("desk", lod=1, job_id="job-1")
+        other = await queue.submit("desk", lod=1, job_id="job-2")
+        assert await queue.forget_job("job-1") == 2
+        return mine, shared, other
+
+    mine, shared, other = asyncio.run(main())
+    assert mine.status == FAILED and mine.job.error == DELETED_ERROR
+    assert queue.get(mine.ticket_id) is None and queue.get(shared.ticket_id) is None
+    # Промпт, который запросило и другое задание, продолжает генерироваться
+    assert other.status == QUEUED
+
+
+def test_stale_queue_entries_do_not_count_against_capacity(tmp_path):
+    queue, _ = make_queue(tmp_path, max_queue=2)
+
+    async def main():
+        await queue.submit("chair", lod=2, job_id="job-1")
+        # Повышение приоритета оставляет в куче вторую запись того же задания
+        await queue.submit("chair", lod=0, tier="pro")
+        await queue.submit("table", lod=2)
+        with pytest.raises(QueueFull):
+            await queue.submit("lamp", lod=2)
+        # Отменённое задание освобождает место, хотя его записи ещё в куче
+        await queue.forget_job("job-1")
+        return await queue.submit("lamp", lod=2)
+
+    lamp = asyncio.run(main())
+    assert lamp.status == QUEUED
+    assert queue.stats()["queued"] == 2
@@ -0,0 +1,71 @@
+import asyncio
+
+from mesh_cache import MeshCache, mesh_cache_key, normalize_prompt
+
+
+def test_prompt_normalization_shares_key():
+    assert normalize_prompt("  Coffee   Cup! ") == "coffee cup"
+    assert mesh_cache_key("Coffee cup", 1, "v1") == mesh_cache_key("coffee   CUP?", 1, "v1")
+    assert mesh_cache_key("coffee cup", 1, "v1") != mesh_cache_key("coffee cup", 2, "v1")
+    assert mesh_cache_key("coffee cup", 1, "v1") != mesh_cache_key("coffee cup", 1, "v2")
+
+
+def test_concurrent_requests_share_one_generation(tmp_path):
+    cache = MeshCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        path = tmp_path / f"mesh-{len(calls)}.glb"
+        path.write_bytes(b"glb")
+        return path
+
+    async def main():
+        first = await asyncio.gather(*(cache.get_or_create("key", produce) for _ in range(5)))
+        again = await cache.get_or_create("key", produce)
+        return first, again
+
+    first, again = asyncio.run(main())
+    assert len(calls) == 1
+    digests = {digest for digest, _ in first}
+    assert len(digests) == 1 and again == (digests.pop(), True)
+    assert [cached for _, cached in first].count(False) == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["coalesced"]) == (1, 1, 4)
+    # Файл пайплайна перешёл во владение кэша
+    assert not (tmp_path / "mesh-1.glb").exists()
+
+
+def test_failures_are_not_cached(tmp_path):
+    cache = MeshCache(str(tmp_path), max_bytes=1 << 20)
+
+    async def fail():
+        return None
+
+    assert asyncio.run(cache.get_or_create("key", fail)) == (None, False)
+    assert asyncio.run(cache.get("key")) is None
+
+
+def test_identical_models_share_blob_and_lru_eviction(tmp_path):
+    cache = MeshCache(str(tmp_path / "cache"), max_bytes=250)
+
+    def put(key, data):
+        source = tmp_path / f"{key}.glb"
+        source.write_bytes(data)
+        return cache._put(key, source)
+
+    shared = put("a", b"x" * 100)
+    assert put("b", b"x" * 100) == shared
+    assert cache.stats()["blobs"] == 1 and cache.total_bytes == 100
+    put("c", b"y" * 100)
+    assert asyncio.run(cache.get("a")) == shared
+    put("d", b"z" * 100)
+    # Вытеснение b не освобождает байты (blob общий с a), поэтому следом вытесняется c
+    assert [asyncio.run(cache.get(key)) is not None for key in "abcd"] == [True, False, False, True]
+    assert cache.total_bytes == 200 and cache.stats()["evictions"] == 2
+
+    reopened = MeshCache(str(tmp_path / "cache"), max_bytes=250)
+    assert (reopened.stats()["entries"], reopened.total_bytes) == (2, 200)
+    asyncio.run(reopened.delete(["a"]))
+    assert not reopened.blob_path(shared).exists() and reopened.total_bytes == 100
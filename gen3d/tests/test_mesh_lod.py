@@ -0,0 +1,65 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+from mesh_lod import MIN_LOD_FACES, decimate, lod_face_budget, write_glb
+from pipeline import build_lod
+
+
+def sphere(rings: int = 40, segments: int = 80):
+    theta = np.linspace(0, np.pi, rings + 1)
+    phi = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+    t, p = np.meshgrid(theta, phi, indexing="ij")
+    vertices = np.stack([np.sin(t) * np.cos(p), np.sin(t) * np.sin(p), np.cos(t)], axis=-1).reshape(-1, 3)
+    faces = []
+    for i in range(rings):
+        for j in range(segments):
+            a, b = i * segments + j, i * segments + (j + 1) % segments
+            c, d = a + segments, b + segments
+            faces += [(a, c, b), (b, c, d)]
+    return vertices, np.array(faces)
+
+
+def read_glb(path):
+    with open(path, "rb") as f:
+        magic, version, length = struct.unpack("<III", f.read(12))
+        json_length, _ = struct.unpack("<II", f.read(8))
+        gltf = json.loads(f.read(json_length))
+        rest = f.read()
+    return magic, version, length, gltf, rest
+
+
+def test_decimate_meets_face_budget():
+    vertices, faces = sphere()
+    for lod in range(3):
+        budget = lod_face_budget(len(faces), lod)
+        lod_vertices, lod_faces = decimate(vertices, faces, budget)
+        assert 0 < len(lod_faces) <= budget
+        assert lod_faces.max() < len(lod_vertices)
+        # Упрощённая сетка остаётся на поверхности исходной
+        radius = np.linalg.norm(lod_vertices, axis=1)
+        assert np.all(np.abs(radius - 1) < 0.2)
+    assert lod_face_budget(100, 0) == MIN_LOD_FACES
+
+
+def test_write_glb_quantizes_attributes(tmp_path):
+    vertices, faces = sphere(8, 16)
+    path = tmp_path / "mesh.glb"
+    write_glb(vertices, faces, str(path))
+    magic, version, length, gltf, _ = read_glb(path)
+    assert (magic, version, length) == (0x46546C67, 2, path.stat().st_size)
+    assert gltf["extensionsRequired"] == ["KHR_mesh_quantization"]
+    position, normal, indices = gltf["accessors"]
+    assert position["componentType"] == 5123 and position["count"] == len(vertices)
+    assert normal["componentType"] == 5120 and normal["normalized"]
+    assert indices["componentType"] == 5123 and indices["count"] == faces.size
+
+
+def test_build_lod_writes_smaller_levels(tmp_path):
+    vertices, faces = sphere()
+    mesh_path = tmp_path / "mesh.npz"
+    np.savez(mesh_path, vertices=vertices, faces=faces)
+    sizes = [os.path.getsize(build_lod(str(mesh_path), lod, str(tmp_path))) for lod in range(3)]
+    assert sizes[0] < sizes[1] < sizes[2]
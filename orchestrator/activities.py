@@ -0,0 +1,249 @@
+"""
+Activities пайплайна: HTTP-вызовы сервисов vision, codegen, gen3d, qa и сборка результата.
+
+Каждая activity идемпотентна: перед вызовом сервиса она ищет чекпоинт
+(job_id, этап, хеш входа) в хранилище артефактов и при повторной попытке или
+перезапуске workflow возвращает сохранённый результат вместо пересчёта.
+Сохраняются только успешные результаты; ошибки 4xx сервисов помечаются как
+неповторяемые, чтобы RetryPolicy не тратил на них попытки.
+
+UI-дерево vision, закодированное компактнее DSL_INLINE_MAX_BYTES, идёт через
+историю Temporal как обычный UI JSON; большее сохраняется в хранилище
+артефактов в бинарной кодировке, а дальше по workflow передаётся ссылка
+{"dsl_ref": digest, ...} с полями верхнего уровня ("3d" и т.п.) без дерева.
+codegen.generate подставляет вместо ссылки сам документ.
+"""
+import asyncio
+import base64
+import functools
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from temporalio import activity
+from temporalio.exceptions import ApplicationError
+
+from artifacts import ArtifactStore
+from pix2fc.bundle import BUNDLE_NAME, write_job_bundle
+from pix2fc.dsl import MEDIA_TYPE as DSL_MEDIA_TYPE, DslError, UiDocument
+from pix2fc.stages import input_hash
+
+logger = logging.getLogger(__name__)
+
+STORAGE_DIR = os.getenv("STORAGE_DIR", "/tmp/pix2fullcode")
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", os.path.join(STORAGE_DIR, "artifacts"))
+VISION_URL = os.getenv("VISION_URL", "http://vision:8001")
+CODEGEN_URL = os.getenv("CODEGEN_URL", "http://codegen:8002")
+GEN3D_URL = os.getenv("GEN3D_URL", "http://gen3d:8003")
+QA_URL = os.getenv("QA_URL", "http://qa:8004")
+SERVICE_TIMEOUT = float(os.getenv("SERVICE_TIMEOUT", "600"))  # секунды на запрос к сервису
+GEN3D_POLL_WAIT = 30  # секунды long polling тикета gen3d
+BUNDLE_READ_CHUNK = 1024 * 1024  # байт за одно чтение mesh'а или тепловой карты в архив
+GEN3D_SUBMIT_ATTEMPTS = 5  # попыток поставить генерацию в переполненную очередь
+ARTIFACT_GC_MIN_AGE = int(os.getenv("ARTIFACT_GC_MIN_AGE", "3600"))  # секунды, моложе которых blob'ы без ссылок не удаляются
+DSL_INLINE_MAX_BYTES = int(os.getenv("DSL_INLINE_MAX_BYTES", str(64 * 1024)))  # байт кодированного UI-дерева в истории workflow, больше — по ссылке
+
+artifact_store = ArtifactStore(ARTIFACT_DIR)
+
+# Один пул соединений на процесс воркера
+_http_client: httpx.AsyncClient = None
+
+def http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(SERVICE_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        )
+    return _http_client
+
+async def request(method: str, url: str, payload: Any = None, params: Optional[Dict[str, Any]] = None,
+                  headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+    try:
+        response = await http_client().request(method, url, json=payload, params=params, headers=headers)
+    except httpx.HTTPError as e:
+        # Сетевая ошибка — повторяемая
+        raise ApplicationError(f"SERVICE_UNAVAILABLE: {url}: {str(e)}", type="ServiceUnavailable") from e
+    if 400 <= response.status_code < 500 and response.status_code != 429:
+        raise ApplicationError(
+            f"{response.status_code}: {response.text[:500]}",
+            type="InvalidInput",
+            non_retryable=True,
+        )
+    if response.status_code >= 400:
+        raise ApplicationError(
+            f"{response.status_code}: {response.text[:500]}",
+            {"retry_after": response.headers.get("Retry-After")},
+            type="ServiceError",
+        )
+    return response
+
+async def request_json(method: str, url: str, payload: Any = None, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return (await request(method, url, payload, params)).json()
+
+async def post_json(url: str, payload: Any) -> Dict[str, Any]:
+    return await request_json("POST", url, payload)
+
+def checkpointed(stage: str, succeeded: Callable[[Any], bool] = lambda result: True):
+    """
+    Оборачивает activity чекпоинтом: результат с тем же (job_id, stage, хеш входа)
+    берётся из хранилища артефактов, новый успешный результат сохраняется.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(params):
+            job_id = params if isinstance(params, str) else params["job_id"]
+            key = input_hash(params)
+            cached = await asyncio.to_thread(artifact_store.load, job_id, stage, key)
+            if cached is not None:
+                logger.info(f"Reusing {stage} checkpoint for job {job_id}")
+                return cached
+            result = await fn(params)
+            if succeeded(result):
+                await asyncio.to_thread(artifact_store.save, job_id, stage, key, result)
+            return result
+        return wrapper
+    return decorator
+
+def share_document(document: UiDocument) -> Dict[str, Any]:
+    """UI JSON для истории workflow или, если дерево большое, ссылка на его кодировку в хранилище"""
+    data = document.encode()
+    if len(data) <= DSL_INLINE_MAX_BYTES:
+        return document.to_json()
+    digest = artifact_store.put_bytes(data)
+    return dict(document.meta, dsl_version=document.version, dsl_ref=digest, dsl_bytes=len(data))
+
+@activity.defn(name="vision.segment")
+@checkpointed("vision")
+async def vision_segment(job_id: str) -> Dict[str, Any]:
+    response = await request("POST", f"{VISION_URL}/segment", {"job_id": job_id}, headers={"Accept": DSL_MEDIA_TYPE})
+    try:
+        if response.headers.get("content-type", "").startswith(DSL_MEDIA_TYPE):
+            document = UiDocument.decode(response.content)
+        else:
+            document = UiDocument.from_json(response.json())
+    except DslError as e:
+        raise ApplicationError(f"Invalid UI DSL from vision: {str(e)}", type="InvalidInput", non_retryable=True) from e
+    return await asyncio.to_thread(share_document, document)
+
+@activity.defn(name="vision.segment_batch")
+@checkpointed("vision")
+async def vision_segment_batch(params: Dict[str, Any]) -> Dict[str, Any]:
+    segmented = await post_json(f"{VISION_URL}/segment/batch", params)
+    # Общие компоненты маленькие и нужны workflow целиком; экраны — по ссылке, если велики
+    segmented["screens"] = await asyncio.to_thread(
+        lambda: [share_document(UiDocument.from_json(screen)) for screen in segmented["screens"]]
+    )
+    return segmented
+
+@activity.defn(name="codegen.generate")
+@checkpointed("codegen", succeeded=lambda result: result.get("complete", False))
+async def codegen_generate(params: Dict[str, Any]) -> Dict[str, Any]:
+    digest = params["ui_json"].get("dsl_ref")
+    if digest is None:
+        return await post_json(f"{CODEGEN_URL}/generate", params)
+    data = await asyncio.to_thread(artifact_store.get_bytes, digest)
+    if data is None:
+        raise ApplicationError(f"UI DSL blob {digest} is missing", type="MissingArtifact", non_retryable=True)
+    payload = {key: value for key, value in params.items() if key != "ui_json"}
+    return await post_json(f"{CODEGEN_URL}/generate", dict(payload, ui_dsl=base64.b64encode(data).decode()))
+
+@activity.defn(name="gen3d.generate")
+@checkpointed("gen3d", succeeded=lambda result: bool(result.get("glb_url")))
+async def gen3d_generate(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Ставит генерацию в очередь gen3d и ждёт тикет через long polling"""
+    for attempt in range(1, GEN3D_SUBMIT_ATTEMPTS + 1):
+        try:
+            ticket = await post_json(f"{GEN3D_URL}/generate3d", params)
+            break
+        except ApplicationError as e:
+            retry_after = e.details[0].get("retry_after") if e.details else None
+            # Очередь переполнена — ждём, сколько просит сервис, не тратя попытки RetryPolicy
+            if retry_after is None or attempt == GEN3D_SUBMIT_ATTEMPTS:
+                raise
+            activity.heartbeat()
+            await asyncio.sleep(min(int(retry_after), 60))
+    while ticket["status"] not in ("completed", "failed"):
+        activity.heartbeat()
+        ticket = await request_json(
+            "GET", f"{GEN3D_URL}/generate3d/{ticket['ticket_id']}", params={"wait": GEN3D_POLL_WAIT}
+        )
+    return {key: ticket.get(key) for key in ("glb_url", "lods", "fallback", "error")}
+
+@activity.defn(name="qa.check")
+@checkpointed("qa")
+async def qa_check(job_id: str) -> Dict[str, Any]:
+    return await post_json(f"{QA_URL}/qa", {"job_id": job_id})
+
+def load_code(unit_id: str) -> Dict[str, Any]:
+    code = artifact_store.latest(unit_id, "codegen")
+    if code is None:
+        raise ApplicationError(f"No codegen output for job {unit_id}", type="MissingArtifact", non_retryable=True)
+    return code
+
+def download(client: httpx.Client, url: str) -> Iterator[bytes]:
+    """Тело ответа сервиса потоком — прямо в запись архива"""
+    try:
+        with client.stream("GET", url) as response:
+            if response.status_code == 404:
+                raise ApplicationError(f"{url} not found", type="MissingArtifact", non_retryable=True)
+            if response.status_code >= 400:
+                raise ApplicationError(f"{response.status_code} for {url}", type="ServiceError")
+            yield from response.iter_bytes(BUNDLE_READ_CHUNK)
+    except httpx.HTTPError as e:
+        raise ApplicationError(f"SERVICE_UNAVAILABLE: {url}: {str(e)}", type="ServiceUnavailable") from e
+
+def write_bundle(params: Dict[str, Any], sections: List[Tuple[Optional[str], str]]) -> Dict[str, Any]:
+    """
+    Пишет job-<id>/bundle.zip: код частей (заголовок раздела, job_id генерации),
+    mesh'и gen3d и отчёт QA с тепловой картой; синхронно
+    """
+    job_id = params["job_id"]
+    service_urls = {"gen3d": GEN3D_URL, "qa": QA_URL}
+    with httpx.Client(timeout=httpx.Timeout(SERVICE_TIMEOUT, connect=10.0)) as client:
+        return write_job_bundle(
+            Path(STORAGE_DIR) / f"job-{job_id}" / BUNDLE_NAME,
+            job_id,
+            params.get("format", "next"),
+            # Код каждой части читается из хранилища, только когда до неё доходит запись
+            ((title, load_code(unit_id).get("chunks", [])) for title, unit_id in sections),
+            params.get("meshes", []),
+            params.get("qa"),
+            lambda service, path: download(client, f"{service_urls[service]}{path}"),
+        )
+
+@activity.defn(name="export.bundle")
+@checkpointed("export")
+async def export_bundle(params: Dict[str, Any]) -> Dict[str, Any]:
+    job_id = params["job_id"]
+    bundle = await asyncio.to_thread(write_bundle, params, [(None, job_id)])
+    return {"url": f"/download/{job_id}", **bundle}
+
+@activity.defn(name="export.bundle_batch")
+@checkpointed("export")
+async def export_bundle_batch(params: Dict[str, Any]) -> Dict[str, Any]:
+    job_id = params["job_id"]
+    sections = [(title, unit_id) for title, unit_id in params["sections"]]
+    bundle = await asyncio.to_thread(write_bundle, params, sections)
+    return {"url": f"/download/{job_id}", **bundle}
+
+@activity.defn(name="storage.forget_job")
+async def forget_job(job_id: str) -> Dict[str, Any]:
+    """
+    Удаляет чекпоинты и файлы задания (GDPR), затем blob'ы хранилища
+    артефактов, на которые больше никто не ссылается
+    """
+    await asyncio.to_thread(artifact_store.forget_job, job_id)
+    # Остановленный workflow мог успеть записать архив уже после удаления каталога в gateway
+    await asyncio.to_thread(shutil.rmtree, Path(STORAGE_DIR) / f"job-{job_id}", True)
+    removed = await asyncio.to_thread(artifact_store.collect_garbage, ARTIFACT_GC_MIN_AGE)
+    logger.info(f"Forgot job {job_id}: {removed} unreferenced blobs removed")
+    return {"job_id": job_id, "blobs_removed": removed}
+
+ACTIVITIES = [
+    vision_segment, vision_segment_batch, codegen_generate, gen3d_generate,
+    qa_check, export_bundle, export_bundle_batch, forget_job,
+]
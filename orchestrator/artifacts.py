@@ -0,0 +1,165 @@
+"""
+Контент-адресуемое хранилище результатов этапов пайплайна.
+
+Выход каждого этапа сохраняется один раз как blob с именем sha256 содержимого
+(objects/ab/<digest>.json), а чекпоинт — маленький файл-ссылка
+refs/<job_id>/<stage>-<input_hash>.json на этот blob. Повторный или
+возобновлённый запуск workflow с теми же входами находит чекпоинт и не
+пересчитывает уже завершённый этап. Одинаковые выходы разных заданий
+хранятся в одном экземпляре. Бинарные blob'ы (кодированное UI-дерево) лежат
+рядом как objects/ab/<digest>.bin.
+
+Удалённое задание теряет только ссылки; blob'ы, на которые не ссылается ни
+одно задание, убирает collect_garbage().
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterator, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class ArtifactStore:
+    """Blob'ы по sha256 + ссылки (job_id, stage, input_hash) → digest"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.refs_dir = self.root / "refs"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.refs_dir.mkdir(parents=True, exist_ok=True)
+
+    def _object_path(self, digest: str, suffix: str = ".json") -> Path:
+        return self.objects_dir / digest[:2] / f"{digest}{suffix}"
+
+    def _ref_path(self, job_id: str, stage: str, key: str) -> Path:
+        return self.refs_dir / job_id / f"{stage}-{key}.json"
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _store(self, path: Path, data: bytes) -> None:
+        try:
+            # Существующий blob снова в деле — свежий mtime защищает его от collect_garbage до записи ссылки
+            os.utime(path)
+        except FileNotFoundError:
+            self._write_atomic(path, data)
+
+    def put_blob(self, value: Any) -> str:
+        data = json.dumps(value, sort_keys=True, separators=(",", ":")).encode()
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        self._store(path, data)
+        return digest
+
+    def get_blob(self, digest: str) -> Optional[Any]:
+        try:
+            with open(self._object_path(digest), "rb") as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return None
+
+    def put_bytes(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest, ".bin")
+        self._store(path, data)
+        return digest
+
+    def get_bytes(self, digest: str) -> Optional[bytes]:
+        try:
+            with open(self._object_path(digest, ".bin"), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def save(self, job_id: str, stage: str, key: str, output: Any) -> str:
+        """Сохраняет выход этапа и ссылку-чекпоинт на него; возвращает digest"""
+        digest = self.put_blob(output)
+        ref = {"digest": digest, "stage": stage, "input_hash": key, "created_at": time.time()}
+        self._write_atomic(self._ref_path(job_id, stage, key), json.dumps(ref).encode())
+        return digest
+
+    def load(self, job_id: str, stage: str, key: str) -> Optional[Any]:
+        """Выход завершённого этапа или None, если чекпоинта нет"""
+        try:
+            with open(self._ref_path(job_id, stage, key), "rb") as f:
+                ref = json.loads(f.read())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        output = self.get_blob(ref["digest"])
+        if output is None:
+            logger.warning(f"Checkpoint {job_id}/{stage} points to missing blob {ref['digest']}")
+        return output
+
+    def latest(self, job_id: str, stage: str) -> Optional[Any]:
+        """Последний сохранённый выход этапа задания независимо от входа"""
+        refs = list((self.refs_dir / job_id).glob(f"{stage}-*.json"))
+        if not refs:
+            return None
+        newest = max(refs, key=lambda path: path.stat().st_mtime)
+        return self.load(job_id, stage, newest.stem[len(stage) + 1:])
+
+    def forget_job(self, job_id: str) -> None:
+        """
+        Удаляет чекпоинты задания и его экранов/компонентов ({job_id}-...);
+        осиротевшие blob'ы убирает collect_garbage()
+        """
+        shutil.rmtree(self.refs_dir / job_id, ignore_errors=True)
+        for path in self.refs_dir.glob(f"{job_id}-*"):
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _live_digests(self) -> Set[str]:
+        live = set()
+        for path in self.refs_dir.glob("*/*.json"):
+            try:
+                digest = json.loads(path.read_bytes())["digest"]
+            except (FileNotFoundError, json.JSONDecodeError, KeyError):
+                continue
+            live.add(digest)
+            # Большие UI-деревья лежат отдельным .bin, на который ссылается выход этапа
+            output = self.get_blob(digest)
+            if output is not None:
+                live.update(_dsl_refs(output))
+        return live
+
+    def collect_garbage(self, min_age: float) -> int:
+        """
+        Удаляет blob'ы, на которые не ссылается ни один чекпоинт; свежие (моложе
+        min_age секунд) не трогаются — их мог только что записать выполняющийся этап.
+        Возвращает число удалённых blob'ов; синхронно.
+        """
+        live = self._live_digests()
+        deadline = time.time() - min_age
+        removed = 0
+        for path in self.objects_dir.glob("*/*"):
+            digest = path.name.split(".", 1)[0]
+            try:
+                if digest in live or path.stat().st_mtime > deadline:
+                    continue
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            removed += 1
+        return removed
+
+
+def _dsl_refs(value: Any) -> Iterator[str]:
+    if isinstance(value, dict):
+        if isinstance(value.get("dsl_ref"), str):
+            yield value["dsl_ref"]
+        for item in value.values():
+            yield from _dsl_refs(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _dsl_refs(item)
@@ -0,0 +1,49 @@
+import asyncio
+import os
+import time
+
+import activities
+from artifacts import ArtifactStore
+
+
+def test_checkpoints_share_blobs_and_survive_only_with_refs(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    output = {"chunks": ["a", "b"], "dsl_ref": store.put_bytes(b"\x01tree")}
+    digest = store.save("job-1", "codegen", "k1", output)
+    assert store.save("job-2", "codegen", "k9", output) == digest
+    assert store.load("job-1", "codegen", "k1") == output
+    assert store.load("job-1", "codegen", "other") is None
+    assert store.latest("job-2", "codegen") == output
+    assert len(list((tmp_path / "objects").glob("*/*"))) == 2
+
+    store.forget_job("job-1")
+    assert store.load("job-1", "codegen", "k1") is None
+    # job-2 всё ещё ссылается и на выход, и на бинарное дерево из него
+    assert store.collect_garbage(min_age=0) == 0
+
+    store.forget_job("job-2")
+    # Свежие blob'ы без ссылок не удаляются: их мог только что записать этап
+    assert store.collect_garbage(min_age=3600) == 0
+    old = time.time() - 7200
+    for path in (tmp_path / "objects").glob("*/*"):
+        os.utime(path, (old, old))
+    assert store.collect_garbage(min_age=3600) == 2
+    assert store.get_bytes(output["dsl_ref"]) is None
+
+
+def test_checkpointed_activity_runs_once_per_input(tmp_path, monkeypatch):
+    monkeypatch.setattr(activities, "artifact_store", ArtifactStore(str(tmp_path)))
+    calls = []
+
+    @activities.checkpointed("stage", succeeded=lambda result: result["status"] == "ok")
+    async def stage(params):
+        calls.append(params["value"])
+        return {"status": "ok" if params["value"] else "error"}
+
+    async def main():
+        for value in (1, 1, 2, 0, 0):
+            await stage({"job_id": "job", "value": value})
+
+    asyncio.run(main())
+    # Ошибка не сохраняется и при повторе пересчитывается
+    assert calls == [1, 2, 0, 0]
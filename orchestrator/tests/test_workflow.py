@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+import temporalio.workflow
+from temporalio.exceptions import ActivityError, ApplicationError, RetryState
+
+import activities
+import workflow
+from artifacts import ArtifactStore
+
+
+@pytest.fixture
+def services(tmp_path, monkeypatch):
+    """Activities пайплайна с настоящими чекпоинтами и подменёнными вызовами сервисов"""
+    monkeypatch.setattr(activities, "artifact_store", ArtifactStore(str(tmp_path)))
+    calls = []
+    qa_errors = []
+
+    def fake(name, stage, body):
+        async def run(params):
+            calls.append(name)
+            return body(params)
+        return name, activities.checkpointed(stage)(run)
+
+    def qa(job_id):
+        if qa_errors:
+            raise qa_errors.pop(0)
+        return {"passed": True, "warnings": []}
+
+    handlers = dict([
+        fake("vision.segment", "vision", lambda job_id: {"tree": [{"type": "section"}], "3d": []}),
+        fake("codegen.generate", "codegen", lambda params: {"complete": True, "chunks": []}),
+        fake("qa.check", "qa", qa),
+        fake("export.bundle", "export", lambda params: {"url": f"/download/{params['job_id']}"}),
+    ])
+
+    async def execute_activity(name, arg, **kwargs):
+        try:
+            return await handlers[name](arg)
+        except ApplicationError as e:
+            # Так workflow видит ошибку activity, исчерпавшей свои повторы
+            raise ActivityError(
+                "Activity task failed", scheduled_event_id=1, started_event_id=2, identity="worker",
+                activity_type=name, activity_id="1", retry_state=RetryState.MAXIMUM_ATTEMPTS_REACHED,
+            ) from e
+
+    monkeypatch.setattr(temporalio.workflow, "execute_activity", execute_activity)
+    return calls, qa_errors
+
+
+def test_retryable_failure_fails_the_run_and_restart_resumes_from_checkpoints(services):
+    calls, qa_errors = services
+    qa_errors.append(ApplicationError("SERVICE_UNAVAILABLE: qa", type="ServiceUnavailable"))
+
+    with pytest.raises(ApplicationError) as failed:
+        asyncio.run(workflow.GenerateSiteWorkflow().run("job-1"))
+    assert not failed.value.non_retryable
+    assert calls == ["vision.segment", "codegen.generate", "qa.check"]
+
+    calls.clear()
+    result = asyncio.run(workflow.GenerateSiteWorkflow().run("job-1"))
+    assert result["status"] == "SUCCESS" and result["download"] == "/download/job-1"
+    # vision и codegen взяты из чекпоинтов первого run
+    assert calls == ["qa.check", "export.bundle"]
+
+
+def test_non_retryable_failure_returns_failed_result(services):
+    calls, qa_errors = services
+    qa_errors.append(ApplicationError("bad frame", type="InvalidInput", non_retryable=True))
+    run = workflow.GenerateSiteWorkflow()
+    result = asyncio.run(run.run("job-2"))
+    assert result["status"] == "FAILED" and result["reason"].startswith("WORKFLOW_ERROR")
+    assert "export.bundle" not in calls
@@ -0,0 +1,32 @@
+import asyncio
+import logging
+import os
+
+from temporalio.client import Client
+from temporalio.worker import Worker
+
+from activities import ACTIVITIES
+from workflow import ForgetJobWorkflow, GenerateBatchWorkflow, GenerateSiteWorkflow
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TEMPORAL_HOST = os.getenv("TEMPORAL_HOST", "localhost:7233")
+WORKFLOW_TASK_QUEUE = os.getenv("WORKFLOW_TASK_QUEUE", "pix2fullcode-tasks")
+MAX_CONCURRENT_ACTIVITIES = int(os.getenv("MAX_CONCURRENT_ACTIVITIES", "20"))
+
+async def main():
+    client = await Client.connect(TEMPORAL_HOST)
+    worker = Worker(
+        client,
+        task_queue=WORKFLOW_TASK_QUEUE,
+        workflows=[GenerateSiteWorkflow, GenerateBatchWorkflow, ForgetJobWorkflow],
+        activities=ACTIVITIES,
+        max_concurrent_activities=MAX_CONCURRENT_ACTIVITIES,
+    )
+    logger.info(f"Worker listening on task queue {WORKFLOW_TASK_QUEUE}")
+    await worker.run()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,88 +1,302 @@
 from temporalio import workflow, activity
+from temporalio.common import RetryPolicy
+from temporalio.exceptions import ActivityError, ApplicationError
+from datetime import timedelta
 import logging
 import uuid
 
+with workflow.unsafe.imports_passed_through():
+    from pix2fc.dag import StageFailed, gather_or_cancel, run_dag
+    from pix2fc.stages import (
+        GEN3D_SKIPPED_WARNING, STAGE_WEIGHTS, batch_objects, batch_units, failure, mesh_urls,
+        normalize_3d_objects, pipeline_result, pipeline_stages, root_error,
+    )
+
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
+# Повторы по этапам вместо одной общей политики: дорогие этапы (codegen, gen3d)
+# повторяются реже и с большей паузой; ошибки входных данных не повторяются.
+# Сам workflow без RetryPolicy: если сервис недоступен дольше, чем длятся
+# повторы activity, run завершается ошибкой (ApplicationError, повторяемой), и
+# перезапуск с тем же workflow id (reset или новый старт) продолжает с
+# чекпоинтов — успешные результаты activity уже сохранены и не пересчитываются.
+NON_RETRYABLE_ERRORS = ["InvalidInput", "MissingArtifact"]
+STAGE_RETRY_POLICIES = {
+    "vision": RetryPolicy(
+        initial_interval=timedelta(seconds=2),
+        maximum_interval=timedelta(seconds=30),
+        maximum_attempts=3,
+        non_retryable_error_types=NON_RETRYABLE_ERRORS,
+    ),
+    "codegen": RetryPolicy(
+        initial_interval=timedelta(seconds=5),
+        backoff_coefficient=3.0,
+        maximum_interval=timedelta(seconds=120),
+        maximum_attempts=4,
+        non_retryable_error_types=NON_RETRYABLE_ERRORS,
+    ),
+    "gen3d": RetryPolicy(
+        initial_interval=timedelta(seconds=10),
+        maximum_interval=timedelta(seconds=60),
+        maximum_attempts=2,
+        non_retryable_error_types=NON_RETRYABLE_ERRORS,
+    ),
+    "qa": RetryPolicy(
+        initial_interval=timedelta(seconds=1),
+        maximum_interval=timedelta(seconds=20),
+        maximum_attempts=5,
+        non_retryable_error_types=NON_RETRYABLE_ERRORS,
+    ),
+    "export": RetryPolicy(
+        initial_interval=timedelta(seconds=1),
+        maximum_interval=timedelta(seconds=20),
+        maximum_attempts=5,
+        non_retryable_error_types=NON_RETRYABLE_ERRORS,
+    ),
+}
+# Сколько строк лога отдаёт query-обработчик
+PROGRESS_LOG_LIMIT = 50
+
+def retryable(error: BaseException) -> bool:
+    """Сбой, который может пройти при перезапуске: сервис недоступен, таймаут activity"""
+    if isinstance(error, StageFailed):
+        return error.retryable
+    if isinstance(error, ActivityError):
+        cause = error.cause
+        if isinstance(cause, ApplicationError):
+            return not cause.non_retryable and cause.type not in NON_RETRYABLE_ERRORS
+        return True
+    return False
+
+async def generate_code(ui_json: dict, format: str, job_id: str) -> dict:
+    code_gen_params = {
+        "ui_json": ui_json,
+        "format": format,
+        "job_id": job_id
+    }
+    code_result = await workflow.execute_activity(
+        "codegen.generate",
+        code_gen_params,
+        start_to_close_timeout=timedelta(seconds=600),
+        retry_policy=STAGE_RETRY_POLICIES["codegen"]
+    )
+    if not code_result.get("complete", False):
+        raise StageFailed("CODE_GENERATION_FAILED: Unable to generate code")
+    return code_result
+
+async def generate_object(request: dict) -> dict:
+    gen3d_resp = await workflow.execute_activity(
+        "gen3d.generate",
+        request,
+        start_to_close_timeout=timedelta(seconds=600),
+        retry_policy=STAGE_RETRY_POLICIES["gen3d"]
+    )
+    # Fallback? Прерываем и отдаём статус FAILED — фронт покажет понятное сообщение.
+    if gen3d_resp.get("fallback", False):
+        raise StageFailed(gen3d_resp.get("error", "Unknown 3D generation error"))
+    # Дополнительная проверка на отсутствие glb_url, даже если fallback не установлен
+    if not gen3d_resp.get("glb_url"):
+        raise StageFailed("NO_MESH: 3D generation failed, no mesh URL provided.")
+    return gen3d_resp
+
+class PipelineWorkflow:
+    """Общие для workflow пайплайна прогресс, лог и сборка итогового результата"""
+
+    def __init__(self):
+        self._running = []
+        self._progress = 0
+        self._logs = []
+
+    def _log(self, message: str):
+        self._logs.append(message)
+        del self._logs[:-PROGRESS_LOG_LIMIT]
+
+    def _stage_started(self, stage: str):
+        self._running.append(stage)
+        self._log(f"Stage {stage} started")
+
+    def _stage_done(self, stage: str, error):
+        self._running.remove(stage)
+        if error is None:
+            self._progress += STAGE_WEIGHTS[stage]
+            self._log(f"Stage {stage} completed")
+        else:
+            self._log(f"Stage {stage} failed: {str(error)}")
+
+    @workflow.query
+    def progress(self) -> dict:
+        """Текущие этапы, прогресс и последние строки лога — без обращения к истории workflow"""
+        return {
+            "stage": ", ".join(self._running) if self._running else ("done" if self._progress >= 100 else "pending"),
+            "progress": self._progress,
+            "logs": list(self._logs),
+        }
+
+    async def _check_quality(self, job_id: str) -> dict:
+        qa_result = await workflow.execute_activity(
+            "qa.check",
+            job_id,
+            start_to_close_timeout=timedelta(seconds=300),
+            retry_policy=STAGE_RETRY_POLICIES["qa"]
+        )
+        if not qa_result.get("passed", False):
+            logger.warning(f"QA check failed for job: {job_id}")
+            # Продолжаем выполнение, но добавляем предупреждение в результат
+            self._log("QA check reported warnings")
+        return qa_result
+
+    def _failed(self, job_id: str, error: BaseException) -> dict:
+        """
+        Итог FAILED для окончательных ошибок; повторяемую ошибку пробрасывает,
+        чтобы run завершился с ошибкой и его можно было продолжить с чекпоинтов
+        """
+        result = failure(job_id, error, "WORKFLOW_ERROR")
+        logger.error(f"Workflow failed for job: {job_id}, error: {result['reason']}")
+        if retryable(error):
+            raise ApplicationError(result["reason"], type="StageRetryable", non_retryable=False) from error
+        return result
+
+    async def _execute(self, job_id: str, stages: list, fail_fast: bool, warnings: list) -> dict:
+        try:
+            outcome = await run_dag(
+                stages,
+                fail_fast=fail_fast,
+                on_start=self._stage_started,
+                on_done=self._stage_done,
+            )
+        except Exception as e:
+            return self._failed(job_id, e)
+
+        result = pipeline_result(job_id, outcome, warnings, "WORKFLOW_ERROR")
+        if result["status"] == "FAILED":
+            return self._failed(job_id, root_error(outcome))
+        logger.info(f"Workflow completed successfully for job: {job_id}")
+        # Пропущенный gen3d не даёт своей доли прогресса, но работа завершена
+        self._progress = 100
+        return result
+
 @workflow.defn
-class GenerateSiteWorkflow:
+class GenerateSiteWorkflow(PipelineWorkflow):
     @workflow.run
-    async def run(self, job_id: str, format: str = "next"):
-        try:
-            logger.info(f"Starting workflow for job: {job_id}, format: {format}")
-            
-            # Шаг 1: Vision - сегментация и анализ UI изображения
-            ui_json = await workflow.execute_activity(
-                "vision.segment", 
-                job_id, 
-                start_to_close_timeout=workflow.timeout.from_seconds(300)
+    async def run(self, job_id: str, format: str = "next", fail_fast: bool = True):
+        """
+        Этапы выполняются как граф зависимостей:
+        vision → (codegen ∥ gen3d) → qa → export.
+        Каждый 3D-объект генерируется отдельной параллельной activity.
+        При fail_fast первая ошибка отменяет остальные этапы; иначе ошибка
+        необязательного этапа gen3d попадает в warnings, а пайплайн продолжается.
+        """
+        logger.info(f"Starting workflow for job: {job_id}, format: {format}")
+        warnings = []
+
+        # Шаг 1: Vision - сегментация и анализ UI изображения
+        async def vision(_):
+            return await workflow.execute_activity(
+                "vision.segment",
+                job_id,
+                start_to_close_timeout=timedelta(seconds=300),
+                retry_policy=STAGE_RETRY_POLICIES["vision"]
             )
-            logger.info(f"Vision segmentation completed for job: {job_id}")
-            
-            # Шаг 2: CodeGen - генерация кода на основе UI JSON
-            code_gen_params = {
-                "ui_json": ui_json,
+
+        # Шаг 2: CodeGen - генерация кода на основе UI JSON
+        async def codegen(deps):
+            return await generate_code(deps["vision"], format, job_id)
+
+        # Шаг 3: Gen3D - генерация 3D моделей, по одной activity на объект
+        async def gen3d(deps):
+            requests = normalize_3d_objects(deps["vision"].get("3d"), job_id)
+            return await gather_or_cancel(generate_object(request) for request in requests)
+
+        # Шаг 4: QA - проверка качества сгенерированного кода и 3D моделей
+        async def qa(deps):
+            if deps.get("gen3d") is None:
+                warnings.append(GEN3D_SKIPPED_WARNING)
+            return await self._check_quality(job_id)
+
+        # Шаг 5: Export - упаковка кода, 3D моделей и отчёта QA в ZIP
+        async def export(deps):
+            export_params = {
+                "job_id": job_id,
                 "format": format,
-                "job_id": job_id
+                "meshes": mesh_urls(deps.get("gen3d")),
+                "qa": deps["qa"],
             }
-            code_result = await workflow.execute_activity(
-                "codegen.generate", 
-                code_gen_params, 
-                start_to_close_timeout=workflow.timeout.from_seconds(600)
-            )
-            
-            if not code_result.get("complete", False):
-                return {"status": "FAILED", "reason": "CODE_GENERATION_FAILED: Unable to generate code"}
-            
-            logger.info(f"Code generation completed for job: {job_id}")
-            
-            # Шаг 3: Gen3D - генерация 3D моделей для UI элементов
-            if "3d" in ui_json:
-                gen3d_resp = await workflow.execute_activity(
-                    "gen3d.generate", 
-                    ui_json["3d"], 
-                    start_to_close_timeout=workflow.timeout.from_seconds(600)
-                )
-                
-                # Проверяем оба условия - fallback и отсутствие glb_url
-                if gen3d_resp.get("fallback", False):
-                    # Fallback? Прерываем и отдаём статус FAILED — фронт покажет понятное сообщение.
-                    return {"status": "FAILED", "reason": gen3d_resp.get("error", "Unknown 3D generation error")}
-                
-                # Дополнительная проверка на отсутствие glb_url, даже если fallback не установлен
-                if not gen3d_resp.get("glb_url"):
-                    return {"status": "FAILED", "reason": "NO_MESH: 3D generation failed, no mesh URL provided."}
-                
-                logger.info(f"3D generation completed for job: {job_id}")
-            
-            # Шаг 4: QA - проверка качества сгенерированного кода и 3D моделей
-            qa_result = await workflow.execute_activity(
-                "qa.check", 
-                job_id,
-                start_to_close_timeout=workflow.timeout.from_seconds(300)
-            )
-            
-            if not qa_result.get("passed", False):
-                logger.warning(f"QA check failed for job: {job_id}")
-                # Продолжаем выполнение, но добавляем предупреждение в результат
-            
-            # Шаг 5: Export - упаковка всех файлов в ZIP
-            export_params = {"job_id": job_id}
-            zip_result = await workflow.execute_activity(
-                "export.bundle", 
+            return await workflow.execute_activity(
+                "export.bundle",
                 export_params,
-                start_to_close_timeout=workflow.timeout.from_seconds(300)
+                start_to_close_timeout=timedelta(seconds=300),
+                retry_policy=STAGE_RETRY_POLICIES["export"]
+            )
+
+        return await self._execute(job_id, pipeline_stages(vision, codegen, gen3d, qa, export), fail_fast, warnings)
+
+@workflow.defn
+class GenerateBatchWorkflow(PipelineWorkflow):
+    @workflow.run
+    async def run(self, job_id: str, format: str = "next", screens: int = 1, fail_fast: bool = True):
+        """
+        Пакетная обработка многоэкранного проекта: все экраны сегментируются одним
+        вызовом vision, который выносит общие компоненты (шапки, навбары) в отдельный
+        словарь. Каждый общий компонент и каждый экран генерируются один раз и
+        параллельно, одинаковые 3D-объекты разных экранов — тоже один раз;
+        результат собирается в один архив.
+        """
+        logger.info(f"Starting batch workflow for job: {job_id}, screens: {screens}, format: {format}")
+        warnings = []
+
+        async def vision(_):
+            return await workflow.execute_activity(
+                "vision.segment_batch",
+                {"job_id": job_id, "screens": screens},
+                start_to_close_timeout=timedelta(seconds=300 + 30 * screens),
+                retry_policy=STAGE_RETRY_POLICIES["vision"]
             )
-            
-            logger.info(f"Workflow completed successfully for job: {job_id}")
-            return {
-                "status": "SUCCESS", 
-                "download": zip_result.get("url"),
+
+        async def codegen(deps):
+            segmented = deps["vision"]
+            units = batch_units(job_id, segmented)
+            self._log(f"Generating {len(segmented['components'])} shared components and {len(segmented['screens'])} screens")
+            await gather_or_cancel(generate_code(ui_json, format, unit_id) for _, unit_id, ui_json in units)
+            return {"sections": [[title, unit_id] for title, unit_id, _ in units]}
+
+        async def gen3d(deps):
+            # Одинаковый объект на нескольких экранах генерируется один раз
+            return await gather_or_cancel(generate_object(request) for request in batch_objects(job_id, deps["vision"]))
+
+        async def qa(deps):
+            if deps.get("gen3d") is None:
+                warnings.append(GEN3D_SKIPPED_WARNING)
+            return await self._check_quality(job_id)
+
+        async def export(deps):
+            export_params = {
                 "job_id": job_id,
-                "warnings": qa_result.get("warnings", [])
+                "format": format,
+                "sections": deps["codegen"]["sections"],
+                "meshes": mesh_urls(deps.get("gen3d")),
+                "qa": deps["qa"],
             }
-            
-        except Exception as e:
-            logger.error(f"Workflow failed for job: {job_id}, error: {str(e)}")
-            return {"status": "FAILED", "reason": f"WORKFLOW_ERROR: {str(e)}", "job_id": job_id}
+            return await workflow.execute_activity(
+                "export.bundle_batch",
+                export_params,
+                start_to_close_timeout=timedelta(seconds=300),
+                retry_policy=STAGE_RETRY_POLICIES["export"]
+            )
+
+        return await self._execute(job_id, pipeline_stages(vision, codegen, gen3d, qa, export), fail_fast, warnings)
+
+@workflow.defn
+class ForgetJobWorkflow:
+    @workflow.run
+    async def run(self, job_id: str) -> dict:
+        """Удаление артефактов задания по запросу (GDPR); повторяется до успеха"""
+        return await workflow.execute_activity(
+            "storage.forget_job",
+            job_id,
+            start_to_close_timeout=timedelta(seconds=600),
+            retry_policy=RetryPolicy(
+                initial_interval=timedelta(seconds=5),
+                maximum_interval=timedelta(seconds=300),
+            )
+        )
@@ -0,0 +1,58 @@
+"""
+Проверка одной пары скриншотов. Вынесена из service.py, чтобы её можно было
+запускать и в потоке (/qa), и в процессах пула (/qa/batch): аргументы и
+результат — простые сериализуемые значения, сами кадры воркеры открывают
+через memmap, и страницы файлов в page cache общие для всех процессов.
+"""
+import uuid
+from typing import Any, Dict
+
+from diff import compare
+from frames import FrameStore, heatmap_image, write_png
+
+HEATMAP_SCALE = 8  # пикселей тепловой карты на тайл
+
+# FrameStore на процесс: в воркерах пула создаётся при первой проверке
+_stores: Dict[str, FrameStore] = {}
+
+
+def frame_store(storage_dir: str) -> FrameStore:
+    store = _stores.get(storage_dir)
+    if store is None:
+        store = _stores[storage_dir] = FrameStore(storage_dir)
+    return store
+
+
+def check_frames(storage_dir: str, job_id: str, reference: str, candidate: str, max_delta: float) -> Dict[str, Any]:
+    """Сравнение кадров и запись тепловой карты; синхронно"""
+    store = frame_store(storage_dir)
+    reference_frame = store.open(reference)
+    candidate_frame = store.open(candidate)
+    result = compare(reference_frame, candidate_frame)
+
+    heatmap_url = None
+    if result.tiles_changed or result.size_mismatch:
+        name = uuid.uuid4().hex
+        write_png(store.heatmap_path(name), heatmap_image(result.heatmap, HEATMAP_SCALE))
+        heatmap_url = f"/qa/heatmaps/{name}.png"
+
+    passed = result.delta <= max_delta
+    warnings = []
+    if result.size_mismatch:
+        ref_h, ref_w = reference_frame.shape[:2]
+        cand_h, cand_w = candidate_frame.shape[:2]
+        warnings.append(f"Screenshot size differs: {ref_w}x{ref_h} vs {cand_w}x{cand_h}")
+    if not passed:
+        warnings.append(f"Visual regression: delta {result.delta:.4f} exceeds {max_delta:.4f}")
+    return {
+        "job_id": job_id,
+        "passed": passed,
+        "delta": result.delta,
+        "changed_pixels": result.changed_pixels,
+        "size_mismatch": result.size_mismatch,
+        "regions": result.regions,
+        "heatmap_url": heatmap_url,
+        "tiles": {"total": result.tiles_total, "changed": result.tiles_changed},
+        "elapsed_ms": result.elapsed_ms,
+        "warnings": warnings,
+    }
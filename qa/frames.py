@@ -0,0 +1,185 @@
+"""
+Хранилище кадров (скриншотов) для QA.
+
+Загруженный скриншот один раз декодируется в несжатый .npy, дальше кадр
+открывается через np.memmap: сравнение читает только нужные полосы страницы
+прямо из page cache, без копии 1920×10000 кадра в памяти процесса. Имя
+кадра — sha256 исходных байтов, повторная загрузка того же скриншота
+ничего не пишет. Кадры и тепловые карты, к которым давно не обращались,
+удаляет sweep().
+"""
+import hashlib
+import io
+import os
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Union
+
+import numpy as np
+
+MAX_FRAME_PIXELS = 64_000_000  # ~1920×33000; больше — вероятно, decompression bomb
+
+_NPY_MAGIC = b"\x93NUMPY"
+
+
+class FrameError(ValueError):
+    """Кадр не удалось декодировать или он не подходит для сравнения"""
+
+
+def decode_image(data: Union[bytes, BinaryIO]) -> np.ndarray:
+    """
+    PNG/JPEG → (H, W, 3) uint8; .npy принимается как есть (уже готовый буфер кадра).
+    data — байты или открытый файл загрузки.
+    """
+    source = io.BytesIO(data) if isinstance(data, bytes) else data
+    is_npy = source.read(len(_NPY_MAGIC)) == _NPY_MAGIC
+    source.seek(0)
+    if is_npy:
+        try:
+            frame = np.load(source, allow_pickle=False)
+        except ValueError as e:
+            raise FrameError(f"Invalid .npy frame: {e}")
+    else:
+        try:
+            from PIL import Image
+        except ImportError:
+            raise FrameError("Pillow is not installed, only .npy frames are accepted")
+        Image.MAX_IMAGE_PIXELS = MAX_FRAME_PIXELS
+        try:
+            with Image.open(source) as image:
+                frame = np.asarray(image.convert("RGB"))
+        except Exception as e:
+            raise FrameError(f"Cannot decode image: {e}")
+    if frame.dtype != np.uint8 or frame.ndim not in (2, 3):
+        raise FrameError(f"Expected uint8 (H, W[, C]) frame, got {frame.dtype} {frame.shape}")
+    if frame.shape[0] * frame.shape[1] > MAX_FRAME_PIXELS:
+        raise FrameError(f"Frame too large: {frame.shape[1]}x{frame.shape[0]}")
+    return frame
+
+
+def write_png(path: Path, rgba: np.ndarray) -> None:
+    """Минимальный PNG-кодировщик (RGBA, 8 бит) без зависимостей"""
+    height, width, _ = rgba.shape
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, -1)  # фильтр 0 на каждой строке
+
+    def chunk(kind: bytes, body: bytes) -> bytes:
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+    png = (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_bytes(png)
+    os.replace(tmp_path, path)
+
+
+def heatmap_image(heatmap: np.ndarray, scale: int) -> np.ndarray:
+    """Тепловая карта тайлов → RGBA: прозрачный там, где совпадает, красный — где сильнее всего различие"""
+    intensity = np.clip(heatmap, 0.0, 1.0)
+    rgba = np.zeros(heatmap.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = 255
+    rgba[..., 1] = (255 * (1.0 - intensity)).astype(np.uint8)
+    rgba[..., 3] = (np.sqrt(intensity) * 255).astype(np.uint8)
+    return rgba.repeat(scale, axis=0).repeat(scale, axis=1)
+
+
+class FrameStore:
+    """
+    Кадры в frames/<ab>/<sha256>.npy, тепловые карты в heatmaps/,
+    недописанные загрузки в incoming/
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.frames_dir = self.directory / "frames"
+        self.heatmaps_dir = self.directory / "heatmaps"
+        self.incoming_dir = self.directory / "incoming"
+        self.frames_dir.mkdir(parents=True, exist_ok=True)
+        self.heatmaps_dir.mkdir(parents=True, exist_ok=True)
+        self.incoming_dir.mkdir(parents=True, exist_ok=True)
+
+    def frame_path(self, frame_id: str) -> Path:
+        if not re.fullmatch(r"[0-9a-f]{64}", frame_id):
+            raise FrameError(f"Invalid frame id: {frame_id}")
+        return self.frames_dir / frame_id[:2] / f"{frame_id}.npy"
+
+    def heatmap_path(self, name: str) -> Path:
+        if not re.fullmatch(r"[0-9a-f]{32}", name):
+            raise FrameError(f"Invalid heatmap id: {name}")
+        return self.heatmaps_dir / f"{name}.png"
+
+    def put(self, data: bytes) -> str:
+        """Декодирует и сохраняет скриншот; возвращает frame_id (sha256 байтов)"""
+        frame_id = hashlib.sha256(data).hexdigest()
+        if not self._reuse(frame_id):
+            self._save(frame_id, decode_image(data))
+        return frame_id
+
+    def upload_path(self) -> Path:
+        """Временный файл для потоковой загрузки скриншота (см. put_file)"""
+        return self.incoming_dir / f"{uuid.uuid4().hex}.part"
+
+    def put_file(self, upload: Path, frame_id: str) -> str:
+        """
+        Как put(), но для загрузки, уже записанной на диск: frame_id — sha256,
+        посчитанный при записи. Временный файл удаляется в любом случае.
+        """
+        try:
+            if not self._reuse(frame_id):
+                with open(upload, "rb") as f:
+                    frame = decode_image(f)
+                self._save(frame_id, frame)
+        finally:
+            upload.unlink(missing_ok=True)
+        return frame_id
+
+    def _reuse(self, frame_id: str) -> bool:
+        # Повторная загрузка продлевает жизнь кадра для sweep()
+        try:
+            os.utime(self.frame_path(frame_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _save(self, frame_id: str, frame: np.ndarray) -> None:
+        path = self.frame_path(frame_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(frame), allow_pickle=False)
+        os.replace(tmp_path, path)
+
+    def open(self, frame_id: str) -> np.ndarray:
+        """Кадр как read-only np.memmap"""
+        path = self.frame_path(frame_id)
+        if not path.exists():
+            raise FileNotFoundError(f"Frame {frame_id} not found")
+        return np.load(path, mmap_mode="r")
+
+    def sweep(self, max_age: float) -> int:
+        """
+        Удаляет кадры, тепловые карты и брошенные загрузки, которые не
+        менялись дольше max_age секунд; возвращает число удалённых файлов.
+        """
+        deadline = time.time() - max_age
+        deleted = 0
+        for directory, pattern in (
+            (self.frames_dir, "*/*"), (self.heatmaps_dir, "*"), (self.incoming_dir, "*"),
+        ):
+            for path in directory.glob(pattern):
+                try:
+                    if path.stat().st_mtime < deadline:
+                        path.unlink()
+                        deleted += 1
+                except FileNotFoundError:
+                    continue
+        return deleted
@@ -1,8 +1,209 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+from checks import check_frames, frame_store as open_frame_store
+from frames import FrameError
+
+logger = logging.getLogger(__name__)
+
+QA_STORAGE_DIR = os.getenv("QA_STORAGE_DIR", "/tmp/pix2fullcode/qa")
+QA_MAX_DELTA = float(os.getenv("QA_MAX_DELTA", "0.02"))  # доля 1 - SSIM по странице, выше — регрессия
+MAX_FRAME_BYTES = int(os.getenv("QA_MAX_FRAME_BYTES", str(200 * 1024 * 1024)))  # байт на скриншот; несжатый .npy 1920×10000 — 58 МБ
+QA_WORKERS = int(os.getenv("QA_WORKERS", str(os.cpu_count() or 1)))  # процессов для /qa/batch
+MAX_BATCH_PAIRS = 200  # пар скриншотов в одном /qa/batch
+QA_FRAME_TTL = int(os.getenv("QA_FRAME_TTL", str(7 * 24 * 3600)))  # секунды хранения кадра после последней загрузки и тепловой карты после создания
+QA_SWEEP_INTERVAL = float(os.getenv("QA_SWEEP_INTERVAL", "3600"))  # секунды между обходами хранилища
 
 app = FastAPI()
 
+# Скриншоты декодируются один раз и дальше читаются через memmap
+frame_store = open_frame_store(QA_STORAGE_DIR)
+
+# Пул для пакетных проверок: каждый процесс сам отображает кадры в память, между процессами идут только id
+executor: Optional[ProcessPoolExecutor] = None
+sweeper: Optional[asyncio.Task] = None
+
+
+async def sweep_storage():
+    """Периодически удаляет старые кадры и тепловые карты; первый обход — через интервал"""
+    while True:
+        await asyncio.sleep(QA_SWEEP_INTERVAL)
+        try:
+            deleted = await asyncio.to_thread(frame_store.sweep, QA_FRAME_TTL)
+            if deleted:
+                logger.info(f"QA storage sweep deleted {deleted} files")
+        except Exception as e:
+            logger.error(f"QA storage sweep failed: {str(e)}")
+
+
+@app.on_event("startup")
+async def startup_event():
+    global executor, sweeper
+    executor = ProcessPoolExecutor(max_workers=QA_WORKERS)
+    sweeper = asyncio.create_task(sweep_storage())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if sweeper is not None:
+        sweeper.cancel()
+        await asyncio.gather(sweeper, return_exceptions=True)
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class QARequest(BaseModel):
+    job_id: str
+    reference: Optional[str] = None  # frame_id эталонного скриншота (POST /qa/frames)
+    candidate: Optional[str] = None  # frame_id скриншота сгенерированного сайта
+    max_delta: float = Field(QA_MAX_DELTA, ge=0, le=1)
+
+
+class QAPair(BaseModel):
+    reference: str                   # frame_id эталона
+    candidate: str                   # frame_id проверяемого скриншота
+    name: Optional[str] = None       # например "pricing@mobile", возвращается в результате
+
+
+class QABatchRequest(BaseModel):
+    job_id: str
+    pairs: List[QAPair] = Field(..., min_length=1, max_length=MAX_BATCH_PAIRS)
+    max_delta: float = Field(QA_MAX_DELTA, ge=0, le=1)
+
+
+@app.post("/qa/frames")
+async def upload_frame(request: Request):
+    """
+    Принимает скриншот (PNG/JPEG или готовый .npy буфер) телом запроса, возвращает frame_id.
+    Тело пишется на диск по мере чтения и отбрасывается, как только превышен MAX_FRAME_BYTES.
+    """
+    too_large = HTTPException(status_code=413, detail=f"Frame exceeds {MAX_FRAME_BYTES} bytes")
+    declared_size = request.headers.get("content-length")
+    if declared_size and declared_size.isdigit() and int(declared_size) > MAX_FRAME_BYTES:
+        raise too_large
+
+    upload = frame_store.upload_path()
+    hasher = hashlib.sha256()
+    size = 0
+    fh = await asyncio.to_thread(open, upload, "wb")
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > MAX_FRAME_BYTES:
+                raise too_large
+            hasher.update(chunk)
+            await asyncio.to_thread(fh.write, chunk)
+    except BaseException:
+        await asyncio.to_thread(fh.close)
+        upload.unlink(missing_ok=True)
+        raise
+    await asyncio.to_thread(fh.close)
+
+    if not size:
+        upload.unlink(missing_ok=True)
+        raise HTTPException(status_code=422, detail="Empty frame")
+    try:
+        frame_id = await asyncio.to_thread(frame_store.put_file, upload, hasher.hexdigest())
+    except FrameError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"frame_id": frame_id}
+
+
 @app.post("/qa")
-async def qa():
-    # TODO: pixel-diff and axe-core
-    return {"delta": 0.0}
+async def qa(req: QARequest):
+    """
+    Visual regression: сравнивает скриншот сгенерированного сайта с эталоном.
+    Возвращает общую разницу (1 - SSIM), регионы изменений и тепловую карту.
+    """
+    # TODO: axe-core
+    if not req.reference or not req.candidate:
+        # Скриншотов нет — сравнивать нечего, это не регрессия
+        return {"job_id": req.job_id, "passed": True, "skipped": True, "delta": 0.0, "regions": [], "warnings": []}
+    try:
+        return await asyncio.to_thread(
+            check_frames, QA_STORAGE_DIR, req.job_id, req.reference, req.candidate, req.max_delta
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+async def check_in_pool(job_id: str, pair: QAPair, max_delta: float) -> dict:
+    global executor
+    loop = asyncio.get_running_loop()
+    pool = executor
+    try:
+        return await loop.run_in_executor(
+            pool, check_frames, QA_STORAGE_DIR, job_id, pair.reference, pair.candidate, max_delta
+        )
+    except BrokenProcessPool:
+        # Воркер упал (OOM на огромном кадре) — пересоздаём пул один раз для всех задач сломанного
+        if executor is pool:
+            logger.error("QA worker process died, restarting process pool")
+            pool.shutdown(wait=False, cancel_futures=False)
+            executor = ProcessPoolExecutor(max_workers=QA_WORKERS)
+        raise
+
+
+@app.post("/qa/batch")
+async def qa_batch(req: QABatchRequest):
+    """
+    Проверяет N пар скриншотов (страницы × viewport'ы) параллельно в пуле процессов.
+    Ответ — NDJSON: строка на пару по мере готовности (с index и name из запроса),
+    последняя строка — итог {"done": true, ...}.
+    """
+    async def run(index: int, pair: QAPair):
+        try:
+            result = await check_in_pool(req.job_id, pair, req.max_delta)
+        except FileNotFoundError as e:
+            result = {"passed": False, "error": f"MISSING_FRAME: {e}"}
+        except ValueError as e:
+            result = {"passed": False, "error": f"INVALID_FRAME: {e}"}
+        except Exception as e:
+            logger.error(f"QA check failed for job {req.job_id}, pair {index}: {str(e)}")
+            result = {"passed": False, "error": f"QA_ERROR: {e}"}
+        return {"index": index, "name": pair.name, **result}
+
+    async def stream():
+        tasks = [asyncio.ensure_future(run(index, pair)) for index, pair in enumerate(req.pairs)]
+        passed, delta, failed = True, 0.0, []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                passed = passed and result["passed"]
+                delta = max(delta, result.get("delta", 1.0))
+                if not result["passed"]:
+                    failed.append(result["name"] or str(result["index"]))
+                yield json.dumps(result) + "\n"
+        finally:
+            # Клиент отключился — ещё не начатые проверки снимаются с очереди пула
+            for task in tasks:
+                task.cancel()
+        warnings = [f"Visual regression in {len(failed)} of {len(tasks)} screenshots: {', '.join(failed)}"] if failed else []
+        yield json.dumps({
+            "done": True, "job_id": req.job_id, "passed": passed, "delta": delta,
+            "pairs": len(tasks), "failed": len(failed), "warnings": warnings,
+        }) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/qa/heatmaps/{name}.png")
+async def get_heatmap(name: str):
+    try:
+        path = frame_store.heatmap_path(name)
+    except FrameError:
+        raise HTTPException(status_code=404, detail="Heatmap not found")
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Heatmap not found")
+    return FileResponse(path, media_type="image/png")
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Модули сервиса импортируются по имени, как в образе
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# service.py открывает хранилище кадров при импорте: во временном каталоге
+os.environ.setdefault("QA_STORAGE_DIR", tempfile.mkdtemp(prefix="pix2fc-qa-"))
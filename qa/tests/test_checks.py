@@ -0,0 +1,77 @@
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from checks import check_frames
+from frames import FrameError, FrameStore
+
+
+def npy(frame: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, frame, allow_pickle=False)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def frames(tmp_path):
+    store = FrameStore(str(tmp_path))
+    reference = np.random.default_rng(0).integers(0, 255, (200, 128, 3), dtype=np.uint8)
+    changed = reference.copy()
+    changed[10:50, 10:50] = 0
+    return store, store.put(npy(reference)), store.put(npy(changed))
+
+
+def test_frame_store_is_content_addressed(frames):
+    store, reference, _ = frames
+    assert store.put(store.frame_path(reference).read_bytes()) == reference
+    assert store.open(reference).shape == (200, 128, 3)
+    with pytest.raises(FrameError):
+        store.frame_path("../etc/passwd")
+    with pytest.raises(FileNotFoundError):
+        store.open("0" * 64)
+
+
+def test_check_frames_in_process_pool(frames, tmp_path):
+    store, reference, changed = frames
+    pairs = [(reference, reference), (reference, changed)]
+    # Воркеры получают только строки и открывают кадры сами
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        same, diff = pool.map(check_frames, *zip(*[(str(tmp_path), "job", a, b, 0.01) for a, b in pairs]))
+    assert same["passed"] and same["heatmap_url"] is None and same["warnings"] == []
+    assert not diff["passed"] and diff["tiles"]["changed"] == 1
+    assert diff["warnings"][0].startswith("Visual regression")
+    name = diff["heatmap_url"].rsplit("/", 1)[-1][:-len(".png")]
+    assert store.heatmap_path(name).read_bytes().startswith(b"\x89PNG")
+
+
+def test_put_file_matches_put_and_removes_upload(frames):
+    store, reference, _ = frames
+    upload = store.upload_path()
+    upload.write_bytes(store.frame_path(reference).read_bytes())
+    assert store.put_file(upload, reference) == reference
+    assert not upload.exists()
+
+    bad = store.upload_path()
+    bad.write_bytes(b"not an image")
+    with pytest.raises(FrameError):
+        store.put_file(bad, "1" * 64)
+    assert not bad.exists()
+
+
+def test_sweep_removes_old_frames_and_heatmaps(frames, tmp_path):
+    store, reference, changed = frames
+    result = check_frames(str(tmp_path), "job", reference, changed, 0.01)
+    heatmap = store.heatmap_path(result["heatmap_url"].rsplit("/", 1)[-1][:-len(".png")])
+    old = time.time() - 3600
+    for path in (store.frame_path(reference), store.frame_path(changed), heatmap):
+        os.utime(path, (old, old))
+
+    # Повторная загрузка продлевает жизнь кадра
+    store.put(store.frame_path(reference).read_bytes())
+    assert store.sweep(60) == 2
+    assert store.frame_path(reference).exists()
+    assert not store.frame_path(changed).exists() and not heatmap.exists()
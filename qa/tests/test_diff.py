@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from diff import TILE, WINDOW, _C1, _C2, compare
+
+
+def frame(height=300, width=260, seed=0):
+    return np.random.default_rng(seed).integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+
+def naive_ssim(a, b):
+    """SSIM тайла по окнам WINDOW×WINDOW без матричных трюков"""
+    values = []
+    for y in range(0, TILE, WINDOW):
+        for x in range(0, TILE, WINDOW):
+            wa, wb = a[y:y + WINDOW, x:x + WINDOW], b[y:y + WINDOW, x:x + WINDOW]
+            mu_a, mu_b = wa.mean(), wb.mean()
+            cov = (wa * wb).mean() - mu_a * mu_b
+            values.append(((2 * mu_a * mu_b + _C1) * (2 * cov + _C2))
+                          / ((mu_a ** 2 + mu_b ** 2 + _C1) * (wa.var() + wb.var() + _C2)))
+    return float(np.mean(values))
+
+
+def test_identical_frames():
+    ref = frame()
+    result = compare(ref, ref.copy())
+    assert result.delta == 0.0 and result.changed_pixels == 0.0
+    assert result.tiles_changed == 0 and result.regions == []
+    assert not result.size_mismatch
+
+
+def test_localized_change_gives_one_region():
+    ref = frame()
+    cand = ref.copy()
+    cand[70:120, 140:180] = 0
+    result = compare(ref, cand)
+    assert result.tiles_changed == 1
+    (region,) = result.regions
+    assert (region["x"], region["y"], region["width"], region["height"]) == (128, 64, 64, 64)
+    assert result.heatmap[1, 2] > 0.5 and result.heatmap[0].max() == 0.0
+
+
+def test_tile_ssim_matches_reference_formula():
+    ref = frame(TILE, TILE)
+    cand = ref.copy()
+    cand[:, :32] //= 2
+    gray = lambda image: image.astype(np.float64) @ np.array([0.299, 0.587, 0.114])
+    expected = 1.0 - naive_ssim(gray(ref), gray(cand))
+    assert compare(ref, cand).heatmap[0, 0] == pytest.approx(expected, abs=1e-4)
+
+
+def test_grayscale_and_size_mismatch():
+    ref = frame(200, 128)[:, :, 0]
+    cand = np.concatenate([ref, ref[:64]])
+    result = compare(ref, cand)
+    assert result.size_mismatch
+    assert result.heatmap.shape == (5, 2)
+    assert result.heatmap[:3].max() == 0.0 and result.heatmap[4].min() == 1.0
+    with pytest.raises(ValueError):
+        compare(ref.astype(np.float32), cand)
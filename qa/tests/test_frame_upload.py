@@ -0,0 +1,52 @@
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from fastapi import HTTPException, Request
+from fastapi.testclient import TestClient
+
+import service
+
+
+def npy(frame: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, frame, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def chunks(data: bytes, size: int = 1024):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def test_upload_streams_frame_to_store():
+    frame = np.zeros((64, 32, 3), dtype=np.uint8)
+    with TestClient(service.app) as client:
+        response = client.post("/qa/frames", content=chunks(npy(frame)))
+    assert response.status_code == 200
+    assert service.frame_store.open(response.json()["frame_id"]).shape == (64, 32, 3)
+    assert list(service.frame_store.incoming_dir.iterdir()) == []
+
+
+def test_upload_stops_at_size_cap(monkeypatch):
+    monkeypatch.setattr(service, "MAX_FRAME_BYTES", 4096)
+    messages = [{"type": "http.request", "body": b"\x00" * 1024, "more_body": True} for _ in range(64)]
+    received = []
+
+    async def receive():
+        received.append(1)
+        return messages[len(received) - 1]
+
+    # Тело без Content-Length: чтение прекращается на первом чанке сверх лимита
+    request = Request({"type": "http", "method": "POST", "headers": []}, receive)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service.upload_frame(request))
+    assert error.value.status_code == 413
+    assert len(received) == 5
+    assert list(service.frame_store.incoming_dir.iterdir()) == []
+
+    with TestClient(service.app) as client:
+        # Заявленный размер отсекается ещё до чтения тела
+        assert client.post("/qa/frames", content=b"\x00" * 8192).status_code == 413
+        assert client.post("/qa/frames", content=b"").status_code == 422
@@ -0,0 +1,120 @@
+"""
+Бэкенды сегментации UI. Бэкенд получает пакет уже подготовленных кадров
+(N, 3, H, W) float32 в [0, 1] и возвращает по UI-дереву на кадр; один вызов
+infer() — один прямой проход модели по всему пакету.
+
+  onnx          — модель (ViT+SAM/детектор), экспортированная в ONNX, на CPU
+                  через onnxruntime;
+  deterministic — маленькая детерминированная эвристика на NumPy без
+                  весов: для тестов и разработки без модели.
+"""
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Классы детектора в порядке выходов модели
+DEFAULT_LABELS = ["section", "header", "navbar", "button", "text", "image", "input", "card", "footer"]
+SCORE_THRESHOLD = float(os.getenv("VISION_SCORE_THRESHOLD", "0.5"))
+
+
+class BackendError(Exception):
+    """Бэкенд не удалось загрузить или выполнить"""
+
+
+class SegmentationBackend(ABC):
+    name = "base"
+    input_size: Tuple[int, int] = (1024, 1024)  # (H, W) кадра на входе модели
+
+    @abstractmethod
+    def infer(self, batch: np.ndarray) -> List[List[Dict[str, Any]]]:
+        """(N, 3, H, W) float32 → N списков узлов UI-дерева"""
+
+
+def _node(label: str, box, score: float) -> Dict[str, Any]:
+    x0, y0, x1, y1 = (round(float(v), 4) for v in box)
+    return {"type": label, "bbox": [x0, y0, round(x1 - x0, 4), round(y1 - y0, 4)], "score": round(float(score), 3)}
+
+
+class OnnxBackend(SegmentationBackend):
+    """
+    ONNX-модель на CPU. Ожидаемые выходы для пакета из N кадров:
+    boxes (N, K, 4) — нормированные x0, y0, x1, y1; scores (N, K); labels (N, K).
+    """
+    name = "onnx"
+
+    def __init__(self, model_path: str, threads: int = 1, labels: List[str] = DEFAULT_LABELS):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise BackendError("onnxruntime is not installed (requirements-onnx.txt; image build arg VISION_ONNX=1)")
+        options = onnxruntime.SessionOptions()
+        # Параллелизм — внутри одного прямого прохода; проходы друг за другом выполняет планировщик
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        try:
+            self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        except Exception as e:
+            raise BackendError(f"Cannot load model {model_path}: {e}")
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        height, width = model_input.shape[2:4]
+        if isinstance(height, int) and isinstance(width, int):
+            self.input_size = (height, width)
+        self.output_names = [output.name for output in self.session.get_outputs()]
+        self.labels = labels
+
+    def infer(self, batch: np.ndarray) -> List[List[Dict[str, Any]]]:
+        outputs = dict(zip(self.output_names, self.session.run(None, {self.input_name: batch})))
+        boxes, scores, labels = outputs["boxes"], outputs["scores"], outputs["labels"]
+        trees = []
+        for image_boxes, image_scores, image_labels in zip(boxes, scores, labels):
+            keep = image_scores >= SCORE_THRESHOLD
+            nodes = [
+                _node(self.labels[int(label)] if int(label) < len(self.labels) else "element", box, score)
+                for box, score, label in zip(image_boxes[keep], image_scores[keep], image_labels[keep])
+            ]
+            trees.append(sorted(nodes, key=lambda node: (node["bbox"][1], node["bbox"][0])))
+        return trees
+
+
+class DeterministicBackend(SegmentationBackend):
+    """
+    Делит страницу на горизонтальные секции по резким перепадам средней
+    яркости строк. Весь пакет обрабатывается одной векторной операцией,
+    поэтому пакетирование работает так же, как у настоящей модели.
+    """
+    name = "deterministic"
+    input_size = (256, 256)
+
+    MIN_SECTION = 0.04  # доля высоты кадра
+    EDGE_THRESHOLD = 0.08  # перепад средней яркости соседних строк
+
+    def infer(self, batch: np.ndarray) -> List[List[Dict[str, Any]]]:
+        luma = batch[:, 0] * 0.299 + batch[:, 1] * 0.587 + batch[:, 2] * 0.114
+        rows = luma.mean(axis=2)
+        edges = np.abs(np.diff(rows, axis=1)) > self.EDGE_THRESHOLD
+        height = batch.shape[2]
+        trees = []
+        for image_edges in edges:
+            cuts = [0] + [int(y) + 1 for y in np.flatnonzero(image_edges)] + [height]
+            nodes = []
+            for y0, y1 in zip(cuts, cuts[1:]):
+                if (y1 - y0) / height >= self.MIN_SECTION:
+                    nodes.append(_node("section", (0.0, y0 / height, 1.0, y1 / height), 1.0))
+            trees.append(nodes)
+        return trees
+
+
+def load_backend(name: str, model_path: str = "", threads: int = 1) -> SegmentationBackend:
+    if name == "onnx":
+        if not model_path:
+            raise BackendError("VISION_MODEL_PATH is required for the onnx backend")
+        return OnnxBackend(model_path, threads=threads)
+    if name == "deterministic":
+        return DeterministicBackend()
+    raise BackendError(f"Unknown vision backend: {name}")
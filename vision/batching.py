@@ -0,0 +1,138 @@
+"""
+Динамическое микропакетирование запросов к модели.
+
+Одновременные запросы собираются в пакет: первый запрос открывает окно
+max_wait секунд, пакет уходит в модель, как только окно закрылось или
+набралось max_batch кадров. Прямой проход выполняется в отдельном потоке, не
+блокируя event loop; пока он идёт, новые запросы копятся в очереди и уходят
+следующим пакетом без ожидания окна. Результаты раздаются запросам по
+порядку кадров в пакете. Кадры одного запроса (infer_all) занимают в очереди
+не больше мест, чем даёт семафор запроса, и снимаются с неё при первой ошибке.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from pix2fc.dag import gather_or_cancel
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Очередь планировщика заполнена"""
+
+
+class MicroBatcher:
+    def __init__(self, backend, max_batch: int = 8, max_wait: float = 0.005, max_queue: int = 256):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._queue: "asyncio.Queue[Tuple[np.ndarray, asyncio.Future]]" = asyncio.Queue()
+        self._arrived = asyncio.Event()
+        # Один поток: проходы модели идут друг за другом, параллелизм — внутри прохода
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vision-infer")
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.images = 0
+        self.rejected = 0
+        self.infer_seconds = 0.0
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def infer(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        """Один подготовленный кадр (3, H, W) uint8 или float32 в [0, 1] → узлы UI-дерева"""
+        if self._queue.qsize() >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(f"Vision queue is full ({self.max_queue} images)")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((image, future))
+        self._arrived.set()
+        return await future
+
+    async def infer_all(self, images, slots: Optional[asyncio.Semaphore] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Кадры одного запроса по порядку. slots — семафор запроса: столько его кадров
+        одновременно стоит в очереди, остальные ждут, не вытесняя другие запросы.
+        При первой ошибке ещё не обработанные кадры отменяются и в пакет не попадут.
+        """
+        async def one(image: np.ndarray) -> List[Dict[str, Any]]:
+            if slots is None:
+                return await self.infer(image)
+            async with slots:
+                return await self.infer(image)
+
+        return await gather_or_cancel(one(image) for image in images)
+
+    async def _collect(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        items = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.max_batch:
+            # Накопившееся за время прошлого прохода забираем сразу, без ожидания окна
+            if not self._queue.empty():
+                items.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            # Ждём сигнал о новом кадре, а не сам queue.get(): отмена по таймауту не теряет элемент
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+        # Клиент уже отключился — кадр не занимает место в пакете
+        return [(image, future) for image, future in items if not future.done()]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            items = await self._collect()
+            if not items:
+                continue
+            started = time.monotonic()
+            try:
+                trees = await loop.run_in_executor(self._executor, self._forward, [image for image, _ in items])
+            except Exception as e:
+                logger.error(f"Vision inference failed for a batch of {len(items)}: {str(e)}")
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.infer_seconds += time.monotonic() - started
+            self.batches += 1
+            self.images += len(items)
+            for (_, future), tree in zip(items, trees):
+                if not future.done():
+                    future.set_result(tree)
+
+    def _forward(self, images: List[np.ndarray]) -> List[List[Dict[str, Any]]]:
+        # Сборка пакета и перевод в float32 — в потоке модели: кадры могут быть memmap'ами кэша тайлов
+        batch = np.stack(images)
+        if batch.dtype == np.uint8:
+            batch = batch.astype(np.float32) / 255.0
+        return self.backend.infer(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "max_batch": self.max_batch,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "images": self.images,
+            "rejected": self.rejected,
+            "avg_batch": round(self.images / self.batches, 2) if self.batches else 0.0,
+            "images_per_second": round(self.images / self.infer_seconds, 2) if self.infer_seconds else 0.0,
+        }
@@ -0,0 +1,93 @@
+"""
+Поиск общих компонентов (шапки, навбары, футеры) между экранами одного проекта.
+
+Каждое поддерево UI-дерева хешируется по структуре и содержимому без учёта
+геометрии и идентификаторов. Максимальные поддеревья, которые встречаются
+минимум на двух экранах, выносятся в components и заменяются на экранах
+ссылками {"type": "component_ref", "component": <имя>}, так что codegen
+генерирует каждый общий компонент один раз. Компонент сохраняется первым
+вхождением вместе с геометрией потомков (codegen пересчитывает bbox
+относительно корня), а его имя codegen использует как есть — для файла
+src/components/<имя> и для import'ов экранов.
+"""
+import hashlib
+import json
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Set
+
+# Поля узла, которые различаются между экранами у визуально одинаковых компонентов
+VOLATILE_KEYS = {"id", "bbox", "x", "y", "confidence", "score"}
+# Меньшие поддеревья не выносим: ссылка на них не экономит токены
+MIN_SHARED_NODES = 3
+
+
+def _canonical(node: Any) -> Any:
+    if isinstance(node, dict):
+        return {key: _canonical(value) for key, value in node.items() if key not in VOLATILE_KEYS}
+    if isinstance(node, list):
+        return [_canonical(item) for item in node]
+    return node
+
+
+def node_hash(node: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(_canonical(node), sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def _children(node: Dict[str, Any]) -> List[Dict[str, Any]]:
+    children = node.get("children")
+    return [child for child in children if isinstance(child, dict)] if isinstance(children, list) else []
+
+
+def _size(node: Dict[str, Any]) -> int:
+    return 1 + sum(_size(child) for child in _children(node))
+
+
+def _component_name(node: Dict[str, Any], digest: str) -> str:
+    kind = str(node.get("role") or node.get("type") or "component")
+    words = re.findall(r"[A-Za-z0-9]+", kind) or ["Component"]
+    name = "".join(word.capitalize() for word in words)
+    # Имя становится идентификатором JSX и именем файла
+    return (name if name[0].isalpha() else "C" + name) + digest[:8]
+
+
+def dedupe_components(screens: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Принимает UI JSON экранов ({"tree": [...]}) и возвращает
+    {"components": {имя: узел}, "screens": [UI JSON со ссылками]}.
+    """
+    # На скольких разных экранах встречается каждое поддерево
+    seen_on: Dict[str, Set[int]] = defaultdict(set)
+
+    def index(node: Dict[str, Any], screen: int):
+        seen_on[node_hash(node)].add(screen)
+        for child in _children(node):
+            index(child, screen)
+
+    for number, screen in enumerate(screens):
+        for node in screen.get("tree") or []:
+            if isinstance(node, dict):
+                index(node, number)
+
+    components: Dict[str, Dict[str, Any]] = {}
+    names: Dict[str, str] = {}
+
+    def replace(node: Dict[str, Any]) -> Dict[str, Any]:
+        digest = node_hash(node)
+        if len(seen_on[digest]) >= 2 and _size(node) >= MIN_SHARED_NODES:
+            if digest not in names:
+                names[digest] = _component_name(node, digest)
+                components[names[digest]] = node
+            ref = {"type": "component_ref", "component": names[digest]}
+            # Геометрия остаётся на экране: компонент может стоять в разных местах
+            ref.update({key: node[key] for key in ("id", "bbox") if key in node})
+            return ref
+        if not _children(node):
+            return node
+        return dict(node, children=[replace(child) if isinstance(child, dict) else child for child in node["children"]])
+
+    deduped = []
+    for screen in screens:
+        tree = [replace(node) if isinstance(node, dict) else node for node in screen.get("tree") or []]
+        deduped.append(dict(screen, tree=tree))
+    return {"components": components, "screens": deduped}
@@ -0,0 +1,263 @@
+"""
+Подготовка скриншотов к модели.
+
+Полностраничный скриншот намного выше входа ViT, поэтому страница
+масштабируется до ширины входа модели и режется на перекрывающиеся по
+вертикали тайлы (3, H, W). Тайлы режутся и пишутся по одному прямо в .npy
+на диске (open_memmap): ни NumPy-массив размером со страницу, ни её
+RGB-копия не создаются. JPEG декодируется сразу в уменьшенном масштабе
+(draft); PNG декодер Pillow по полосам не отдаёт, поэтому декодированный
+размер учитывается в бюджете памяти пула потоков: крупные изображения ждут,
+пока освободится место.
+
+Готовые тайлы кэшируются по sha256 файла и размеру входа модели: повторная
+сегментация (новая модель, другие пороги) читает их через memmap без
+декодирования.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+UPLOAD_SUFFIXES = (".png", ".jpg", ".jpeg")
+# Меняйте при изменении нарезки или цветового преобразования: старые тайлы станут недействительны
+PREPROCESS_VERSION = "1"
+TILE_OVERLAP = 0.125  # доля высоты тайла, общая с соседним тайлом
+MAX_SOURCE_PIXELS = 120_000_000  # ~1920×60000; больше — вероятно, decompression bomb
+
+# Лимит Pillow действует с первого Image.open, в том числе при чтении заголовка
+Image.MAX_IMAGE_PIXELS = MAX_SOURCE_PIXELS
+
+
+def find_upload(storage_dir: str, job_id: str, screen: Optional[int] = None) -> Optional[Path]:
+    """Загрузка шлюза: job-<id>/upload.* или job-<id>/screen-NN/upload.* для пакетных заданий"""
+    directory = Path(storage_dir) / f"job-{job_id}"
+    if screen is not None:
+        directory = directory / f"screen-{screen:02d}"
+    for suffix in UPLOAD_SUFFIXES:
+        path = directory / f"upload{suffix}"
+        if path.exists():
+            return path
+    return None
+
+
+def file_digest(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def tile_layout(height: int, width: int, input_size: Tuple[int, int], overlap: float = TILE_OVERLAP) -> List[Tuple[int, int]]:
+    """
+    Вертикальные диапазоны (y0, y1) исходного изображения для тайлов. Тайл
+    покрывает всю ширину, его высота в исходных пикселях сохраняет пропорции
+    входа модели; последний тайл прижат к низу страницы.
+    """
+    input_h, input_w = input_size
+    tile_h = max(1, round(input_h * width / input_w))
+    if tile_h >= height:
+        return [(0, tile_h)]
+    stride = max(1, int(tile_h * (1 - overlap)))
+    starts = list(range(0, height - tile_h, stride)) + [height - tile_h]
+    return [(y0, y0 + tile_h) for y0 in starts]
+
+
+def decoded_bytes(path: Path, input_size: Tuple[int, int]) -> Tuple[int, int, int]:
+    """(высота, ширина, байт в памяти после декодирования) — по заголовку, без декодирования"""
+    with Image.open(path) as image:
+        width, height = image.size
+        # Pillow сам отказывает только начиная с двойного лимита, до него лишь предупреждает
+        if width * height > MAX_SOURCE_PIXELS:
+            raise Image.DecompressionBombError(
+                f"Image size ({width * height} pixels) exceeds limit of {MAX_SOURCE_PIXELS} pixels"
+            )
+        if image.format == "JPEG":
+            # draft уменьшает JPEG при декодировании не более чем до ширины входа модели
+            scale = 1
+            while scale < 8 and width // (scale * 2) >= input_size[1]:
+                scale *= 2
+            return height, width, -(-width // scale) * -(-height // scale) * 3
+        return height, width, width * height * len(image.getbands())
+
+
+def iter_tiles(path: Path, input_size: Tuple[int, int]) -> Iterator[Tuple[Tuple[float, float], np.ndarray]]:
+    """Тайлы (3, H, W) uint8 по одному и их вертикальные границы в долях высоты страницы"""
+    input_h, input_w = input_size
+    with Image.open(path) as image:
+        if image.format == "JPEG":
+            image.draft("RGB", (input_w, image.height * input_w // image.width))
+        width, height = image.size
+        for y0, y1 in tile_layout(height, width, input_size):
+            # Цвет приводится к RGB по тайлу, без второй копии всей страницы;
+            # область за нижним краем (страница короче тайла) кроп заполняет чёрным
+            tile = image.crop((0, y0, width, y1)).convert("RGB").resize((input_w, input_h), Image.BILINEAR)
+            yield (y0 / height, y1 / height), np.asarray(tile).transpose(2, 0, 1)
+
+
+@dataclass
+class PreparedImage:
+    digest: str
+    tiles: np.ndarray                  # (N, 3, H, W) uint8, np.memmap
+    spans: List[Tuple[float, float]]   # (y0, y1) тайлов в долях высоты страницы
+    cached: bool
+
+
+class TileCache:
+    """Тайлы в <dir>/<ab>/<key>/tiles.npy + spans.json; LRU по mtime, лимит по байтам"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _entry(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, List[Tuple[float, float]]]]:
+        entry = self._entry(key)
+        try:
+            spans = [tuple(span) for span in json.loads((entry / "spans.json").read_text())]
+            tiles = np.load(entry / "tiles.npy", mmap_mode="r")
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        now = time.time()
+        os.utime(entry, (now, now))
+        return tiles, spans
+
+    def build(self, key: str, path: Path, input_size: Tuple[int, int]) -> Tuple[np.ndarray, List[Tuple[float, float]]]:
+        """Нарезает изображение прямо в memmap-файл кэша; синхронно"""
+        entry = self._entry(key)
+        tmp_entry = entry.with_name(f".{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_entry.mkdir(parents=True, exist_ok=True)
+        try:
+            height, width, _ = decoded_bytes(path, input_size)
+            count = len(tile_layout(height, width, input_size))
+            tiles = np.lib.format.open_memmap(
+                tmp_entry / "tiles.npy", mode="w+", dtype=np.uint8, shape=(count, 3) + tuple(input_size)
+            )
+            spans = []
+            for index, (span, tile) in enumerate(iter_tiles(path, input_size)):
+                tiles[index] = tile
+                spans.append(span)
+            tiles.flush()
+            del tiles
+            (tmp_entry / "spans.json").write_text(json.dumps(spans))
+            with self._lock:
+                if entry.exists():
+                    shutil.rmtree(entry, ignore_errors=True)
+                os.replace(tmp_entry, entry)
+        finally:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+        self._evict(keep=entry)
+        return self.get(key)
+
+    def _evict(self, keep: Path) -> None:
+        with self._lock:
+            entries = []
+            for entry in self.directory.glob("*/*"):
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    size = sum(f.stat().st_size for f in entry.iterdir())
+                    entries.append((entry.stat().st_mtime, entry, size))
+                except OSError:
+                    continue
+            total = sum(size for _, _, size in entries)
+            for _, entry, size in sorted(entries, key=lambda item: item[0]):
+                if total <= self.max_bytes:
+                    break
+                if entry == keep:
+                    continue
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+
+
+class Preprocessor:
+    """
+    prepare(path) → тайлы изображения из кэша или после нарезки в пуле потоков.
+    Одновременные нарезки ограничены бюджетом памяти на декодированные
+    изображения; одно и то же изображение нарезается один раз.
+    """
+
+    def __init__(self, cache: TileCache, input_size: Tuple[int, int], workers: int = 2, memory_budget: int = 512 * 1024 * 1024):
+        self.cache = cache
+        self.input_size = tuple(input_size)
+        self.memory_budget = memory_budget
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vision-preprocess")
+        self._memory = asyncio.Condition()
+        self._reserved = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _key(self, digest: str) -> str:
+        height, width = self.input_size
+        return hashlib.sha256(f"{digest}\0{height}x{width}\0{PREPROCESS_VERSION}".encode()).hexdigest()
+
+    async def _reserve(self, size: int) -> None:
+        async with self._memory:
+            if self._reserved and self._reserved + size > self.memory_budget:
+                self.waits += 1
+            # Изображение больше всего бюджета пропускаем, когда больше ничего не декодируется
+            await self._memory.wait_for(lambda: self._reserved == 0 or self._reserved + size <= self.memory_budget)
+            self._reserved += size
+
+    async def _release(self, size: int) -> None:
+        async with self._memory:
+            self._reserved -= size
+            self._memory.notify_all()
+
+    async def _build(self, key: str, path: Path) -> Tuple[np.ndarray, List[Tuple[float, float]]]:
+        loop = asyncio.get_running_loop()
+        try:
+            _, _, size = await loop.run_in_executor(self._executor, decoded_bytes, path, self.input_size)
+            await self._reserve(size)
+            try:
+                return await loop.run_in_executor(self._executor, self.cache.build, key, path, self.input_size)
+            finally:
+                await self._release(size)
+        finally:
+            self._inflight.pop(key, None)
+
+    async def prepare(self, path: Path) -> PreparedImage:
+        loop = asyncio.get_running_loop()
+        digest = await loop.run_in_executor(self._executor, file_digest, path)
+        key = self._key(digest)
+        cached = await loop.run_in_executor(self._executor, self.cache.get, key)
+        if cached is not None:
+            self.hits += 1
+            return PreparedImage(digest, cached[0], cached[1], cached=True)
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._inflight[key] = asyncio.ensure_future(self._build(key, path))
+        tiles, spans = await asyncio.shield(task)
+        return PreparedImage(digest, tiles, spans, cached=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "in_flight": len(self._inflight),
+            "memory_reserved": self._reserved,
+            "memory_budget": self.memory_budget,
+            "budget_waits": self.waits,
+        }
@@ -1,12 +1,148 @@
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Response
+from pydantic import BaseModel, Field
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import os
+
+from PIL import Image
+
+from backends import load_backend
+from batching import MicroBatcher, Overloaded
+from components import dedupe_components
+from pix2fc.dag import gather_or_cancel
+from pix2fc.dsl import MEDIA_TYPE as DSL_MEDIA_TYPE, UiDocument
+from preprocess import Preprocessor, TileCache, find_upload
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+MAX_BATCH_SCREENS = 50
+STORAGE_DIR = os.getenv("STORAGE_DIR", "/tmp/pix2fullcode")  # общий с gateway том с загрузками
+VISION_BACKEND = os.getenv("VISION_BACKEND", "deterministic")  # onnx | deterministic
+VISION_MODEL_PATH = os.getenv("VISION_MODEL_PATH", "")
+VISION_THREADS = int(os.getenv("VISION_THREADS", str(os.cpu_count() or 1)))  # потоков внутри прямого прохода
+VISION_MAX_BATCH = int(os.getenv("VISION_MAX_BATCH", "8"))  # кадров в одном прямом проходе
+VISION_MAX_WAIT_MS = float(os.getenv("VISION_MAX_WAIT_MS", "5"))  # миллисекунды окна сбора пакета
+VISION_MAX_QUEUE = int(os.getenv("VISION_MAX_QUEUE", "256"))  # кадров в ожидании, сверх — 503
+VISION_REQUEST_MAX_TILES = int(os.getenv("VISION_REQUEST_MAX_TILES", str(max(1, VISION_MAX_QUEUE // 4))))  # кадров одного запроса в очереди одновременно
+TILE_CACHE_DIR = os.getenv("VISION_TILE_CACHE_DIR", os.path.join(STORAGE_DIR, "vision-tiles"))
+TILE_CACHE_MAX_BYTES = int(os.getenv("VISION_TILE_CACHE_MAX_BYTES", str(4 * 1024 * 1024 * 1024)))
+PREPROCESS_WORKERS = int(os.getenv("VISION_PREPROCESS_WORKERS", "2"))  # потоков декодирования
+PREPROCESS_MEMORY = int(os.getenv("VISION_PREPROCESS_MEMORY", str(512 * 1024 * 1024)))  # байт на одновременно декодируемые изображения
+MERGE_IOU = 0.5  # узлы одного типа из перекрытия соседних тайлов с большим IoU — один узел
+
+# Одновременные запросы к модели собираются в пакеты и выполняются одним прямым проходом
+backend = load_backend(VISION_BACKEND, VISION_MODEL_PATH, VISION_THREADS)
+batcher = MicroBatcher(
+    backend,
+    max_batch=VISION_MAX_BATCH,
+    max_wait=VISION_MAX_WAIT_MS / 1000,
+    max_queue=VISION_MAX_QUEUE,
+)
+
+# Декодирование и нарезка страниц на тайлы под вход модели; готовые тайлы кэшируются на диске
+preprocessor = Preprocessor(
+    TileCache(TILE_CACHE_DIR, max_bytes=TILE_CACHE_MAX_BYTES),
+    backend.input_size,
+    workers=PREPROCESS_WORKERS,
+    memory_budget=PREPROCESS_MEMORY,
+)
+
+
+@app.on_event("startup")
+async def startup_event():
+    await batcher.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await batcher.close()
+    preprocessor.close()
+
+
+class SegmentRequest(BaseModel):
+    job_id: Optional[str] = None
+
+class BatchSegmentRequest(BaseModel):
+    job_id: str
+    screens: int = Field(ge=1, le=MAX_BATCH_SCREENS)
+
+def _iou(a: list, b: list) -> float:
+    ax1, ay1, bx1, by1 = a[0] + a[2], a[1] + a[3], b[0] + b[2], b[1] + b[3]
+    width = max(0.0, min(ax1, bx1) - max(a[0], b[0]))
+    height = max(0.0, min(ay1, by1) - max(a[1], b[1]))
+    inter = width * height
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+def stitch_tiles(trees: List[List[dict]], spans: List[Tuple[float, float]]) -> List[dict]:
+    """Переводит bbox узлов из координат тайла в координаты страницы и склеивает дубли из перекрытий"""
+    nodes = []
+    for tree, (y0, y1) in zip(trees, spans):
+        for node in tree:
+            x, y, w, h = node["bbox"]
+            top = y0 + y * (y1 - y0)
+            if top >= 1.0:
+                continue  # чёрное поле под короткой страницей
+            bottom = min(1.0, top + h * (y1 - y0))
+            nodes.append(dict(node, bbox=[x, round(top, 4), w, round(bottom - top, 4)]))
+    merged = []
+    for node in sorted(nodes, key=lambda node: node.get("score", 0.0), reverse=True):
+        if not any(kept["type"] == node["type"] and _iou(kept["bbox"], node["bbox"]) > MERGE_IOU for kept in merged):
+            merged.append(node)
+    return sorted(merged, key=lambda node: (node["bbox"][1], node["bbox"][0]))
+
+def request_slots() -> asyncio.Semaphore:
+    """Места в очереди планировщика на один запрос: большой пакет экранов не занимает её целиком"""
+    return asyncio.Semaphore(min(VISION_REQUEST_MAX_TILES, VISION_MAX_QUEUE))
+
+async def segment_screen(job_id: Optional[str], screen: Optional[int] = None, slots: Optional[asyncio.Semaphore] = None):
+    path = find_upload(STORAGE_DIR, job_id, screen) if job_id else None
+    if path is None:
+        logger.warning(f"No upload found for job {job_id} (screen {screen}), returning empty tree")
+        return {"dsl_version": "0.9", "tree": []}
+    try:
+        prepared = await preprocessor.prepare(path)
+    except Image.DecompressionBombError as e:
+        # Повтор не поможет: отвечаем ошибкой входных данных
+        raise HTTPException(status_code=413, detail=str(e))
+    try:
+        # Тайлы страницы уходят в планировщик одновременно (в пределах мест запроса) и попадают в общие пакеты
+        trees = await batcher.infer_all(prepared.tiles, slots or request_slots())
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    return {"dsl_version": "0.9", "tree": stitch_tiles(trees, prepared.spans)}
+
 @app.post("/segment")
-async def segment():
-    # TODO: implement ViT+SAM inference
-    return {"dsl_version": "0.9", "tree": []}
+async def segment(request: Optional[SegmentRequest] = None, accept: Optional[str] = Header(None)):
+    """UI JSON экрана; с Accept: application/x-pix2-dsl — в компактной бинарной кодировке"""
+    ui_json = await segment_screen(request.job_id if request else None)
+    if accept and DSL_MEDIA_TYPE in accept:
+        return Response(content=UiDocument.from_json(ui_json).encode(), media_type=DSL_MEDIA_TYPE)
+    return ui_json
+
+@app.post("/segment/batch")
+async def segment_batch(request: BatchSegmentRequest):
+    """
+    Сегментирует все экраны проекта одним вызовом и выносит общие для
+    нескольких экранов компоненты в отдельный словарь components.
+    Экраны уходят в модель одновременно и попадают в общие пакеты; все тайлы
+    запроса делят одни места в очереди, а ошибка одного экрана снимает с очереди
+    тайлы остальных.
+    """
+    slots = request_slots()
+    screens = await gather_or_cancel(
+        segment_screen(request.job_id, number, slots) for number in range(request.screens)
+    )
+    return dict(dedupe_components(list(screens)), dsl_version="0.9")
+
+@app.get("/metrics")
+async def metrics():
+    """Счётчики планировщика пакетов и кэша тайлов"""
+    return {"batcher": batcher.stats(), "preprocess": preprocessor.stats()}
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from backends import BackendError, DeterministicBackend, SegmentationBackend, load_backend
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        SegmentationBackend()
+
+
+def test_deterministic_backend_splits_sections_per_frame():
+    backend = load_backend("deterministic")
+    assert isinstance(backend, DeterministicBackend)
+    height, width = backend.input_size
+    batch = np.zeros((2, 3, height, width), dtype=np.float32)
+    batch[0, :, height // 2:] = 1.0
+    first, second = backend.infer(batch)
+    assert [node["bbox"][1] for node in first] == [0.0, 0.5]
+    assert len(second) == 1 and second[0]["bbox"] == [0.0, 0.0, 1.0, 1.0]
+
+
+def test_unknown_or_unconfigured_backend():
+    with pytest.raises(BackendError):
+        load_backend("nope")
+    with pytest.raises(BackendError, match="VISION_MODEL_PATH"):
+        load_backend("onnx")
@@ -0,0 +1,114 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from backends import SegmentationBackend
+from batching import MicroBatcher, Overloaded
+
+
+class RecordingBackend(SegmentationBackend):
+    """Возвращает номер кадра (значение первого пикселя) и запоминает размеры пакетов"""
+    name = "recording"
+
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+
+    def infer(self, batch):
+        if self.fail:
+            raise RuntimeError("model crashed")
+        self.batches.append((len(batch), batch.dtype))
+        return [[{"frame": round(float(image[0, 0, 0]) * 255)}] for image in batch]
+
+
+def frame(index: int) -> np.ndarray:
+    return np.full((3, 4, 4), index, dtype=np.uint8)
+
+
+def test_concurrent_requests_share_batches_in_order():
+    backend = RecordingBackend()
+
+    async def main():
+        batcher = MicroBatcher(backend, max_batch=4, max_wait=0.05)
+        await batcher.start()
+        try:
+            trees = await asyncio.gather(*(batcher.infer(frame(i)) for i in range(10)))
+        finally:
+            await batcher.close()
+        return batcher, trees
+
+    batcher, trees = asyncio.run(main())
+    assert [tree[0]["frame"] for tree in trees] == list(range(10))
+    assert [size for size, _ in backend.batches] == [4, 4, 2]
+    assert all(dtype == np.float32 for _, dtype in backend.batches)
+    assert batcher.stats()["avg_batch"] == round(10 / 3, 2)
+
+
+def test_overload_and_model_failure():
+    async def main():
+        batcher = MicroBatcher(RecordingBackend(fail=True), max_batch=2, max_wait=0.01, max_queue=1)
+        # Планировщик не запущен: первый кадр ждёт в очереди, второй не помещается
+        waiting = asyncio.ensure_future(batcher.infer(frame(0)))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await batcher.infer(frame(1))
+        await batcher.start()
+        try:
+            with pytest.raises(RuntimeError, match="model crashed"):
+                await waiting
+        finally:
+            await batcher.close()
+        return batcher
+
+    assert asyncio.run(main()).stats()["rejected"] == 1
+
+
+def test_request_slots_cap_queued_tiles():
+    backend = RecordingBackend()
+
+    async def main():
+        batcher = MicroBatcher(backend, max_batch=8, max_wait=0.01, max_queue=4)
+        slots = asyncio.Semaphore(2)
+        # Планировщик не запущен: в очереди стоят только кадры, получившие место запроса
+        request = asyncio.ensure_future(batcher.infer_all([frame(i) for i in range(6)], slots))
+        await asyncio.sleep(0.01)
+        queued = batcher.stats()["queued"]
+        other = asyncio.ensure_future(batcher.infer(frame(9)))
+        await batcher.start()
+        try:
+            return queued, await request, await other
+        finally:
+            await batcher.close()
+
+    queued, trees, other = asyncio.run(main())
+    assert queued == 2
+    assert [tree[0]["frame"] for tree in trees] == list(range(6))
+    assert other[0]["frame"] == 9
+
+
+def test_failed_request_cancels_queued_tiles():
+    class FailingFirst(RecordingBackend):
+        def infer(self, batch):
+            if not self.batches:
+                self.batches.append((len(batch), batch.dtype))
+                raise RuntimeError("model crashed")
+            return super().infer(batch)
+
+    backend = FailingFirst()
+
+    async def main():
+        batcher = MicroBatcher(backend, max_batch=1, max_wait=0.0)
+        await batcher.start()
+        try:
+            with pytest.raises(RuntimeError, match="model crashed"):
+                await batcher.infer_all([frame(i) for i in range(5)])
+            await asyncio.sleep(0.05)
+        finally:
+            await batcher.close()
+        return batcher
+
+    batcher = asyncio.run(main())
+    # После ошибки первого кадра в модель мог уйти только кадр, уже взятый из очереди
+    assert len(backend.batches) <= 2
+    assert batcher.stats()["queued"] == 0
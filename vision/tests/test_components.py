@@ -0,0 +1,28 @@
+from components import MIN_SHARED_NODES, dedupe_components
+
+
+def card(title, y):
+    return {
+        "type": "card", "id": f"card-{y}", "bbox": [0, y, 1, 0.2], "confidence": 0.9,
+        "children": [{"type": "text", "text": title, "bbox": [0, y, 1, 0.1]}, {"type": "button", "text": "Go", "bbox": [0, y + 0.1, 0.2, 0.1]}],
+    }
+
+
+def test_shared_subtree_becomes_component_with_screen_geometry():
+    screens = [{"tree": [card("News", 0.0)]}, {"tree": [card("News", 0.5), card("Only here", 0.8)]}]
+    result = dedupe_components(screens)
+    (name, node), = result["components"].items()
+    assert name[0].isalpha() and name.startswith("Card")
+    assert node["children"][0]["bbox"] == [0, 0.0, 1, 0.1]
+    refs = [item for screen in result["screens"] for item in screen["tree"] if item["type"] == "component_ref"]
+    assert [ref["bbox"] for ref in refs] == [[0, 0.0, 1, 0.2], [0, 0.5, 1, 0.2]]
+    assert all(ref["component"] == name for ref in refs)
+    # Уникальная карточка остаётся на экране как есть
+    assert result["screens"][1]["tree"][1]["children"][0]["text"] == "Only here"
+
+
+def test_small_or_single_screen_subtrees_stay_inline():
+    tiny = {"type": "text", "text": "©"}
+    assert MIN_SHARED_NODES > 1
+    result = dedupe_components([{"tree": [tiny]}, {"tree": [dict(tiny)]}, {"tree": [card("A", 0)]}])
+    assert result["components"] == {}
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import preprocess
+from preprocess import MAX_SOURCE_PIXELS, decoded_bytes, iter_tiles, tile_layout
+
+
+def test_pixel_limit_is_set_on_import():
+    assert Image.MAX_IMAGE_PIXELS == MAX_SOURCE_PIXELS
+
+
+def test_header_over_limit_is_rejected_before_decoding(tmp_path, monkeypatch):
+    path = tmp_path / "upload.png"
+    Image.new("RGB", (100, 60)).save(path)
+    monkeypatch.setattr(preprocess, "MAX_SOURCE_PIXELS", 5000)
+    with pytest.raises(Image.DecompressionBombError):
+        decoded_bytes(path, (224, 224))
+
+
+def test_tiles_cover_the_page(tmp_path):
+    path = tmp_path / "upload.png"
+    page = np.zeros((1000, 200, 3), dtype=np.uint8)
+    page[-10:] = 255
+    Image.fromarray(page).save(path)
+    assert decoded_bytes(path, (224, 224)) == (1000, 200, 200 * 1000 * 3)
+    layout = tile_layout(1000, 200, (224, 224))
+    assert layout[0][0] == 0 and layout[-1][1] == 1000
+    tiles = list(iter_tiles(path, (224, 224)))
+    assert len(tiles) == len(layout)
+    (span, last), = tiles[-1:]
+    assert span[1] == 1.0 and last.shape == (3, 224, 224) and last[:, -1].max() == 255